@@ -0,0 +1,91 @@
+"""Requests/sec vs concurrency for the thread-pool and asyncio engines against the local mock server.
+
+    python -m benchmarks.bench_async --files 400 --latency 0.2 --concurrency 1 8 64 256
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from metadata_generator.aio import AsyncGeminiClient
+from metadata_generator.batch import BatchRunner
+from metadata_generator.core import GeminiClient
+from metadata_generator.transport import HttpTransport
+
+from .mock_gemini import MockGeminiServer
+
+
+def make_corpus(directory, count, size):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"synthetic_{i:05d}.jpg")
+        with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def run_threads(base_url, paths, concurrency):
+    client = GeminiClient("bench", base_url=base_url, upload_threshold=None,
+                          transport=HttpTransport(pool_size=concurrency, retries=0))
+    errors = []
+    runner = BatchRunner(client, paths, workers=concurrency,
+                         on_error=lambda index, message: errors.append(message))
+    started = time.perf_counter()
+    runner.run()
+    return time.perf_counter() - started, len(errors)
+
+
+def run_asyncio(base_url, paths, concurrency):
+    async def main():
+        errors = 0
+        async with AsyncGeminiClient("bench", base_url=base_url, concurrency=concurrency, retries=0,
+                                     upload_threshold=None) as engine:
+            async for result in engine.generate_many(paths):
+                errors += result.error is not None
+        return errors
+
+    started = time.perf_counter()
+    errors = asyncio.run(main())
+    return time.perf_counter() - started, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--file-size", type=int, default=32 * 1024, help="Bytes per synthetic file")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64, 128, 256])
+    parser.add_argument("--max-threads", type=int, default=64,
+                        help="Skip the thread engine above this concurrency")
+    parser.add_argument("-o", "--output", help="Also write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory, MockGeminiServer(latency=args.latency) as server:
+        paths = make_corpus(directory, args.files, args.file_size)
+        print(f"{args.files} files x {args.file_size} bytes, mock latency {args.latency * 1000:.0f} ms")
+        print(f"{'engine':<8} {'concurrency':>11} {'seconds':>8} {'req/s':>8} {'errors':>6}")
+        for concurrency in args.concurrency:
+            engines = [("asyncio", run_asyncio)]
+            if concurrency <= args.max_threads:
+                engines.insert(0, ("threads", run_threads))
+            for name, run in engines:
+                elapsed, errors = run(server.base_url, paths, concurrency)
+                rate = args.files / elapsed
+                results.append({"engine": name, "concurrency": concurrency, "seconds": elapsed,
+                                "requests_per_second": rate, "errors": errors})
+                print(f"{name:<8} {concurrency:>11} {elapsed:>8.2f} {rate:>8.1f} {errors:>6}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({"files": args.files, "file_size": args.file_size, "latency": args.latency,
+                       "results": results}, file, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
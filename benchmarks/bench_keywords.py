@@ -0,0 +1,104 @@
+"""Keyword post-processing throughput over a synthetic day's results, with and without a taxonomy.
+
+    python -m benchmarks.bench_keywords --records 100000 --keywords 30 --vocabulary 20000
+"""
+import sys
+import json
+import time
+import random
+import string
+import argparse
+from itertools import accumulate
+
+from metadata_generator.keywords import KeywordProcessor, Taxonomy, normalize_keyword
+
+
+def make_vocabulary(count, rng):
+    words = set()
+    letters = string.ascii_lowercase.replace("s", "")  # No word is another one's plural
+    while len(words) < count:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    words = sorted(words)
+    # A few two-word phrases, like "golden retriever"
+    return [f"{word} {rng.choice(words)}" if rng.random() < 0.2 else word for word in words]
+
+
+def variant(term, rng):
+    """The spellings a model produces for one concept: case, plurals, articles, stray punctuation"""
+    roll = rng.random()
+    if roll < 0.2:
+        term = term.title()
+    elif roll < 0.3:
+        term = term.upper()
+    if rng.random() < 0.3:
+        term += "s"
+    if rng.random() < 0.05:
+        term = "the " + term
+    if rng.random() < 0.05:
+        term += "."
+    return term
+
+
+def make_keyword_lists(vocabulary, records, keywords, rng):
+    # Keyword use is heavily skewed: a few concepts appear in most results
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    terms = [variant(term, rng) for term in rng.choices(vocabulary, cum_weights=cum_weights, k=records * keywords)]
+    return [terms[start:start + keywords] for start in range(0, len(terms), keywords)]
+
+
+def run(processor, keyword_lists, per_record):
+    started = time.perf_counter()
+    if per_record:
+        for keywords in keyword_lists:
+            processor.process(keywords)
+    else:
+        processor.process_many(keyword_lists)
+    return time.perf_counter() - started
+
+
+def run_unmemoised(keyword_lists):
+    """Baseline: normalise every occurrence separately"""
+    started = time.perf_counter()
+    for keywords in keyword_lists:
+        list(dict.fromkeys(normalize_keyword(keyword) for keyword in keywords))
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--keywords", type=int, default=30, help="Keywords per record")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct concepts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="Also write results as JSON")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    keyword_lists = make_keyword_lists(vocabulary, args.records, args.keywords, rng)
+    taxonomy = Taxonomy((term, [term.replace(" ", "-")]) for term in vocabulary[:args.vocabulary // 2])
+    occurrences = args.records * args.keywords
+    print(f"{args.records} records x {args.keywords} keywords, {args.vocabulary} concepts, "
+          f"{len(set(keyword for keywords in keyword_lists for keyword in keywords))} distinct raw keywords")
+    print(f"{'mode':<24} {'seconds':>8} {'records/s':>10} {'keywords/s':>11}")
+    cases = [
+        ("unmemoised", lambda: run_unmemoised(keyword_lists)),
+        ("per record", lambda: run(KeywordProcessor(), keyword_lists, True)),
+        ("batch", lambda: run(KeywordProcessor(), keyword_lists, False)),
+        ("batch + taxonomy", lambda: run(KeywordProcessor(taxonomy), keyword_lists, False)),
+    ]
+    results = []
+    for name, case in cases:
+        elapsed = case()
+        results.append({"mode": name, "seconds": elapsed, "records_per_second": args.records / elapsed})
+        print(f"{name:<24} {elapsed:>8.2f} {args.records / elapsed:>10.0f} {occurrences / elapsed:>11.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({"records": args.records, "keywords": args.keywords, "vocabulary": args.vocabulary,
+                       "results": results}, file, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Regression benchmark: files/sec, memory high-water mark and latency percentiles per scenario.
+
+Every scenario runs in a fresh interpreter against the local mock server, so
+peak RSS is measured per scenario and nothing spends quota.
+
+    python -m benchmarks.bench_suite -o baseline.json
+    python -m benchmarks.bench_suite --compare baseline.json -o current.json
+    python -m benchmarks.bench_suite --scenario flaky --scale 0.25
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+from .mock_gemini import MockGeminiServer
+
+# corpus: (kind, count, bytes per file); server: MockGeminiServer options
+SCENARIOS = {
+    "images-threads": dict(corpus=("random", 300, 64 * 1024), engine="threads", workers=32,
+                           server=dict(latency=0.05, jitter=0.02)),
+    "images-asyncio": dict(corpus=("random", 300, 64 * 1024), engine="asyncio", workers=128,
+                           server=dict(latency=0.05, jitter=0.02)),
+    "images-packed": dict(corpus=("random", 300, 64 * 1024), engine="threads", workers=8, files_per_request=8,
+                          server=dict(latency=0.05, jitter=0.02)),
+    "photos-preprocess": dict(corpus=("jpeg", 40, 1600 * 1200), engine="threads", workers=8, preprocess=True,
+                              server=dict(latency=0.05)),
+    "videos-upload": dict(corpus=("video", 10, 3 * 1024 * 1024), engine="threads", workers=4,
+                          upload_threshold=1024 * 1024, server=dict(latency=0.1)),
+    "videos-budget": dict(corpus=("video", 24, 12 * 1024 * 1024), engine="threads", workers=16, memory_mb=64,
+                          server=dict(latency=0.1)),
+    # A long shared system instruction, sent with every request or referenced from a cached context
+    "template-inline": dict(corpus=("random", 300, 64 * 1024), engine="threads", workers=32,
+                            template=dict(system_tokens=8000, context_cache=False),
+                            server=dict(latency=0.05, prefill_rate=0.01)),
+    "template-cached": dict(corpus=("random", 300, 64 * 1024), engine="threads", workers=32,
+                            template=dict(system_tokens=8000, context_cache=True),
+                            server=dict(latency=0.05, prefill_rate=0.01)),
+    "flaky": dict(corpus=("random", 300, 64 * 1024), engine="threads", workers=32,
+                  server=dict(latency=0.05, jitter=0.05, error_rate=0.05, rate_limit_rate=0.05,
+                              malformed_rate=0.05, seed=1)),
+}
+# Relative changes beyond these are reported as regressions by --compare
+COMPARED = {"files_per_second": -1, "peak_rss_bytes": 1, "request_p95": 1}
+
+
+def make_corpus(directory, kind, count, size):
+    """Write ``count`` synthetic files: random bytes (.jpg), real noisy JPEGs of ~size pixels, or random .mp4"""
+    paths = []
+    for i in range(count):
+        if kind == "jpeg":
+            from PIL import Image
+
+            path = os.path.join(directory, f"photo_{i:05d}.jpg")
+            width = int((size * 4 / 3) ** 0.5)
+            height = size // width
+            Image.frombytes("RGB", (width, height), os.urandom(width * height * 3)).save(path, quality=90)
+        else:
+            path = os.path.join(directory, f"{kind}_{i:05d}.{'mp4' if kind == 'video' else 'jpg'}")
+            with open(path, 'wb') as file:
+                file.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def peak_rss_bytes():
+    """This process's memory high-water mark.
+
+    On Linux VmHWM starts afresh at exec; ru_maxrss would still include the
+    parent's peak at fork time, e.g. after it generated a large corpus.
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(spec, base_url, paths):
+    """Run one scenario in this process and return its measurements"""
+    from metadata_generator.batch import BatchRunner
+    from metadata_generator.core import GeminiClient
+    from metadata_generator.memory import MemoryBudget
+    from metadata_generator.metrics import metrics
+    from metadata_generator.preprocess import ImagePreprocessor
+    from metadata_generator.prompts import ContextCache, PromptTemplate
+    from metadata_generator.transport import HttpTransport
+
+    workers = spec["workers"]
+    template = context_cache = None
+    if spec.get("template"):
+        sentence = "Keywords are single lowercase nouns or short phrases, most important first. "
+        system = sentence * (spec["template"]["system_tokens"] * 4 // len(sentence) + 1)
+        template = PromptTemplate("bench", 1, system=system)
+        context_cache = ContextCache() if spec["template"]["context_cache"] else None
+    transport = HttpTransport(pool_size=workers, retries=5, backoff_base=0.01, backoff_max=0.2)
+    client = GeminiClient("bench", base_url=base_url, transport=transport,
+                          upload_threshold=spec.get("upload_threshold"),
+                          preprocessor=ImagePreprocessor() if spec.get("preprocess") else None,
+                          memory_budget=MemoryBudget(spec["memory_mb"] * 2 ** 20) if spec.get("memory_mb") else None,
+                          prompt_template=template, context_cache=context_cache)
+    errors = []
+    on_error = lambda index, message: errors.append(message)
+    if spec["engine"] == "asyncio":
+        from metadata_generator.aio import AsyncBatchRunner
+
+        runner = AsyncBatchRunner(client, paths, workers=workers, on_error=on_error, retries=5)
+    else:
+        runner = BatchRunner(client, paths, workers=workers, on_error=on_error,
+                             files_per_request=spec.get("files_per_request", 1))
+
+    metrics.reset()
+    started = time.perf_counter()
+    runner.run()
+    elapsed = time.perf_counter() - started
+    snapshot = metrics.snapshot()
+    request = snapshot["stages"].get("request", {})
+    return {
+        "files": len(paths),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "files_per_second": len(paths) / elapsed,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "request_p50": request.get("p50"),
+        "request_p95": request.get("p95"),
+        "stages": snapshot["stages"],
+        "counters": snapshot["counters"],
+    }
+
+
+def run_child(spec, base_url, paths):
+    """Run a scenario in a fresh interpreter so its memory high-water mark is its own"""
+    job = json.dumps({"spec": spec, "base_url": base_url, "paths": paths})
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_suite", "--child"], input=job,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def skip_reason(spec):
+    if spec["engine"] == "asyncio":
+        from metadata_generator.aio import backend_available
+
+        if not backend_available():
+            return "needs aiohttp or httpx"
+    if spec["corpus"][0] == "jpeg" or spec.get("preprocess"):
+        from metadata_generator.preprocess import ImagePreprocessor
+
+        if not ImagePreprocessor.available():
+            return "needs Pillow"
+    return None
+
+
+def compare(baseline, results, tolerance):
+    """Print the change of each compared figure; return the number of regressions"""
+    regressions = 0
+    previous = {name: result for name, result in baseline.get("scenarios", {}).items()}
+    for name, result in results.items():
+        before = previous.get(name)
+        if not before or "skipped" in before or "skipped" in result:
+            continue
+        for field, direction in COMPARED.items():
+            if not before.get(field) or result.get(field) is None:
+                continue
+            change = (result[field] - before[field]) / before[field]
+            worse = change * direction > tolerance
+            regressions += worse
+            print(f"{name:<18} {field:<17} {before[field]:>14.4g} -> {result[field]:>14.4g} "
+                  f"({change:+.1%}){'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Run only this scenario (repeatable; default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every corpus size by this")
+    parser.add_argument("-o", "--output", help="Write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Compare with an earlier JSON result and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Relative change counted as a regression (default: 0.15)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        job = json.load(sys.stdin)
+        json.dump(run_scenario(job["spec"], job["base_url"], job["paths"]), sys.stdout)
+        return 0
+
+    results = {}
+    corpora = {}
+    print(f"{'scenario':<18} {'files':>6} {'seconds':>8} {'files/s':>8} {'errors':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.scenario or list(SCENARIOS):
+            spec = SCENARIOS[name]
+            reason = skip_reason(spec)
+            if reason:
+                results[name] = {"skipped": reason}
+                print(f"{name:<18} skipped: {reason}")
+                continue
+            kind, count, size = spec["corpus"]
+            count = max(1, int(count * args.scale))
+            if (kind, count, size) not in corpora:
+                corpus_directory = os.path.join(directory, f"{kind}-{count}-{size}")
+                os.makedirs(corpus_directory)
+                corpora[kind, count, size] = make_corpus(corpus_directory, kind, count, size)
+
+            with MockGeminiServer(**spec["server"]) as server:
+                result = run_child(spec, server.base_url, corpora[kind, count, size])
+                result["server"] = {"requests": server.requests, "bytes_received": server.bytes_received,
+                                    **server.injected}
+            results[name] = result
+            print(f"{name:<18} {result['files']:>6} {result['seconds']:>8.2f} {result['files_per_second']:>8.1f} "
+                  f"{result['errors']:>6} {(result['request_p50'] or 0) * 1000:>8.1f} "
+                  f"{(result['request_p95'] or 0) * 1000:>8.1f} {result['peak_rss_bytes'] / 2 ** 20:>8.1f}")
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), results, args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "scale": args.scale,
+                       "scenarios": results}, file, indent=4)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Local stand-in for the Gemini API, for benchmarks that must not spend quota.
+
+The server runs an asyncio HTTP/1.1 loop (with keep-alive) on a background
+thread, so it can hold hundreds of concurrent connections open. Besides
+generateContent it speaks enough of the Files API (resumable upload, get,
+delete) for the large-file path, and of context caching (cachedContents) to
+account for system instructions sent inline or referenced. Faults are
+injected at configurable rates: 5xx errors, 429s with a RetryInfo delay, and
+malformed answers.
+
+    with MockGeminiServer(latency=0.2, rate_limit_rate=0.05) as server:
+        client = GeminiClient("test", base_url=server.base_url)
+"""
+import json
+import random
+import asyncio
+import itertools
+import threading
+
+CANNED_METADATA = {
+    "title": "Mock title",
+    "description": "Mock description generated by the local benchmark server.",
+    "keywords": ["mock", "benchmark", "metadata"]
+}
+FREE_TEXT_ANSWER = ("Title: Mock title\nDescription: Mock description in free text.\n"
+                    "Keywords: mock, benchmark, metadata")
+MALFORMED_KINDS = ("free_text", "truncated_body", "no_candidates", "empty_text")
+
+
+class MockGeminiServer:
+    """``latency`` (+ up to ``jitter``) seconds per generateContent call, plus ``prefill_rate``
+    seconds per 1000 prompt tokens not read from a cached context; the other ``*_rate`` arguments
+    are the fractions of calls answered with a 503, a 429, or a malformed answer instead.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, malformed_rate=0.0, retry_after=0.05, prefill_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.prefill_rate = prefill_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.bytes_received = 0
+        # Requests that carried the API key in the URL, or sent no x-goog-api-key header
+        self.keys_in_url = 0
+        self.unauthenticated = 0
+        self.injected = dict.fromkeys(("errors", "rate_limited", "malformed"), 0)
+        self.uploads = {}
+        self._upload_ids = itertools.count(1)
+        self.contexts = {}
+        self._context_ids = itertools.count(1)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1beta"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name="mock-gemini", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            self._thread.join()
+
+    async def _shutdown(self):
+        self._server.close()
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        self._loop.stop()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.close()
+
+    async def _read_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        return await reader.readexactly(int(headers.get("content-length", 0)))
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await self._read_body(reader, headers)
+
+                status, response_headers, payload = await self.respond(method, target, headers, body)
+                response_headers.setdefault("Content-Type", "application/json")
+                head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                        f"Content-Length: {len(payload)}"]
+                head.extend(f"{name}: {value}" for name, value in response_headers.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            # Client hung up, sent garbage, or the server is shutting down
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, headers, body):
+        """Return (status, extra headers, body bytes) for one request"""
+        self.requests += 1
+        self.bytes_received += len(body)
+        path, _, query = target.partition("?")
+        if any(parameter.startswith("key=") for parameter in query.split("&")):
+            self.keys_in_url += 1
+        if path.startswith("/upload-session/"):
+            # The session URL itself authorises the upload
+            return self._upload_chunk(path.rsplit("/", 1)[1], headers, body)
+        if not headers.get("x-goog-api-key"):
+            self.unauthenticated += 1
+        if path.startswith("/upload/"):
+            return self._upload_start(headers)
+        if "/files/" in path:
+            name = "files/" + path.rsplit("/", 1)[1]
+            if method == "DELETE":
+                return 200, {}, b"{}"
+            return 200, {}, json.dumps(self._file_resource(name)).encode("utf-8")
+        if path.endswith("/cachedContents"):
+            return self._create_context(body)
+        if "/cachedContents/" in path:
+            name = "cachedContents/" + path.rsplit("/", 1)[1]
+            found = self.contexts.pop(name, None) is not None if method == "DELETE" else name in self.contexts
+            if not found:
+                return 404, {}, self._error(404, "CachedContent not found (or permission denied)")
+            return 200, {}, json.dumps({"name": name}).encode("utf-8")
+        return await self._generate(body)
+
+    def _error(self, status, message, details=None):
+        error = {"code": status, "message": message}
+        if details:
+            error["details"] = details
+        return json.dumps({"error": error}).encode("utf-8")
+
+    @staticmethod
+    def _instruction_tokens(instruction):
+        # About four characters per token, as for English text
+        return sum(len(part.get("text", "")) for part in instruction.get("parts", [])) // 4
+
+    def _create_context(self, body):
+        try:
+            request = json.loads(body)
+            tokens = self._instruction_tokens(request.get("systemInstruction") or request["system_instruction"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 400, {}, self._error(400, "Invalid cached content.")
+        name = f"cachedContents/{next(self._context_ids)}"
+        self.contexts[name] = tokens
+        return 200, {}, json.dumps({"name": name, "model": request.get("model"),
+                                    "usageMetadata": {"totalTokenCount": tokens}}).encode("utf-8")
+
+    async def _generate(self, body):
+        try:
+            request = json.loads(body)
+            parts = request["contents"][0]["parts"]
+            instruction = request.get("system_instruction") or request.get("systemInstruction")
+            system_tokens = self._instruction_tokens(instruction) if instruction else 0
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            return 400, {}, self._error(400, "Invalid JSON payload received.")
+        context = request.get("cached_content") or request.get("cachedContent")
+        cached_tokens = 0
+        if context is not None:
+            if context not in self.contexts:
+                return 403, {}, self._error(403, "CachedContent not found (or permission denied)")
+            cached_tokens = self.contexts[context]
+
+        images = sum(1 for part in parts if "inline_data" in part)
+        prompt_tokens = 258 * max(images, 1) + 40 + system_tokens + cached_tokens
+        delay = self.latency + self.random.uniform(0, self.jitter) if self.latency or self.jitter else 0.0
+        delay += self.prefill_rate * (prompt_tokens - cached_tokens) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.injected["errors"] += 1
+            return 503, {"Retry-After": f"{self.retry_after:g}"}, self._error(503, "The model is overloaded.")
+        roll -= self.error_rate
+        if roll < self.rate_limit_rate:
+            self.injected["rate_limited"] += 1
+            retry_info = {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{self.retry_after:g}s"}
+            return 429, {}, self._error(429, "Resource has been exhausted (e.g. check quota).", [retry_info])
+        roll -= self.rate_limit_rate
+        malformed = roll < self.malformed_rate
+
+        if images > 1:
+            # A packed multi-file request: one indexed object per image
+            answer = [dict(CANNED_METADATA, index=index) for index in range(images)]
+        else:
+            answer = CANNED_METADATA
+        text = json.dumps(answer)
+
+        if malformed:
+            self.injected["malformed"] += 1
+            kind = self.random.choice(MALFORMED_KINDS)
+            if kind == "truncated_body":
+                response = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+                return 200, {}, response[:len(response) // 2].encode("utf-8")
+            if kind == "no_candidates":
+                return 200, {}, json.dumps({"promptFeedback": {"blockReason": "OTHER"}}).encode("utf-8")
+            text = FREE_TEXT_ANSWER if kind == "free_text" else ""
+
+        response = {
+            "candidates": [{"content": {"parts": [{"text": text}]}}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 60,
+                              "totalTokenCount": prompt_tokens + 60}
+        }
+        if cached_tokens:
+            response["usageMetadata"]["cachedContentTokenCount"] = cached_tokens
+        return 200, {}, json.dumps(response).encode("utf-8")
+
+    def _file_resource(self, name, mime_type="application/octet-stream"):
+        return {"name": name, "uri": f"http://{self.host}:{self.port}/v1beta/{name}", "mimeType": mime_type,
+                "state": "ACTIVE"}
+
+    def _upload_start(self, headers):
+        upload_id = str(next(self._upload_ids))
+        self.uploads[upload_id] = [0, headers.get("x-goog-upload-header-content-type", "application/octet-stream")]
+        return 200, {"X-Goog-Upload-URL": f"http://{self.host}:{self.port}/upload-session/{upload_id}"}, b"{}"
+
+    def _upload_chunk(self, upload_id, headers, body):
+        if upload_id not in self.uploads:
+            return 404, {}, self._error(404, "Unknown upload session.")
+        command = headers.get("x-goog-upload-command", "")
+        upload = self.uploads[upload_id]
+        if command == "query":
+            return 200, {"X-Goog-Upload-Size-Received": str(upload[0])}, b"{}"
+        upload[0] += len(body)
+        if "finalize" in command:
+            del self.uploads[upload_id]
+            return 200, {}, json.dumps({"file": self._file_resource(f"files/{upload_id}", upload[1])}).encode("utf-8")
+        return 200, {}, b"{}"
@@ -0,0 +1,73 @@
+"""Generate stock metadata (title, description, keywords) for images and videos with Gemini.
+
+The package root only pulls in the Qt-free core; the desktop application
+lives in ``metadata_generator.gui`` and is imported on demand, as are the
+optional features (embedding, keyword cleaning, routing, watch folders).
+"""
+from importlib import import_module
+
+from .core import (GeminiClient, GeminiError, build_file_payload, build_payload, collect_files,
+                   detect_file_type, encode_file, extract_metadata_manually, generate_file_metadata,
+                   parse_metadata_text, parse_response)
+from .batch import BatchRunner
+from .parsing import normalize_metadata, parse_stats
+from .cache import ResultCache, hash_file
+from .memory import MemoryBudget
+from .prompts import ContextCache, PromptTemplate, TemplateError, load_template
+from .transport import HttpTransport, RateLimiter
+
+# Public names of the optional modules, imported on first access
+_LAZY_EXPORTS = {
+    "EmbedError": ".embed",
+    "apply_results": ".embed",
+    "embed_metadata": ".embed",
+    "KeywordProcessor": ".keywords",
+    "Taxonomy": ".keywords",
+    "normalize_keyword": ".keywords",
+    "ModelRoute": ".routing",
+    "ModelRouter": ".routing",
+    "WatchService": ".watch",
+}
+
+__all__ = [
+    "BatchRunner",
+    "ContextCache",
+    "EmbedError",
+    "GeminiClient",
+    "GeminiError",
+    "HttpTransport",
+    "KeywordProcessor",
+    "MemoryBudget",
+    "PromptTemplate",
+    "Taxonomy",
+    "TemplateError",
+    "ModelRoute",
+    "ModelRouter",
+    "RateLimiter",
+    "ResultCache",
+    "WatchService",
+    "apply_results",
+    "build_file_payload",
+    "build_payload",
+    "collect_files",
+    "detect_file_type",
+    "embed_metadata",
+    "encode_file",
+    "extract_metadata_manually",
+    "generate_file_metadata",
+    "hash_file",
+    "load_template",
+    "normalize_keyword",
+    "normalize_metadata",
+    "parse_metadata_text",
+    "parse_response",
+    "parse_stats",
+]
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
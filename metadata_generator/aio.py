@@ -0,0 +1,433 @@
+"""asyncio engine for running hundreds of generateContent calls concurrently.
+
+Uses aiohttp when installed, otherwise httpx. Cache lookups, file reads,
+preprocessing and encoding reuse ``GeminiClient.prepare_request`` and run in
+an executor, so the event loop only ever waits on the network.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+
+from .core import API_BASE_URL, DEFAULT_MODEL, GeminiClient, GeminiError, payload_size
+from .metrics import metrics
+from .transport import (DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX, DEFAULT_CONNECT_TIMEOUT,
+                        DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES, RETRY_STATUSES, backoff_delay, redact,
+                        redact_text, retry_delay)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 64
+
+Result = namedtuple("Result", "index file_path metadata error")
+
+
+def backend_available():
+    for module in ("aiohttp", "httpx"):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        return True
+    return False
+
+
+class _AiohttpBackend:
+    def __init__(self, concurrency, connect_timeout, read_timeout):
+        import aiohttp
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+        self.errors = (aiohttp.ClientError, asyncio.TimeoutError)
+
+    async def post(self, url, body, headers):
+        if not isinstance(body, bytes):
+            # The event loop copies whatever a single write leaves unsent; feed large bodies piecewise
+            headers = dict(headers, **{"Content-Length": str(len(body))})
+            body = _chunks(body)
+        async with self.session.post(url, data=body, headers=headers) as response:
+            return response.status, response.headers, await response.read()
+
+    async def aclose(self):
+        await self.session.close()
+
+
+class _HttpxBackend:
+    def __init__(self, concurrency, connect_timeout, read_timeout):
+        import httpx
+
+        self.session = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+        self.errors = (httpx.TransportError,)
+
+    async def post(self, url, body, headers):
+        if not isinstance(body, bytes):
+            # httpx only takes bytes as a whole; stream other buffers rather than copying them
+            headers = dict(headers, **{"Content-Length": str(len(body))})
+            body = _chunks(body)
+        response = await self.session.post(url, content=body, headers=headers)
+        return response.status_code, response.headers, response.content
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+async def _chunks(body, size=256 * 1024):
+    view = memoryview(body)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+
+def _make_backend(concurrency, connect_timeout, read_timeout):
+    try:
+        return _AiohttpBackend(concurrency, connect_timeout, read_timeout)
+    except ImportError:
+        pass
+    try:
+        return _HttpxBackend(concurrency, connect_timeout, read_timeout)
+    except ImportError:
+        raise GeminiError("The asyncio engine needs aiohttp or httpx installed")
+
+
+def _error_message(status, body):
+    try:
+        error_data = json.loads(body)
+        error_message = error_data.get('error', {}).get('message', f"HTTP Error: {status}")
+        details = error_data.get('error', {}).get('details')
+        if details:
+            error_message += f"\nDetails: {details}"
+    except Exception:
+        error_message = f"HTTP Error: {status}"
+    return f"API Error: {error_message}"
+
+
+class AsyncGeminiClient:
+    """Async counterpart of GeminiClient.
+
+    ``client`` is the GeminiClient used for the blocking halves of each
+    request (cache, preprocessing, encoding, Files API uploads); by default
+    one is built from the remaining arguments. Create it inside a running
+    event loop and call ``aclose`` (or use ``async with``) when done.
+    """
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, base_url=API_BASE_URL, client=None,
+                 concurrency=DEFAULT_CONCURRENCY, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES, rate_limiter=None,
+                 executor=None, **client_options):
+        self.client = client or GeminiClient(api_key, model=model, base_url=base_url, **client_options)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.rate_limiter = rate_limiter
+        self.executor = executor
+        self._backend = _make_backend(concurrency, connect_timeout, read_timeout)
+        # Like HttpTransport: after a 429, every request waits until the quota has recovered
+        self._cooldown_until = 0.0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._backend.aclose()
+
+    async def _wait_for_cooldown(self):
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _cool_down(self, delay):
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        if self.rate_limiter is not None:
+            self.rate_limiter.drain()
+
+    async def _run_blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def generate_content(self, payload, timings=None):
+        """POST a generateContent payload, retrying 429/5xx with backoff, and return the decoded JSON"""
+        if self.client.router is None:
+            return await self._send_content(self.client.model, payload, timings)
+        return await self._with_routes(payload_size(payload), lambda route, retries: self._send_content(
+            route.model, payload, timings, retries, route))
+
+    async def _send_content(self, model, payload, timings=None, retries=None, route=None):
+        """Async counterpart of GeminiClient._send_content"""
+        # Serialising a large payload (and creating a cached context) blocks; keep it off the event loop
+        body, context = await self._run_blocking(self.client.request_body, payload, model, timings)
+        try:
+            return await self._post_content(model, body, timings, retries, route)
+        except GeminiError as e:
+            if not self.client.stale_context(context, e):
+                raise
+        body, _ = await self._run_blocking(self.client.request_body, payload, model, timings)
+        return await self._post_content(model, body, timings, retries, route)
+
+    async def _post_content(self, model, body, timings=None, retries=None, route=None):
+        client = self.client
+        url = f"{client.base_url}/models/{model}:generateContent"
+        metrics.add("bytes_sent", len(body))
+        with metrics.time("request", timings):
+            response_data = await self._post(url, body, retries)
+        if route is not None:
+            client.router.record_usage(route, response_data)
+        return response_data
+
+    async def _with_routes(self, size, call):
+        """Async counterpart of GeminiClient._with_routes"""
+        router = self.client.router
+        tried = set()
+        error = None
+        while True:
+            route = await router.acquire_async(size, tried)
+            if route is None:
+                raise error or GeminiError("No model available")
+            tried.add(route.model)
+            last = router.remaining(tried) == 0
+            started = time.perf_counter()
+            try:
+                result = await call(route, None if last else 0)
+            except GeminiError as e:
+                router.release(route, time.perf_counter() - started, e)
+                if last or not router.fails_over(e):
+                    raise
+                logger.info("%s failed (%s); trying another model", route.model, e)
+                error = e
+                continue
+            router.release(route, time.perf_counter() - started)
+            return result
+
+    async def complete_request(self, request):
+        """Send a prepared request and parse the answer (with a router, unreadable answers fail over too)"""
+        client = self.client
+        if client.router is None:
+            response_data = await self.generate_content(request.payload, request.timings)
+            return await self._run_blocking(client.finish_request, request, response_data)
+
+        size = os.path.getsize(request.file_path) if request.uploaded is not None else payload_size(request.payload)
+
+        async def call(route, retries):
+            response_data = await self._send_content(route.model, request.payload, request.timings, retries, route)
+            return await self._run_blocking(client.finish_request, request, response_data)
+
+        return await self._with_routes(size, call)
+
+    async def _post(self, url, body, retries=None):
+        headers = self.client.auth_headers({"Content-Type": "application/json"})
+        if retries is None:
+            retries = self.retries
+        attempt = 0
+        while True:
+            await self._wait_for_cooldown()
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            try:
+                status, response_headers, content = await self._backend.post(url, body, headers)
+            except self._backend.errors as e:
+                if attempt >= retries:
+                    raise GeminiError(f"Network error: {redact_text(str(e))}")
+                delay = backoff_delay(attempt, DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX)
+                logger.warning("POST %s failed (%s); retrying in %.1fs", redact(url), e, delay)
+            else:
+                if status == 200:
+                    try:
+                        return json.loads(content)
+                    except ValueError as e:
+                        raise GeminiError(f"Failed to parse API response: {str(e)}", unparsable=True)
+                try:
+                    error_data = json.loads(content)
+                except ValueError:
+                    error_data = None
+                delay = retry_delay(response_headers, error_data)
+                if status not in RETRY_STATUSES or attempt >= retries:
+                    raise GeminiError(_error_message(status, content), status=status, retry_after=delay)
+                if delay is None:
+                    delay = backoff_delay(attempt, DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX)
+                if status == 429:
+                    self._cool_down(delay)
+                logger.warning("POST %s returned %d; retrying in %.1fs", redact(url), status, delay)
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def generate(self, file_path, file_type=None):
+        """Generate metadata for one file"""
+        request = None
+        budget = self.client.memory_budget
+        reserved = 0
+        waited = {}
+        try:
+            if budget is not None:
+                # Reserved on the loop, not in the executor: blocked executor threads could starve
+                # the very requests that would free the budget
+                cost = await self._run_blocking(self.client.memory_cost, file_path, file_type)
+                with metrics.time("memory", waited):
+                    await budget.acquire_async(cost)
+                reserved = cost
+            request = await self._run_blocking(self.client.prepare_request, file_path, file_type, None, False)
+            request.timings.update(waited)
+            if request.cached is not None:
+                metrics.file_done(file_path, request.timings, cached=True)
+                return request.cached
+            try:
+                return await self.complete_request(request)
+            finally:
+                if request.uploaded is not None:
+                    await self._run_blocking(self.client.release_request, request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.file_done(file_path, request.timings if request else None, error=str(e))
+            raise
+        finally:
+            if reserved:
+                budget.release(reserved)
+
+    async def _generate_result(self, index, file_path):
+        try:
+            return Result(index, file_path, await self.generate(file_path), None)
+        except GeminiError as e:
+            return Result(index, file_path, None, str(e))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return Result(index, file_path, None, f"Error: {str(e)}")
+
+    async def generate_many(self, file_paths, concurrency=None, gate=None):
+        """Yield a Result per file, in completion order, with at most ``concurrency`` in flight.
+
+        ``file_paths`` may be any iterable and is consumed lazily. When given,
+        ``gate`` (an asyncio.Event) must be set for a new file to start, which
+        is how callers pause the stream; files already in flight still finish
+        and are yielded while it is cleared.
+        """
+        concurrency = concurrency or self.concurrency
+        paths = enumerate(file_paths)
+        pending = set()
+        exhausted = False
+
+        def start():
+            nonlocal exhausted
+            while not exhausted and len(pending) < concurrency and (gate is None or gate.is_set()):
+                try:
+                    index, file_path = next(paths)
+                except StopIteration:
+                    exhausted = True
+                    return
+                pending.add(asyncio.ensure_future(self._generate_result(index, file_path)))
+
+        try:
+            while True:
+                start()
+                if exhausted and not pending:
+                    break
+                waiting = set(pending)
+                opened = None
+                if not exhausted and len(pending) < concurrency and gate is not None and not gate.is_set():
+                    # Paused: wake up for whichever comes first, a finished file or the gate opening
+                    opened = asyncio.ensure_future(gate.wait())
+                    waiting.add(opened)
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if opened is not None:
+                    opened.cancel()
+                    done.discard(opened)
+                pending.difference_update(done)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class AsyncBatchRunner:
+    """Drive ``generate_many`` on a private event loop with the same interface as BatchRunner.
+
+    ``run`` blocks the calling thread (e.g. a QThread); ``pause``, ``resume``
+    and ``cancel`` may be called from any other thread. Unlike the thread
+    pool, cancelling also aborts requests that are already in flight.
+    """
+
+    def __init__(self, client, file_paths, workers=DEFAULT_CONCURRENCY, on_start=None, on_progress=None,
+                 on_result=None, on_error=None, on_done=None, **async_options):
+        self.client = client
+        self.file_paths = list(file_paths)
+        self.workers = max(1, workers)
+        self.async_options = async_options
+        # on_start/on_progress are accepted for interface parity; per-file progress is not tracked
+        self.on_result = on_result or (lambda index, metadata: None)
+        self.on_error = on_error or (lambda index, message: None)
+        self.on_done = on_done or (lambda done, total: None)
+        self._loop = None
+        self._task = None
+        self._gate = None
+        self._paused = False
+        self._cancelled = threading.Event()
+
+    def _call_in_loop(self, func):
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(func)
+            except RuntimeError:
+                pass  # The loop finished in the meantime
+
+    def pause(self):
+        self._paused = True
+        self._call_in_loop(lambda: self._gate.clear())
+
+    def resume(self):
+        self._paused = False
+        self._call_in_loop(lambda: self._gate.set())
+
+    def is_paused(self):
+        return self._paused
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._call_in_loop(lambda: self._task and self._task.cancel())
+
+    async def _main(self):
+        self._gate = asyncio.Event()
+        if not self._paused:
+            self._gate.set()
+        if self._cancelled.is_set():
+            return
+        total = len(self.file_paths)
+        done = 0
+        self.on_done(done, total)
+
+        async with AsyncGeminiClient(None, client=self.client, concurrency=self.workers,
+                                     **self.async_options) as engine:
+            async for result in engine.generate_many(self.file_paths, gate=self._gate):
+                if result.error is None:
+                    self.on_result(result.index, result.metadata)
+                else:
+                    self.on_error(result.index, result.error)
+                done += 1
+                self.on_done(done, total)
+
+    def run(self):
+        """Process every file and block until the queue is drained or cancelled"""
+        if self._cancelled.is_set():
+            return
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._task = self._loop.create_task(self._main())
+            try:
+                self._loop.run_until_complete(self._task)
+            except asyncio.CancelledError:
+                pass
+        finally:
+            self._loop.close()
+            self._loop = None
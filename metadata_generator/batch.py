@@ -0,0 +1,118 @@
+"""Bounded worker pool for processing many files, with pause and cancel."""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .core import GeminiError
+from .multifile import DEFAULT_BATCH_BYTES, generate_batch
+
+
+class BatchRunner:
+    """Run ``client.generate`` over a list of files on a fixed number of worker threads.
+
+    Callbacks are invoked from worker threads with the file's index in
+    ``file_paths``; ``on_done`` is invoked with the overall (done, total) count.
+    With ``files_per_request`` above 1, each worker takes that many files at a
+    time and packs the images among them into shared requests, keeping each
+    request under ``request_bytes`` of inline data.
+    """
+
+    def __init__(self, client, file_paths, workers=4, on_start=None, on_progress=None,
+                 on_result=None, on_error=None, on_done=None, files_per_request=1,
+                 request_bytes=DEFAULT_BATCH_BYTES):
+        self.client = client
+        self.file_paths = list(file_paths)
+        self.workers = max(1, workers)
+        self.files_per_request = max(1, files_per_request)
+        self.request_bytes = request_bytes
+        self.on_start = on_start or (lambda index: None)
+        self.on_progress = on_progress or (lambda index, value: None)
+        self.on_result = on_result or (lambda index, metadata: None)
+        self.on_error = on_error or (lambda index, message: None)
+        self.on_done = on_done or (lambda done, total: None)
+        self._cancelled = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    def is_paused(self):
+        return not self._resume.is_set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Wake paused workers so they can notice the cancellation
+        self._resume.set()
+
+    def _process(self, index, file_path):
+        # Paused workers hold here before picking up their next file
+        self._resume.wait()
+        if self._cancelled.is_set():
+            return
+
+        self.on_start(index)
+        try:
+            metadata = self.client.generate(file_path,
+                                            progress=lambda value: self.on_progress(index, value))
+            self.on_result(index, metadata)
+        except GeminiError as e:
+            self.on_error(index, str(e))
+        except Exception as e:
+            self.on_error(index, f"Error: {str(e)}")
+
+    def _process_group(self, indices):
+        self._resume.wait()
+        if self._cancelled.is_set():
+            return
+
+        for index in indices:
+            self.on_start(index)
+        try:
+            results = generate_batch(self.client, [self.file_paths[index] for index in indices],
+                                     max_items=self.files_per_request, max_bytes=self.request_bytes)
+        except Exception as e:
+            # run() never looks at the futures' results, so report the failure for every file in the group
+            results = [e] * len(indices)
+        for index, result in zip(indices, results):
+            if isinstance(result, GeminiError):
+                self.on_error(index, str(result))
+            elif isinstance(result, Exception):
+                self.on_error(index, f"Error: {str(result)}")
+            else:
+                self.on_result(index, result)
+
+    def run(self):
+        """Process every file and block until the queue is drained or cancelled"""
+        total = len(self.file_paths)
+        done = 0
+        self.on_done(done, total)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            if self.files_per_request > 1:
+                groups = [list(range(start, min(start + self.files_per_request, total)))
+                          for start in range(0, total, self.files_per_request)]
+                futures = {executor.submit(self._process_group, group): len(group) for group in groups}
+            else:
+                futures = {executor.submit(self._process, index, path): 1
+                           for index, path in enumerate(self.file_paths)}
+            try:
+                for future in as_completed(futures):
+                    if self._cancelled.is_set():
+                        break
+                    done += futures[future]
+                    self.on_done(done, total)
+            except BaseException:
+                # e.g. KeyboardInterrupt: stop handing out work before the pool joins
+                self.cancel()
+                raise
+            finally:
+                if self._cancelled.is_set():
+                    # Drop everything that has not started yet; running requests finish normally
+                    for pending in futures:
+                        pending.cancel()
@@ -0,0 +1,149 @@
+"""Persistent result cache keyed by file content, model, prompt and generation config."""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "metadata_generator", "results.sqlite")
+
+
+def hash_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Return the SHA-256 hex digest of a file, reading it in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(content_hash, model, prompt, generation_config, variant=None):
+    """Combine everything that influences the model's answer into one cache key.
+
+    ``variant`` describes how the file was transformed before upload (e.g. the
+    preprocessing settings); it is left out of the key when not set.
+    """
+    parts = [content_hash, model, prompt, generation_config]
+    if variant is not None:
+        parts.append(variant)
+    material = json.dumps(parts, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed metadata cache with size/age eviction and hit/miss counters.
+
+    ``max_entries`` and ``max_bytes`` bound the cache (least recently used
+    entries go first); entries older than ``max_age`` seconds are treated as
+    misses and removed. Safe to share between worker threads.
+    """
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path=None, max_entries=None, max_bytes=None, max_age=None):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key):
+        """Return the cached metadata for ``key`` or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.max_age is not None and now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, metadata):
+        value = json.dumps(metadata)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now)
+            )
+            self._conn.commit()
+            self._puts += 1
+            due = self._puts % self.EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until within the limits"""
+        with self._lock:
+            if self.max_age is not None:
+                self._conn.execute("DELETE FROM results WHERE created < ?",
+                                   (time.time() - self.max_age,))
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            if self.max_entries is not None and count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                count, size = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                ).fetchone()
+            if self.max_bytes is not None and size > self.max_bytes:
+                excess = size - self.max_bytes
+                rows = self._conn.execute("SELECT key, size FROM results ORDER BY accessed")
+                doomed = []
+                for key, entry_size in rows:
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= entry_size
+                self._conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,584 @@
+"""Headless command line entry point: ``python -m metadata_generator``."""
+import os
+import sys
+import signal
+import logging
+import argparse
+import threading
+
+from .core import GeminiClient, API_BASE_URL, DEFAULT_MODEL, UPLOAD_THRESHOLD, collect_files
+from .batch import BatchRunner
+from .multifile import DEFAULT_BATCH_BYTES
+from .parsing import parse_stats
+from .metrics import metrics, serve_prometheus, summary_lines, trace_logger
+from .cache import ResultCache
+from .journal import JobJournal
+from .memory import MemoryBudget
+from .prompts import DEFAULT_CONTEXT_TTL, ContextCache, TemplateError, load_template
+from .export import EXPORT_FORMATS, common_root, format_for_path, make_record, open_exporter
+from .preprocess import DEFAULT_MAX_EDGE, DEFAULT_QUALITY, OUTPUT_FORMATS, ImagePreprocessor
+from .video import SELECTION_MODES, KeyframeSampler
+from .transport import (DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES,
+                        HttpTransport, RateLimiter)
+
+METRICS_INTERVAL = 10
+
+
+def route_spec(spec):
+    from .routing import parse_route
+
+    try:
+        return parse_route(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m metadata_generator",
+        description="Generate title, description and keywords for images and videos with Gemini."
+    )
+    parser.add_argument("paths", nargs="*",
+                        help="Files, directories or glob patterns to process")
+    parser.add_argument("-o", "--output",
+                        help="Write results to this file instead of stdout (for xmp: the sidecar "
+                             "directory, mirroring the input folders; default next to each file)")
+    parser.add_argument("-f", "--format", choices=EXPORT_FORMATS,
+                        help="Output format (default: from --output extension, else json). Results are "
+                             "written as they complete, in completion order")
+    parser.add_argument("--api-key",
+                        help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--api-key-file",
+                        help="Read the Gemini API key from this file")
+    parser.add_argument("--model", default=DEFAULT_MODEL,
+                        help=f"Model name (default: {DEFAULT_MODEL})")
+    parser.add_argument("--route", action="append", type=route_spec, metavar="MODEL[:OPTIONS]",
+                        help="Spread requests over several models (repeatable; overrides --model). Small "
+                             "assets go to the cheapest model, failures fail over to the next. OPTIONS: "
+                             "concurrency=N,rpm=N,burst=N,max-kb=N,input-price=USD,output-price=USD "
+                             "(e.g. gemini-1.5-flash-8b:max-kb=512,rpm=4000)")
+    parser.add_argument("--base-url", default=API_BASE_URL,
+                        help="API base URL, e.g. for a proxy or local stub server")
+    parser.add_argument("--template", metavar="PATH",
+                        help="Prompt template (JSON): prompts, variables such as keyword count or language, "
+                             "and shared system instructions, e.g. one per customer or stock site")
+    parser.add_argument("--context-ttl", type=int, default=DEFAULT_CONTEXT_TTL, metavar="SECONDS",
+                        help="Lifetime of the cached context holding a template's system instructions; it "
+                             f"is renewed while the run lasts and deleted at the end (default: {DEFAULT_CONTEXT_TTL})")
+    parser.add_argument("--no-context-cache", action="store_true",
+                        help="Send a template's system instructions with every request instead of caching them")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Number of concurrent requests (default: 4)")
+    parser.add_argument("--memory-mb", type=float, metavar="MB",
+                        help="Cap the estimated memory held by files in flight (decoded images, request "
+                             "bodies), e.g. 2048; workers wait while it is used up")
+    parser.add_argument("--files-per-request", type=int, default=1, metavar="K",
+                        help="Pack up to K images into one request (threads engine; default: 1)")
+    parser.add_argument("--request-mb", type=float, default=DEFAULT_BATCH_BYTES / (1024 * 1024),
+                        help="Inline data budget per packed request in MB "
+                             f"(default: {DEFAULT_BATCH_BYTES // (1024 * 1024)})")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="Concurrency engine; asyncio (needs aiohttp or httpx) scales to "
+                             "hundreds of in-flight requests (default: threads)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                        help=f"Per-request read timeout in seconds (default: {DEFAULT_READ_TIMEOUT})")
+    parser.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f"Connection timeout in seconds (default: {DEFAULT_CONNECT_TIMEOUT})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"Retries for 429/5xx and network errors (default: {DEFAULT_RETRIES})")
+    parser.add_argument("--rpm", type=float,
+                        help="Cap generateContent calls at this many requests per minute")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="Requests allowed back to back under --rpm (default: 1)")
+    parser.add_argument("--upload-threshold-mb", type=float, default=UPLOAD_THRESHOLD / (1024 * 1024),
+                        help="Stream files larger than this through the Files API "
+                             f"instead of sending them inline (default: {UPLOAD_THRESHOLD // (1024 * 1024)})")
+    parser.add_argument("--max-edge", type=int, default=DEFAULT_MAX_EDGE,
+                        help=f"Downscale images so their longest edge is at most this (default: {DEFAULT_MAX_EDGE})")
+    parser.add_argument("--image-format", choices=sorted(OUTPUT_FORMATS), default="jpeg",
+                        help="Format downscaled images are re-encoded to (default: jpeg)")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help=f"Re-encoding quality (default: {DEFAULT_QUALITY})")
+    parser.add_argument("--no-preprocess", action="store_true",
+                        help="Upload original image bytes without downscaling")
+    parser.add_argument("--video-frames", type=int, default=0, metavar="N",
+                        help="Send N sampled frames instead of the whole video (needs ffmpeg or PyAV; "
+                             "default: 0, upload the whole clip)")
+    parser.add_argument("--frame-selection", choices=SELECTION_MODES, default="uniform",
+                        help="How video frames are chosen (default: uniform)")
+    parser.add_argument("--free-text", action="store_true",
+                        help="Don't request JSON-schema output; parse free-form answers instead")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Send only one image of each group of near-duplicates (burst shots, resized "
+                             "copies) and reuse its result for the others (needs Pillow)")
+    # The defaults of the dedupe and watch options live in those modules, which are only imported when used
+    parser.add_argument("--dedupe-distance", type=int, metavar="BITS",
+                        help="Perceptual hashes differing in at most this many of 64 bits count as "
+                             "duplicates (default: 6)")
+    parser.add_argument("--dedupe-hash", choices=("dhash", "phash"), default="dhash",
+                        help="Perceptual hash: dhash (fast) or phash (more robust to tone changes)")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="Result cache database (default: ~/.cache/metadata_generator/results.sqlite)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the API, even for files seen before")
+    parser.add_argument("--cache-max-mb", type=float,
+                        help="Evict least recently used results above this size")
+    parser.add_argument("--cache-max-age-days", type=float,
+                        help="Treat cached results older than this as stale")
+    parser.add_argument("--journal", metavar="PATH",
+                        help="Record each file's result here as it finishes; rerunning with the same "
+                             "journal skips finished files and retries failed ones")
+    parser.add_argument("--restart", action="store_true",
+                        help="Forget everything recorded in --journal and process all files again")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process files as they appear in the given directories "
+                             "(results are appended to --output, default format jsonl; stop with Ctrl+C "
+                             "or SIGTERM)")
+    parser.add_argument("--settle", type=float, metavar="SECONDS",
+                        help="With --watch, wait until a file has not changed for this long before "
+                             "processing it (default: 2)")
+    parser.add_argument("--queue-size", type=int,
+                        help="With --watch, settled files waiting for a worker; when full, new files wait "
+                             "(default: 64)")
+    parser.add_argument("--poll", action="store_true",
+                        help="With --watch, rescan the directories periodically instead of using inotify "
+                             "(e.g. for network shares)")
+    parser.add_argument("--poll-interval", type=float, metavar="SECONDS",
+                        help="Seconds between rescans when polling (default: 5)")
+    parser.add_argument("--normalize-keywords", action="store_true",
+                        help="Clean keywords before writing them: lowercase, singular nouns, no stop words or "
+                             "duplicates (the cache and journal keep the model's own keywords)")
+    parser.add_argument("--taxonomy", metavar="PATH",
+                        help="Map keywords onto this controlled vocabulary: a text file with 'preferred | synonym "
+                             "| ...' per line, or JSON {preferred: [synonyms]} (implies --normalize-keywords)")
+    parser.add_argument("--drop-unmapped", action="store_true",
+                        help="With --taxonomy, drop keywords the vocabulary does not cover")
+    parser.add_argument("--stop-words", metavar="PATH",
+                        help="More keywords to drop, one per line (implies --normalize-keywords)")
+    parser.add_argument("--max-keywords", type=int, metavar="N",
+                        help="Keep at most N keywords per file (implies --normalize-keywords)")
+    parser.add_argument("--keyword-stats", metavar="PATH",
+                        help="Write a CSV of how many files each keyword was given to (implies --normalize-keywords)")
+    parser.add_argument("--postprocess", metavar="RESULTS",
+                        help="Clean the keywords of a results file (JSON, JSONL or CSV written by -o) with the "
+                             "options above, write it to -o and exit")
+    parser.add_argument("--apply", metavar="RESULTS",
+                        help="Embed the metadata from a results file (JSON or CSV written by -o) into the "
+                             "files it lists, using -w worker threads, then exit")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Append one JSON line per file (stage timings, tokens, outcome) to this file")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="Keep Prometheus text-format metrics in this file, refreshed every "
+                             f"{METRICS_INTERVAL}s (e.g. for node_exporter's textfile collector)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics during the run")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Log per-file details and per-stage latency percentiles to stderr")
+    parser.add_argument("--gui", action="store_true",
+                        help="Launch the desktop application instead")
+    return parser
+
+
+def resolve_api_key(args):
+    if args.api_key:
+        return args.api_key.strip()
+    if args.api_key_file:
+        with open(args.api_key_file, 'r') as file:
+            return file.read().strip()
+    return os.environ.get("GEMINI_API_KEY", "").strip()
+
+
+def build_client(args, api_key):
+    """The GeminiClient configured by the command line, with its cache, preprocessing and transport"""
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(
+            args.cache,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None,
+            max_age=args.cache_max_age_days * 86400 if args.cache_max_age_days else None
+        )
+
+    preprocessor = None
+    if not args.no_preprocess:
+        if ImagePreprocessor.available():
+            preprocessor = ImagePreprocessor(args.max_edge, args.image_format, args.quality)
+        else:
+            print("Pillow is not installed; uploading original images.", file=sys.stderr)
+
+    frame_sampler = None
+    if args.video_frames > 0:
+        if KeyframeSampler.available():
+            frame_sampler = KeyframeSampler(args.video_frames, args.frame_selection)
+        else:
+            print("Neither ffmpeg nor PyAV is installed; uploading whole videos.", file=sys.stderr)
+
+    transport = HttpTransport(
+        pool_size=max(DEFAULT_POOL_SIZE, args.workers),
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.timeout,
+        retries=args.retries,
+        rate_limiter=RateLimiter(args.rpm, args.burst) if args.rpm else None
+    )
+    router = None
+    if args.route:
+        from .routing import ModelRouter
+
+        router = ModelRouter(args.route)
+    memory_budget = MemoryBudget(int(args.memory_mb * 1024 * 1024)) if args.memory_mb else None
+    template = load_template(args.template) if args.template else None
+    context_cache = ContextCache(args.context_ttl) if template is not None and not args.no_context_cache else None
+    return GeminiClient(api_key, model=args.model, base_url=args.base_url, transport=transport,
+                        cache=cache, upload_threshold=int(args.upload_threshold_mb * 1024 * 1024),
+                        preprocessor=preprocessor, frame_sampler=frame_sampler,
+                        structured_output=not args.free_text, router=router, memory_budget=memory_budget,
+                        prompt_template=template, context_cache=context_cache)
+
+
+def build_keyword_processor(args):
+    """The KeywordProcessor asked for by the keyword options, or None; raises OSError/ValueError on bad files"""
+    if not (args.normalize_keywords or args.taxonomy or args.stop_words or args.max_keywords or args.keyword_stats
+            or args.drop_unmapped or args.postprocess):
+        return None
+    from .keywords import DEFAULT_STOP_WORDS, KeywordProcessor, Taxonomy, load_stop_words
+
+    taxonomy = Taxonomy.load(args.taxonomy) if args.taxonomy else None
+    stop_words = DEFAULT_STOP_WORDS | load_stop_words(args.stop_words) if args.stop_words else DEFAULT_STOP_WORDS
+    return KeywordProcessor(taxonomy, stop_words, keep_unmapped=not args.drop_unmapped,
+                            max_keywords=args.max_keywords)
+
+
+def print_keyword_summary(args, processor):
+    """Print keyword statistics to stderr and write --keyword-stats"""
+    stats = processor.stats()
+    line = (f"Keywords: {stats['keywords_in']} in, {stats['keywords_out']} out ({stats['distinct_out']} distinct) "
+            f"for {stats['assets']} files; {stats['stopped']} stop words")
+    if processor.taxonomy is not None:
+        line += f", {stats['mapped']} mapped, {stats['unmapped']} not in the taxonomy"
+    top = ", ".join(f"{keyword} ({count})" for keyword, count in processor.most_common(5))
+    print(line + (f"; top: {top}" if top else ""), file=sys.stderr)
+    if args.keyword_stats:
+        processor.write_frequencies(args.keyword_stats)
+
+
+def start_monitoring(args):
+    """Set up --trace, --metrics-port and --metrics-file; returns a function that stops them"""
+    if args.trace:
+        handler = logging.FileHandler(args.trace)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        # Trace records belong in the trace file only, not in the console log
+        trace_logger.propagate = False
+    metrics_server = serve_prometheus(args.metrics_port) if args.metrics_port else None
+    stop_metrics = threading.Event()
+    if args.metrics_file:
+        def refresh_metrics():
+            while not stop_metrics.wait(METRICS_INTERVAL):
+                metrics.write_prometheus(args.metrics_file)
+
+        threading.Thread(target=refresh_metrics, name="metrics-file", daemon=True).start()
+
+    def stop():
+        stop_metrics.set()
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    return stop
+
+
+def print_summary(args, client):
+    """Print run statistics to stderr, close the result cache and delete cached contexts"""
+    lines = summary_lines(metrics.snapshot())
+    for line in lines if args.verbose else lines[:1]:
+        print(f"Stats: {line}", file=sys.stderr)
+
+    if client.router is not None:
+        from .routing import route_summary_lines
+
+        for line in route_summary_lines(client.router.snapshot()):
+            print(f"Models: {line}", file=sys.stderr)
+
+    if client.memory_budget is not None:
+        stats = client.memory_budget.stats()
+        print(f"Memory: peak {stats['peak'] / 2 ** 20:.1f} of {stats['max_bytes'] / 2 ** 20:.0f} MB reserved; "
+              f"waited {stats['waits']} times, {stats['wait_seconds']:.1f}s in total", file=sys.stderr)
+
+    if client.cache is not None:
+        stats = client.cache.stats()
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses", file=sys.stderr)
+        client.cache.close()
+
+    if not client.prompt_template.builtin:
+        line = f"Template: {client.prompt_template.signature}"
+        if client.context_cache is not None:
+            stats = client.context_cache.stats()
+            line += f"; {stats['created']} cached contexts created, {stats['failed']} refused"
+            client.context_cache.close()
+        print(line, file=sys.stderr)
+
+    if client.preprocessor is not None and client.preprocessor.files:
+        stats = client.preprocessor.stats()
+        print(f"Images: {stats['files']} prepared, {stats['original_bytes']} -> {stats['sent_bytes']} bytes "
+              f"({stats['saved_bytes']} saved)", file=sys.stderr)
+
+    if parse_stats.fallbacks():
+        counts = parse_stats.snapshot()
+        print(f"Parsing: {counts['json']} JSON, {counts['fenced']} fenced, {counts['manual']} manual fallback, "
+              f"{counts['failed']} failed", file=sys.stderr)
+
+
+def apply_main(args):
+    """Embed a results file into its source files in parallel"""
+    from .embed import apply_results, load_results
+
+    try:
+        records = load_results(args.apply)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {args.apply}: {e}", file=sys.stderr)
+        return 1
+
+    lock = threading.Lock()
+
+    def on_error(file_path, message):
+        with lock:
+            print(f"{file_path}: {message}", file=sys.stderr)
+
+    applied, failed, skipped = apply_results(records, workers=args.workers, on_error=on_error)
+    print(f"Applied metadata to {applied} files ({failed} failed, {skipped} skipped)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def postprocess_main(args, processor):
+    """Clean the keywords of a results file in one batch"""
+    from .embed import load_results
+
+    try:
+        records = load_results(args.postprocess)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {args.postprocess}: {e}", file=sys.stderr)
+        return 1
+    records = processor.process_records(records)
+    sources = [record["source_file"] for record in records if record.get("source_file")]
+    exporter = open_exporter(args.format or format_for_path(args.output, format_for_path(args.postprocess)),
+                             args.output, root=common_root(sources))
+    try:
+        for record in records:
+            exporter.write(record)
+    finally:
+        exporter.close()
+    print_keyword_summary(args, processor)
+    return 0
+
+
+def watch_main(args, api_key, processor=None):
+    """Process files as they appear in the watched directories until SIGINT/SIGTERM"""
+    output_format = args.format or format_for_path(args.output, "jsonl")
+    if output_format == "json":
+        print("--watch cannot append to a JSON array; use jsonl, csv or xmp.", file=sys.stderr)
+        return 1
+    exporter = open_exporter(output_format, args.output, append=True, root=common_root(args.paths))
+
+    journal = None
+    if args.journal:
+        journal = JobJournal(args.journal)
+        if args.restart:
+            journal.clear()
+
+    def skip(file_path):
+        return journal is not None and bool(journal.resume([file_path])[0])
+
+    def on_result(file_path, metadata):
+        exporter.write(make_record(file_path, metadata=processor.apply(metadata) if processor else metadata))
+        if journal is not None:
+            journal.record_result(file_path, metadata)
+
+    def on_error(file_path, message):
+        exporter.write(make_record(file_path, error=message))
+        if journal is not None:
+            journal.record_error(file_path, message)
+        print(f"{file_path}: {message}", file=sys.stderr)
+
+    from .watch import DEFAULT_POLL_INTERVAL, DEFAULT_QUEUE_SIZE, DEFAULT_SETTLE, WatchService
+
+    client = build_client(args, api_key)
+    service = WatchService(client, args.paths, workers=args.workers,
+                           queue_size=DEFAULT_QUEUE_SIZE if args.queue_size is None else args.queue_size,
+                           settle=DEFAULT_SETTLE if args.settle is None else args.settle,
+                           poll_interval=DEFAULT_POLL_INTERVAL if args.poll_interval is None else args.poll_interval,
+                           polling=args.poll,
+                           skip=skip, on_result=on_result, on_error=on_error)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: service.stop())
+    print(f"Watching {', '.join(args.paths)}; stop with Ctrl+C.", file=sys.stderr)
+
+    stop_monitoring = start_monitoring(args)
+    metrics.reset()
+    try:
+        service.run()
+    finally:
+        exporter.close()
+        stop_monitoring()
+
+    print(f"Watch: {service.processed} processed, {service.failed} failed", file=sys.stderr)
+    print_summary(args, client)
+    if processor is not None:
+        print_keyword_summary(args, processor)
+    if journal is not None:
+        journal.close()
+    return 1 if service.failed else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.gui:
+        from .gui import main as gui_main
+        return gui_main()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(levelname)s %(name)s: %(message)s")
+
+    if args.apply:
+        return apply_main(args)
+
+    try:
+        processor = build_keyword_processor(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot load keyword options: {e}")
+    if args.postprocess:
+        return postprocess_main(args, processor)
+
+    if not args.paths:
+        parser.error("no input paths given")
+
+    if args.restart and not args.journal:
+        parser.error("--restart needs --journal")
+
+    if args.engine == "asyncio" and args.files_per_request > 1:
+        parser.error("--files-per-request is only supported by the threads engine")
+
+    if args.watch:
+        missing = [path for path in args.paths if not os.path.isdir(path)]
+        if missing:
+            parser.error(f"--watch needs directories: {', '.join(missing)}")
+        if args.engine != "threads" or args.files_per_request > 1 or args.dedupe:
+            parser.error("--watch processes one file per request on the threads engine, without --dedupe")
+
+    if args.template:
+        try:
+            load_template(args.template)
+        except TemplateError as e:
+            parser.error(f"invalid template: {e}")
+
+    api_key = resolve_api_key(args)
+    if not api_key:
+        parser.error("no API key: pass --api-key, --api-key-file or set GEMINI_API_KEY")
+
+    if args.watch:
+        return watch_main(args, api_key, processor)
+
+    file_paths = []
+    for source in args.paths:
+        file_paths.extend(collect_files(source))
+    if not file_paths:
+        print("No image or video files matched.", file=sys.stderr)
+        return 1
+
+    output_format = args.format or format_for_path(args.output)
+    exporter = open_exporter(output_format, args.output, root=common_root(file_paths))
+    # Keywords are cleaned on the way out; the cache and journal keep what the model answered
+    clean = processor.apply if processor is not None else (lambda metadata: metadata)
+    lock = threading.Lock()
+    failures = []
+
+    journal = None
+    pending = list(range(len(file_paths)))
+    if args.journal:
+        journal = JobJournal(args.journal)
+        if args.restart:
+            journal.clear()
+        finished, pending = journal.resume(file_paths)
+        for index, metadata in finished.items():
+            exporter.write(make_record(file_paths[index], metadata=clean(metadata)))
+        if finished:
+            print(f"Journal: {len(finished)} files already done, {len(pending)} to process", file=sys.stderr)
+
+    plan = None
+    if args.dedupe:
+        from .dedupe import DEFAULT_MAX_DISTANCE, DuplicateIndex, DuplicatePlan, available as dedupe_available
+
+        if dedupe_available():
+            distance = DEFAULT_MAX_DISTANCE if args.dedupe_distance is None else args.dedupe_distance
+            plan = DuplicatePlan(DuplicateIndex(distance, args.dedupe_hash), file_paths, pending,
+                                 workers=args.workers)
+            pending = plan.unique
+            if plan.avoided:
+                print(f"Duplicates: {plan.avoided} near-duplicate images will reuse another file's result",
+                      file=sys.stderr)
+        else:
+            print("Pillow is not installed; near-duplicates are not detected.", file=sys.stderr)
+
+    def write_result(index, metadata):
+        exporter.write(make_record(file_paths[index], metadata=clean(metadata)))
+        if journal is not None:
+            journal.record_result(file_paths[index], metadata)
+
+    def write_error(index, message):
+        exporter.write(make_record(file_paths[index], error=message))
+        if journal is not None:
+            journal.record_error(file_paths[index], message)
+        with lock:
+            failures.append(index)
+            print(f"{file_paths[index]}: {message}", file=sys.stderr)
+
+    # Runner indices refer to the pending subset; map them back to positions in file_paths
+    def on_result(position, metadata):
+        index = pending[position]
+        write_result(index, metadata)
+        if plan is not None:
+            for follower, follower_metadata in plan.record(index, metadata):
+                metrics.file_done(file_paths[follower], duplicate_of=file_paths[index])
+                write_result(follower, follower_metadata)
+
+    def on_error(position, message):
+        index = pending[position]
+        write_error(index, message)
+        if plan is not None:
+            reason = f"Near-duplicate of {file_paths[index]}, which failed: {message}"
+            for follower in plan.followers.get(index, []):
+                metrics.file_done(file_paths[follower], error=reason)
+                write_error(follower, reason)
+
+    client = build_client(args, api_key)
+    if args.engine == "asyncio":
+        from .aio import AsyncBatchRunner
+
+        runner = AsyncBatchRunner(client, [file_paths[index] for index in pending], workers=args.workers,
+                                  on_result=on_result, on_error=on_error,
+                                  connect_timeout=args.connect_timeout, read_timeout=args.timeout,
+                                  retries=args.retries, rate_limiter=client.transport.rate_limiter)
+    else:
+        runner = BatchRunner(client, [file_paths[index] for index in pending], workers=args.workers,
+                             on_result=on_result, on_error=on_error,
+                             files_per_request=args.files_per_request,
+                             request_bytes=int(args.request_mb * 1024 * 1024))
+    stop_monitoring = start_monitoring(args)
+    metrics.reset()
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        runner.cancel()
+        print("Interrupted; results so far have been written.", file=sys.stderr)
+    finally:
+        exporter.close()
+        stop_monitoring()
+
+    print_summary(args, client)
+    if processor is not None:
+        print_keyword_summary(args, processor)
+    if journal is not None:
+        journal.close()
+    return 1 if failures else 0
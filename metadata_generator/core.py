@@ -0,0 +1,719 @@
+"""Qt-free core: request builder, Gemini client and response parser.
+
+Nothing in here imports PyQt6 or PIL, and ``requests`` is only imported once
+a client is created, so headless callers start quickly.
+"""
+import os
+import re
+import glob
+import json
+import mmap
+import time
+import base64
+import logging
+from collections import namedtuple
+from itertools import zip_longest
+from urllib.parse import urlsplit
+
+from .cache import hash_file, make_key
+from .memory import base64_length
+from .metrics import metrics
+from .parsing import METADATA_SCHEMA, extract_metadata_manually, parse_metadata_text
+from .prompts import DEFAULT_PROMPTS, DEFAULT_TEMPLATE, STALE_CONTEXT_STATUSES
+from .transport import DEFAULT_READ_TIMEOUT, HttpTransport, redact_text, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_MODEL = "gemini-1.5-flash"
+# The API key travels in this header, never in a URL, so it cannot leak into error messages and logs
+API_KEY_HEADER = "x-goog-api-key"
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# The built-in prompts; a PromptTemplate (see prompts.py) can replace them per client
+PROMPTS = DEFAULT_PROMPTS
+
+MIME_TYPES = {
+    "image": "image/jpeg",
+    "video": "video/mp4",
+}
+
+EXTENSION_MIME_TYPES = {
+    '.png': "image/png",
+    '.jpg': "image/jpeg",
+    '.jpeg': "image/jpeg",
+    '.bmp': "image/bmp",
+    '.gif': "image/gif",
+    '.mp4': "video/mp4",
+    '.mov': "video/mov",
+    '.avi': "video/avi",
+    '.mkv': "video/x-matroska",
+}
+
+# Files above this size are streamed through the Files API instead of sent inline
+UPLOAD_THRESHOLD = 20 * 1024 * 1024
+# Resumable upload chunks must be multiples of 256 KiB (except the last one)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_RETRIES = 3
+# Inline data is base64-encoded this many bytes at a time; a multiple of 3, so the pieces concatenate
+ENCODE_CHUNK_SIZE = 3 * 256 * 1024
+# Request bodies this large get their own anonymous mapping, handed back to the OS as soon as the body is
+# dropped; malloc would keep recycled multi-MB blocks in its arenas and RSS would stay at its peak
+MMAP_BODY_BYTES = 1024 * 1024
+FILE_POLL_INTERVAL = 2.0
+FILE_POLL_TIMEOUT = 600
+
+GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "top_p": 0.95,
+    "top_k": 40
+}
+
+
+def structured_generation_config(schema, base=GENERATION_CONFIG):
+    """Ask the API for JSON matching ``schema`` instead of free text"""
+    return dict(base, response_mime_type="application/json", response_schema=schema)
+
+
+STRUCTURED_GENERATION_CONFIG = structured_generation_config(METADATA_SCHEMA)
+
+
+class GeminiError(Exception):
+    """Raised when a file could not be turned into metadata.
+
+    ``status`` is the HTTP status of a failed API call and ``retry_after``
+    the delay the server asked for; ``unparsable`` marks an answer that
+    arrived but could not be read. Model routing uses them to pick a fallback.
+    """
+
+    def __init__(self, message, status=None, retry_after=None, unparsable=False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.unparsable = unparsable
+
+
+def detect_file_type(file_path):
+    """Return 'image', 'video' or None based on the file extension"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in VIDEO_EXTENSIONS:
+        return "video"
+    return None
+
+
+def collect_files(source):
+    """Expand a directory, glob pattern or single path into a sorted list of media files"""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, names in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in names)
+    elif glob.has_magic(source):
+        paths = glob.glob(source, recursive=True)
+    else:
+        paths = [source]
+
+    return sorted(p for p in paths if os.path.isfile(p) and detect_file_type(p))
+
+
+def mime_type_for(file_path, file_type):
+    """Best guess at a file's MIME type from its extension"""
+    ext = os.path.splitext(file_path)[1].lower()
+    return EXTENSION_MIME_TYPES.get(ext, MIME_TYPES[file_type])
+
+
+def encode_file(file_path):
+    """Read a file and return its contents as a base64 string"""
+    with open(file_path, 'rb') as file:
+        return base64.b64encode(file.read()).decode('utf-8')
+
+
+class InlineData:
+    """Bytes to send inline, base64-encoded only while the request body is written.
+
+    Holds either ``data`` already in memory or a ``file_path`` that is read
+    in chunks at that point. ``len()`` is the length of the encoding.
+    """
+
+    def __init__(self, data=None, file_path=None):
+        self.data = data
+        self.file_path = file_path
+        self.size = len(data) if data is not None else os.path.getsize(file_path)
+
+    def __len__(self):
+        return base64_length(self.size)
+
+    def chunks(self):
+        if self.data is not None:
+            view = memoryview(self.data)
+            for start in range(0, len(view), ENCODE_CHUNK_SIZE):
+                yield view[start:start + ENCODE_CHUNK_SIZE]
+            return
+        remaining = self.size
+        with open(self.file_path, 'rb') as file:
+            while remaining > 0:
+                chunk = file.read(min(ENCODE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+_INLINE_MARKER = re.compile(r'"\\u0000inline(\d+)\\u0000"')
+
+
+def encode_body(payload, timings=None):
+    """Serialise a generateContent payload to UTF-8 JSON and return it as a memoryview.
+
+    InlineData values are base64-encoded chunk by chunk straight into one
+    preallocated buffer, so neither the raw file nor a base64 string of it
+    is held next to the body. Time spent reading files is recorded as the
+    "read" stage, the rest as "encode".
+    """
+    started = time.perf_counter()
+    reading = 0.0
+    sources = []
+
+    def placeholder(value):
+        if not isinstance(value, InlineData):
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+        sources.append(value)
+        return f"\0inline{len(sources) - 1}\0"
+
+    pieces = _INLINE_MARKER.split(json.dumps(payload, default=placeholder))
+    texts = [piece.encode('utf-8') for piece in pieces[::2]]
+    inline = [sources[int(index)] for index in pieces[1::2]]
+    size = sum(map(len, texts)) + sum(len(source) + 2 for source in inline)
+    body = memoryview(mmap.mmap(-1, size) if size >= MMAP_BODY_BYTES else bytearray(size))
+    position = 0
+    for text, source in zip_longest(texts, inline):
+        body[position:position + len(text)] = text
+        position += len(text)
+        if source is None:
+            continue
+        encoded_end = position + len(source) + 1
+        body[position:position + 1] = b'"'
+        position += 1
+        chunks = source.chunks()
+        while True:
+            read_started = time.perf_counter()
+            chunk = next(chunks, None)
+            reading += time.perf_counter() - read_started
+            if chunk is None:
+                break
+            encoded = base64.b64encode(chunk)
+            body[position:position + len(encoded)] = encoded
+            position += len(encoded)
+        if position != encoded_end:
+            raise GeminiError(f"{source.file_path} changed while it was being read")
+        body[position:position + 1] = b'"'
+        position += 1
+    if any(source.file_path is not None for source in inline):
+        metrics.record("read", reading, timings)
+    metrics.record("encode", time.perf_counter() - started - reading, timings)
+    return body
+
+
+def payload_size(payload):
+    """Bytes of inline data in a payload, which is what requests are routed on"""
+    return sum(len(part["inline_data"]["data"]) for content in payload["contents"] for part in content["parts"]
+               if "inline_data" in part)
+
+
+def _content_payload(file_type, file_part, generation_config=None, prompt=None):
+    return {
+        "contents": [
+            {
+                "parts": [
+                    {"text": prompt or PROMPTS[file_type]},
+                    file_part
+                ]
+            }
+        ],
+        "generation_config": generation_config or GENERATION_CONFIG
+    }
+
+
+def build_payload(file_b64, file_type, generation_config=None, mime_type=None, prompt=None):
+    """Build the generateContent request body for one inline file (a base64 string or InlineData)"""
+    return _content_payload(file_type, {
+        "inline_data": {
+            "mime_type": mime_type or MIME_TYPES[file_type],
+            "data": file_b64
+        }
+    }, generation_config, prompt)
+
+
+def build_file_payload(file_uri, file_type, generation_config=None, mime_type=None, prompt=None):
+    """Build the generateContent request body referencing a file uploaded through the Files API"""
+    return _content_payload(file_type, {
+        "file_data": {
+            "mime_type": mime_type or MIME_TYPES[file_type],
+            "file_uri": file_uri
+        }
+    }, generation_config, prompt)
+
+
+def build_frames_payload(frames, generation_config=None, prompt=None):
+    """Build a multi-image generateContent request body from sampled JPEG video frames"""
+    parts = [{"text": prompt or PROMPTS["video_frames"]}]
+    for frame in frames:
+        parts.append({
+            "inline_data": {
+                "mime_type": "image/jpeg",
+                "data": InlineData(frame)
+            }
+        })
+    return {
+        "contents": [{"parts": parts}],
+        "generation_config": generation_config or GENERATION_CONFIG
+    }
+
+
+def upload_url_for(base_url):
+    """Map an API base URL (https://host/v1beta) to its upload endpoint (https://host/upload/v1beta/files)"""
+    parts = urlsplit(base_url)
+    return f"{parts.scheme}://{parts.netloc}/upload{parts.path.rstrip('/')}/files"
+
+
+def api_error_message(response):
+    """Turn a non-200 response into a readable error message"""
+    try:
+        error_data = response.json()
+        error_message = error_data.get('error', {}).get('message', f"HTTP Error: {response.status_code}")
+        if 'details' in error_data.get('error', {}):
+            details = error_data['error']['details']
+            if details:
+                error_message += f"\nDetails: {details}"
+    except Exception:
+        error_message = f"HTTP Error: {response.status_code}"
+    return f"API Error: {error_message}"
+
+
+def parse_response(response_data):
+    """Extract the metadata dict from a decoded generateContent response"""
+    # Extract the content from Gemini's response structure
+    try:
+        text_content = response_data['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+        raise GeminiError("No valid response from Gemini API", unparsable=True)
+
+    metadata = parse_metadata_text(text_content)
+    if metadata is None:
+        raise GeminiError("Could not find a title or keywords in the model's answer", unparsable=True)
+    return metadata
+
+
+# ``reserved`` is the share of the client's memory budget held until release_request
+PreparedRequest = namedtuple("PreparedRequest",
+                             "file_path cache_key payload cached uploaded video_info timings reserved file_type",
+                             defaults=(0, None))
+
+
+class GeminiClient:
+    """Minimal Gemini generateContent client shared by the GUI and the CLI.
+
+    With a ``router`` (see routing.ModelRouter) each request goes to the model
+    the router picks, and failed or unreadable answers are retried on another
+    model; ``model`` is then unused. With a ``memory_budget`` (see
+    memory.MemoryBudget) each file reserves its estimated memory before it is
+    read, and workers wait while the budget is exhausted.
+
+    ``prompt_template`` (see prompts.PromptTemplate) replaces the built-in
+    prompts. Its system instruction is referenced through ``context_cache``
+    (a prompts.ContextCache, best shared between clients) when it is long
+    enough to be cached, and sent inline with every request otherwise.
+    """
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, base_url=API_BASE_URL, timeout=None, cache=None,
+                 upload_threshold=UPLOAD_THRESHOLD, upload_chunk_size=UPLOAD_CHUNK_SIZE, preprocessor=None,
+                 frame_sampler=None, transport=None, structured_output=True, router=None, memory_budget=None,
+                 prompt_template=None, context_cache=None):
+        self.api_key = api_key
+        self.model = model
+        self.router = router
+        self.memory_budget = memory_budget
+        self.base_url = base_url.rstrip('/')
+        if transport is None:
+            # A private pool; share one HttpTransport between clients to reuse connections
+            transport = HttpTransport(read_timeout=timeout or DEFAULT_READ_TIMEOUT)
+        self.transport = transport
+        self.cache = cache
+        self.upload_threshold = upload_threshold
+        self.upload_chunk_size = upload_chunk_size
+        self.preprocessor = preprocessor
+        self.frame_sampler = frame_sampler
+        self.structured_output = structured_output
+        self.generation_config = STRUCTURED_GENERATION_CONFIG if structured_output else GENERATION_CONFIG
+        self.prompt_template = prompt_template or DEFAULT_TEMPLATE
+        self.context_cache = context_cache
+
+    def auth_headers(self, headers=None):
+        """``headers`` plus the one carrying the API key"""
+        return dict(headers or {}, **{API_KEY_HEADER: self.api_key})
+
+    def generate_content(self, payload, timings=None):
+        """POST a generateContent payload and return the decoded JSON response"""
+        if self.router is None:
+            return self._send_content(self.model, payload, timings)
+        return self._with_routes(payload_size(payload), lambda route, retries: self._send_content(
+            route.model, payload, timings, retries, route))
+
+    def request_body(self, payload, model, timings=None):
+        """Encode ``payload`` for ``model`` with the template's system instruction attached.
+
+        Returns ``(body, context)``, where ``context`` names the cached context
+        the body refers to instead of repeating the instruction, or is None.
+        """
+        context = None
+        system = self.prompt_template.system
+        if system is not None:
+            if self.context_cache is not None:
+                context = self.context_cache.lookup(self, model, self.prompt_template)
+            if context is not None:
+                payload = dict(payload, cached_content=context)
+            else:
+                payload = dict(payload, system_instruction={"parts": [{"text": system}]})
+        return encode_body(payload, timings), context
+
+    def stale_context(self, context, error):
+        """Whether ``error`` means the cached ``context`` is gone; it is then dropped so a retry sends a new one"""
+        if context is None or error.status not in STALE_CONTEXT_STATUSES:
+            return False
+        logger.info("Cached context %s is gone (%s); creating a new one", context, error)
+        self.context_cache.discard(context)
+        return True
+
+    def _send_content(self, model, payload, timings=None, retries=None, route=None):
+        body, context = self.request_body(payload, model, timings)
+        try:
+            return self._post_content(model, body, timings, retries, route)
+        except GeminiError as e:
+            if not self.stale_context(context, e):
+                raise
+        body, _ = self.request_body(payload, model, timings)
+        return self._post_content(model, body, timings, retries, route)
+
+    def _post_content(self, model, body, timings=None, retries=None, route=None):
+        import requests  # Deferred so importing the core stays cheap
+
+        url = f"{self.base_url}/models/{model}:generateContent"
+        headers = self.auth_headers({
+            "Content-Type": "application/json"
+        })
+        metrics.add("bytes_sent", len(body))
+        try:
+            with metrics.time("request", timings):
+                response = self.transport.post(url, data=body, headers=headers, rate_limited=True,
+                                               retries=retries)
+        except requests.RequestException as e:
+            raise GeminiError(f"Network error: {redact_text(str(e))}")
+
+        if response.status_code != 200:
+            raise GeminiError(api_error_message(response), status=response.status_code,
+                              retry_after=retry_after_seconds(response))
+
+        try:
+            response_data = response.json()
+        except Exception as e:
+            raise GeminiError(f"Failed to parse API response: {str(e)}", unparsable=True)
+        if route is not None:
+            self.router.record_usage(route, response_data)
+        return response_data
+
+    def _with_routes(self, size, call):
+        """Run ``call(route, retries)`` on the router's models in turn until one succeeds.
+
+        Every model but the last gets a single attempt, so a 429 or 5xx moves
+        straight on to the next model instead of waiting out the backoff.
+        """
+        tried = set()
+        error = None
+        while True:
+            route = self.router.acquire(size, tried)
+            if route is None:
+                raise error or GeminiError("No model available")
+            tried.add(route.model)
+            last = self.router.remaining(tried) == 0
+            started = time.perf_counter()
+            try:
+                result = call(route, None if last else 0)
+            except GeminiError as e:
+                self.router.release(route, time.perf_counter() - started, e)
+                if last or not self.router.fails_over(e):
+                    raise
+                logger.info("%s failed (%s); trying another model", route.model, e)
+                error = e
+                continue
+            self.router.release(route, time.perf_counter() - started)
+            return result
+
+    def complete_request(self, request):
+        """Send a prepared request and parse the answer (with a router, unreadable answers fail over too)"""
+        if self.router is None:
+            return self.finish_request(request, self.generate_content(request.payload, request.timings))
+
+        # An uploaded file is referenced, not inlined; route on the asset's own size
+        size = os.path.getsize(request.file_path) if request.uploaded is not None else payload_size(request.payload)
+        return self._with_routes(size, lambda route, retries: self.finish_request(
+            request, self._send_content(route.model, request.payload, request.timings, retries, route)))
+
+    def upload_file(self, file_path, mime_type, progress=None):
+        """Stream a file to the Files API with the resumable protocol and return its file resource.
+
+        Only one chunk is held in memory at a time. A failed chunk is retried
+        from the offset the server reports as received.
+        """
+        import requests
+
+        if progress is None:
+            progress = lambda sent, total: None
+        total = os.path.getsize(file_path)
+
+        try:
+            response = self.transport.post(
+                upload_url_for(self.base_url),
+                headers=self.auth_headers({
+                    "X-Goog-Upload-Protocol": "resumable",
+                    "X-Goog-Upload-Command": "start",
+                    "X-Goog-Upload-Header-Content-Length": str(total),
+                    "X-Goog-Upload-Header-Content-Type": mime_type,
+                    "Content-Type": "application/json"
+                }),
+                json={"file": {"display_name": os.path.basename(file_path)}}
+            )
+        except requests.RequestException as e:
+            raise GeminiError(f"Network error: {redact_text(str(e))}")
+        upload_url = response.headers.get("X-Goog-Upload-URL")
+        if response.status_code != 200 or not upload_url:
+            raise GeminiError(api_error_message(response))
+
+        offset = 0
+        failures = 0
+        with open(file_path, 'rb') as file:
+            while True:
+                file.seek(offset)
+                chunk = file.read(self.upload_chunk_size)
+                last = offset + len(chunk) >= total
+                if not chunk and not last:
+                    # The file shrank while it was being uploaded
+                    raise GeminiError(f"{os.path.basename(file_path)} changed during the upload")
+                try:
+                    response = self.transport.post(
+                        upload_url,
+                        headers={
+                            "X-Goog-Upload-Command": "upload, finalize" if last else "upload",
+                            "X-Goog-Upload-Offset": str(offset),
+                            "Content-Length": str(len(chunk))
+                        },
+                        data=chunk
+                    )
+                    ok = response.status_code == 200
+                except requests.RequestException:
+                    response, ok = None, False
+
+                if ok:
+                    metrics.add("bytes_uploaded", len(chunk))
+                    offset += len(chunk)
+                    failures = 0
+                    progress(offset, total)
+                    if last:
+                        break
+                    continue
+
+                failures += 1
+                if failures > UPLOAD_RETRIES:
+                    if response is not None:
+                        raise GeminiError(api_error_message(response))
+                    raise GeminiError(f"Upload of {os.path.basename(file_path)} failed")
+                offset = self._received_offset(upload_url, offset)
+
+        try:
+            file_resource = response.json()["file"]
+        except Exception as e:
+            raise GeminiError(f"Failed to parse upload response: {str(e)}")
+        return self._wait_until_active(file_resource)
+
+    def _received_offset(self, upload_url, fallback):
+        """Ask the upload session how many bytes it has committed"""
+        import requests
+
+        try:
+            response = self.transport.post(upload_url, headers={"X-Goog-Upload-Command": "query"})
+            return int(response.headers["X-Goog-Upload-Size-Received"])
+        except (requests.RequestException, KeyError, ValueError):
+            return fallback
+
+    def _wait_until_active(self, file_resource):
+        """Poll an uploaded file until the service has finished processing it"""
+        deadline = time.monotonic() + FILE_POLL_TIMEOUT
+        while file_resource.get("state", "ACTIVE") == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise GeminiError(f"Timed out waiting for {file_resource.get('name')} to be processed")
+            time.sleep(FILE_POLL_INTERVAL)
+            response = self.transport.get(f"{self.base_url}/{file_resource['name']}", headers=self.auth_headers())
+            if response.status_code != 200:
+                raise GeminiError(api_error_message(response))
+            file_resource = response.json()
+
+        if file_resource.get("state") == "FAILED":
+            raise GeminiError(f"Processing of {file_resource.get('name')} failed")
+        return file_resource
+
+    def delete_file(self, name):
+        """Best-effort removal of an uploaded file once it is no longer needed"""
+        import requests
+
+        try:
+            self.transport.delete(f"{self.base_url}/{name}", headers=self.auth_headers())
+        except requests.RequestException:
+            pass
+
+    def generate(self, file_path, file_type=None, progress=None):
+        """Run the full read/encode/request/parse cycle for one file and return its metadata"""
+        if progress is None:
+            progress = lambda value: None
+        request = None
+        try:
+            request = self.prepare_request(file_path, file_type, progress)
+            if request.cached is not None:
+                metrics.file_done(file_path, request.timings, cached=True)
+                progress(100)
+                return request.cached
+
+            progress(75)
+            try:
+                metadata = self.complete_request(request)
+            finally:
+                self.release_request(request)
+        except Exception as e:
+            metrics.file_done(file_path, request.timings if request else None, error=str(e))
+            raise
+        progress(100)
+        return metadata
+
+    def memory_cost(self, file_path, file_type=None):
+        """Estimated bytes a file holds from reading it until its response arrives"""
+        file_type = file_type or detect_file_type(file_path)
+        size = os.path.getsize(file_path)
+        if self.upload_threshold is not None and size > self.upload_threshold:
+            cost = self.upload_chunk_size
+        else:
+            cost = base64_length(size)
+        preprocessor = self.preprocessor if file_type == "image" else self.frame_sampler
+        if preprocessor is not None and hasattr(preprocessor, "memory_estimate"):
+            cost = max(cost, preprocessor.memory_estimate(file_path))
+        return cost
+
+    def prepare_request(self, file_path, file_type=None, progress=None, reserve=True):
+        """Do everything up to the generateContent call: cache lookup, preprocessing, upload.
+
+        Returns a PreparedRequest; when ``cached`` is set there is nothing left
+        to send. Blocking, so async callers run it in an executor. On a cache
+        miss the file's memory_cost is reserved from ``memory_budget`` unless
+        ``reserve`` is false (the caller has reserved it already).
+        """
+        if progress is None:
+            progress = lambda value: None
+        file_type = file_type or detect_file_type(file_path)
+        if file_type not in MIME_TYPES:
+            raise GeminiError(f"Unsupported file type: {file_path}")
+
+        preprocessor = self.preprocessor if file_type == "image" else self.frame_sampler
+        timings = {}
+        cache_key = None
+        if self.cache is not None:
+            # Hashing streams the file, so a hit never loads it into memory
+            with metrics.time("cache", timings):
+                model = self.router.signature() if self.router is not None else self.model
+                cache_key = make_key(hash_file(file_path), model, self.prompt_template.cache_material(file_type),
+                                     self.generation_config,
+                                     variant=preprocessor.signature() if preprocessor else None)
+                metadata = self.cache.get(cache_key)
+            if metadata is not None:
+                return PreparedRequest(file_path, cache_key, None, metadata, None, None, timings)
+
+        reserved = 0
+        if reserve and self.memory_budget is not None:
+            reserved = self.memory_cost(file_path, file_type)
+            with metrics.time("memory", timings):
+                self.memory_budget.acquire(reserved)
+        try:
+            return self._prepare_payload(file_path, file_type, preprocessor, cache_key, timings, reserved,
+                                         progress)
+        except BaseException:
+            if reserved:
+                self.memory_budget.release(reserved)
+            raise
+
+    def _prepare_payload(self, file_path, file_type, preprocessor, cache_key, timings, reserved, progress):
+        """prepare_request after a cache miss: preprocess or upload, and build the payload"""
+        uploaded = None
+        prepared = None
+        video_info = None
+        progress(25)
+        if preprocessor is not None:
+            try:
+                with metrics.time("preprocess", timings):
+                    prepared = preprocessor(file_path)
+            except Exception as e:
+                # Formats the decoder cannot read (e.g. HEIC without a plugin) are sent as they are
+                logger.warning("%s: preprocessing failed, sending original: %s", file_path, e)
+
+        if prepared is not None and file_type == "video":
+            video_info, frames = prepared
+            progress(50)
+            payload = build_frames_payload(frames, self.generation_config,
+                                           prompt=self.prompt_template.prompt("video_frames"))
+        elif prepared is not None:
+            # Downscaled images are small enough to always go inline
+            metrics.add("bytes_read", prepared.original_bytes)
+            progress(50)
+            payload = build_payload(InlineData(prepared.data), file_type, self.generation_config,
+                                    mime_type=prepared.mime_type, prompt=self.prompt_template.prompt(file_type))
+        elif self.upload_threshold is not None and os.path.getsize(file_path) > self.upload_threshold:
+            # Large files go through the Files API so they are never held in memory whole
+            mime_type = mime_type_for(file_path, file_type)
+            with metrics.time("upload", timings):
+                uploaded = self.upload_file(file_path, mime_type,
+                                            progress=lambda sent, total: progress(25 + 50 * sent // total))
+            payload = build_file_payload(uploaded["uri"], file_type, self.generation_config, mime_type=mime_type,
+                                         prompt=self.prompt_template.prompt(file_type))
+        else:
+            # Read and encoded in chunks only when the request body is written
+            inline = InlineData(file_path=file_path)
+            metrics.add("bytes_read", inline.size)
+            progress(50)
+            payload = build_payload(inline, file_type, self.generation_config,
+                                    mime_type=mime_type_for(file_path, file_type),
+                                    prompt=self.prompt_template.prompt(file_type))
+        return PreparedRequest(file_path, cache_key, payload, None, uploaded, video_info, timings, reserved,
+                               file_type)
+
+    def finish_request(self, request, response_data):
+        """Parse a generateContent response for a prepared request and store it in the cache"""
+        with metrics.time("parse", request.timings):
+            metadata = parse_response(response_data)
+        usage = metrics.record_usage(response_data)
+        if request.video_info is not None and isinstance(metadata, dict):
+            metadata["container"] = request.video_info.container
+            metadata["codec"] = request.video_info.codec
+        if request.cache_key is not None:
+            self.cache.put(request.cache_key, metadata)
+        metrics.file_done(request.file_path, request.timings, usage)
+        return metadata
+
+    def release_request(self, request):
+        """Free server-side resources (uploaded files) and the memory budget held by a prepared request"""
+        if request.reserved:
+            self.memory_budget.release(request.reserved)
+        if request.uploaded is not None:
+            self.delete_file(request.uploaded["name"])
+
+
+def generate_file_metadata(api_key, file_path, file_type=None, progress=None, cache=None):
+    """Convenience wrapper: generate metadata for one file with a fresh client"""
+    return GeminiClient(api_key, cache=cache).generate(file_path, file_type, progress)
@@ -0,0 +1,214 @@
+"""Perceptual hashing to spot near-duplicate images and reuse one answer for all of them.
+
+Burst shots and resized or re-encoded variants hash to within a few bits of
+each other. Before a batch starts, every image is hashed from a tiny
+thumbnail (dHash by default, pHash optionally) and grouped with a BK-tree
+search. Only the first image of each group is sent; the others get a copy of
+its result. Results are also kept in a DuplicateIndex, so later batches in
+the same session reuse them too.
+
+Pillow is imported lazily; without it nothing is deduplicated.
+"""
+import copy
+import math
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .core import detect_file_type
+
+logger = logging.getLogger(__name__)
+
+HASH_METHODS = ("dhash", "phash")
+HASH_SIZE = 8
+PHASH_SAMPLE = 32
+# Bits (out of 64) two hashes may differ by and still count as the same picture
+DEFAULT_MAX_DISTANCE = 6
+
+
+def available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _small_grayscale(file_path, size):
+    from PIL import Image, ImageOps
+
+    with Image.open(file_path) as image:
+        # JPEGs decode at 1/8 scale straight away; the hash only needs a few dozen pixels
+        image.draft("L", (size[0] * 4, size[1] * 4))
+        image = ImageOps.exif_transpose(image)
+        return image.convert("L").resize(size, Image.Resampling.BILINEAR)
+
+
+def dhash(file_path, hash_size=HASH_SIZE):
+    """Difference hash: one bit per horizontally adjacent pixel pair of a (size+1) x size thumbnail"""
+    pixels = _small_grayscale(file_path, (hash_size + 1, hash_size)).tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def _dct_matrix(size, keep):
+    return [[math.cos(math.pi * (2 * x + 1) * u / (2 * size)) for x in range(size)] for u in range(keep)]
+
+
+_DCT = _dct_matrix(PHASH_SAMPLE, HASH_SIZE)
+
+
+def phash(file_path, hash_size=HASH_SIZE):
+    """DCT hash: low-frequency 8x8 DCT coefficients of a 32x32 thumbnail compared with their median.
+
+    Slower than dHash but more tolerant of contrast and gamma changes.
+    """
+    size = PHASH_SAMPLE
+    pixels = _small_grayscale(file_path, (size, size)).tobytes()
+    rows = [pixels[y * size:(y + 1) * size] for y in range(size)]
+    # The 2-D DCT is separable; only the first hash_size frequencies of each axis are needed
+    partial = [[sum(c * p for c, p in zip(basis, row)) for basis in _DCT[:hash_size]] for row in rows]
+    coefficients = [sum(_DCT[u][y] * partial[y][v] for y in range(size))
+                    for u in range(hash_size) for v in range(hash_size)]
+    median = sorted(coefficients[1:])[len(coefficients) // 2 - 1]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+HASHERS = {"dhash": dhash, "phash": phash}
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance: finds hashes within ``d`` bits without a full scan"""
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        node = (value, item, {})
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def nearest(self, value, max_distance):
+        """Return ``(distance, item)`` of the closest entry within ``max_distance``, or None"""
+        best = None
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, item)
+            # Triangle inequality: only children within max_distance of this node's distance can match
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    stack.append(child)
+        return best
+
+
+class DuplicateIndex:
+    """Perceptual hashes of files that already have a result; safe to share between threads"""
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, method="dhash"):
+        if method not in HASHERS:
+            raise ValueError(f"Unsupported hash method: {method}")
+        self.max_distance = max_distance
+        self.method = method
+        self.hash = HASHERS[method]
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+
+    def add(self, value, file_path, metadata):
+        with self._lock:
+            self._tree.add(value, (file_path, metadata))
+
+    def nearest(self, value):
+        """``(distance, (file_path, metadata))`` of the closest known result, or None"""
+        with self._lock:
+            return self._tree.nearest(value, self.max_distance)
+
+    def __len__(self):
+        return self._tree.size
+
+
+class DuplicatePlan:
+    """Which files of a batch need a request, and which can copy another file's result.
+
+    ``unique`` lists the indices to send. ``followers`` maps each of those to
+    the indices that will copy its result. ``reused`` maps indices to
+    ``(source_path, metadata)`` results already known to the index.
+    ``hashes`` keeps every computed hash, for ``record``.
+    """
+
+    def __init__(self, index, file_paths, indices, workers=8):
+        self.index = index
+        self.file_paths = file_paths
+        self.unique = []
+        self.followers = {}
+        self.reused = {}
+        self.hashes = {}
+
+        images = [i for i in indices if detect_file_type(file_paths[i]) == "image"]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for i, value in zip(images, executor.map(self._hash, images)):
+                if value is not None:
+                    self.hashes[i] = value
+
+        # Group the batch greedily in input order; the first image of a group is its representative
+        representatives = BKTree()
+        for i in indices:
+            value = self.hashes.get(i)
+            if value is None:
+                self.unique.append(i)
+                continue
+            known = index.nearest(value)
+            if known is not None:
+                self.reused[i] = known[1]
+                continue
+            match = representatives.nearest(value, index.max_distance)
+            if match is not None:
+                self.followers[match[1]].append(i)
+                continue
+            representatives.add(value, i)
+            self.followers[i] = []
+            self.unique.append(i)
+        self.followers = {i: group for i, group in self.followers.items() if group}
+
+    def _hash(self, i):
+        try:
+            return self.index.hash(self.file_paths[i])
+        except Exception as e:
+            # Unreadable images are simply sent on their own
+            logger.debug("%s: could not hash: %s", self.file_paths[i], e)
+            return None
+
+    @property
+    def avoided(self):
+        """Requests saved by this plan"""
+        return len(self.reused) + sum(len(group) for group in self.followers.values())
+
+    def record(self, i, metadata):
+        """Remember the result of a sent file; returns ``[(follower index, metadata copy)]``"""
+        if i in self.hashes:
+            self.index.add(self.hashes[i], self.file_paths[i], metadata)
+        return [(follower, copy.deepcopy(metadata)) for follower in self.followers.get(i, [])]
@@ -0,0 +1,711 @@
+"""Write title, description and keywords into image and video files without re-encoding them.
+
+Only the metadata containers are rebuilt; pixel and sample data is copied
+byte for byte:
+
+* JPEG: XMP (APP1), IPTC (APP13) and, if the file has EXIF, ImageDescription
+  and the Windows XPTitle/XPKeywords tags.
+* PNG: XMP in an ``iTXt`` chunk (PNG has no standard IPTC container).
+* TIFF: XMP, IPTC and ImageDescription in a new IFD0 appended to the file.
+* MP4: XMP in a top-level ``uuid`` box appended to the file.
+* MOV: XMP in ``moov/udta/XMP_``; chunk offsets are shifted when moov sits
+  in front of the media data.
+
+Existing XMP and IPTC properties other than ours are kept. Every write goes
+to a temporary file next to the target that atomically replaces it.
+"""
+import io
+import os
+import csv
+import json
+import shutil
+import struct
+import zlib
+import tempfile
+import logging
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .parsing import split_keywords
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+DEFAULT_APPLY_WORKERS = 8
+
+NS_X = "adobe:ns:meta/"
+NS_RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+NS_DC = "http://purl.org/dc/elements/1.1/"
+NS_XML = "http://www.w3.org/XML/1998/namespace"
+for _prefix, _uri in (("x", NS_X), ("rdf", NS_RDF), ("dc", NS_DC)):
+    ET.register_namespace(_prefix, _uri)
+XMP_FIELDS = {f"{{{NS_DC}}}title", f"{{{NS_DC}}}description", f"{{{NS_DC}}}subject"}
+XMP_PACKET_HEADER = '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>\n'
+XMP_PACKET_TRAILER = '\n<?xpacket end="w"?>'
+XMP_PADDING = 2048
+
+JPEG_XMP_SIGNATURE = b"http://ns.adobe.com/xap/1.0/\x00"
+JPEG_EXIF_SIGNATURE = b"Exif\x00\x00"
+JPEG_PHOTOSHOP_SIGNATURE = b"Photoshop 3.0\x00"
+JPEG_MAX_SEGMENT = 65533
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_XMP_KEYWORD = b"XML:com.adobe.xmp"
+MP4_XMP_UUID = bytes.fromhex("BE7ACFCB97A942E89C71999491E3AFAC")
+
+# IPTC IIM datasets we own: record 1 charset, record 2 title/keywords/caption
+IPTC_CHARSET = (1, 90)
+IPTC_OBJECT_NAME = (2, 5)
+IPTC_KEYWORDS = (2, 25)
+IPTC_CAPTION = (2, 120)
+IPTC_LIMITS = {IPTC_OBJECT_NAME: 64, IPTC_KEYWORDS: 64, IPTC_CAPTION: 2000}
+PHOTOSHOP_IPTC = 0x0404
+PHOTOSHOP_IPTC_DIGEST = 0x0425
+
+TIFF_BYTE, TIFF_ASCII, TIFF_LONG, TIFF_UNDEFINED = 1, 2, 4, 7
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+TIFF_IMAGE_DESCRIPTION = 270
+TIFF_XMP = 700
+TIFF_IPTC = 33723
+TIFF_XP_TITLE = 0x9C9B
+TIFF_XP_KEYWORDS = 0x9C9E
+
+MOOV_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"edts", b"dinf", b"mvex"}
+
+
+class EmbedError(Exception):
+    pass
+
+
+def _fields(metadata):
+    keywords = metadata.get("keywords") or []
+    if isinstance(keywords, str):
+        keywords = split_keywords(keywords)
+    return (str(metadata.get("title") or "").strip(), str(metadata.get("description") or "").strip(),
+            [str(keyword) for keyword in keywords if str(keyword).strip()])
+
+
+def _copy_bytes(src, dst, length):
+    while length > 0:
+        chunk = src.read(min(length, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise EmbedError("File is truncated")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+# --- XMP -------------------------------------------------------------------
+
+def _lang_alt(parent, tag, text):
+    element = ET.SubElement(parent, tag)
+    alternative = ET.SubElement(element, f"{{{NS_RDF}}}Alt")
+    item = ET.SubElement(alternative, f"{{{NS_RDF}}}li")
+    item.set(f"{{{NS_XML}}}lang", "x-default")
+    item.text = text
+
+
+def build_xmp(metadata, existing=None):
+    """Return an XMP packet with our fields, merged into ``existing`` packet bytes when given"""
+    title, description, keywords = _fields(metadata)
+    root = None
+    if existing:
+        try:
+            root = ET.fromstring(existing.strip(b"\x00 \t\r\n"))
+        except ET.ParseError:
+            logger.warning("Replacing unreadable XMP packet")
+    if root is None or root.tag not in (f"{{{NS_X}}}xmpmeta", f"{{{NS_RDF}}}RDF"):
+        root = ET.Element(f"{{{NS_X}}}xmpmeta")
+    rdf = root if root.tag == f"{{{NS_RDF}}}RDF" else root.find(f"{{{NS_RDF}}}RDF")
+    if rdf is None:
+        rdf = ET.SubElement(root, f"{{{NS_RDF}}}RDF")
+
+    descriptions = rdf.findall(f"{{{NS_RDF}}}Description")
+    for node in descriptions:
+        for child in [child for child in node if child.tag in XMP_FIELDS]:
+            node.remove(child)
+        for name in XMP_FIELDS:
+            node.attrib.pop(name, None)
+    if descriptions:
+        node = descriptions[0]
+    else:
+        node = ET.SubElement(rdf, f"{{{NS_RDF}}}Description")
+        node.set(f"{{{NS_RDF}}}about", "")
+
+    if title:
+        _lang_alt(node, f"{{{NS_DC}}}title", title)
+    if description:
+        _lang_alt(node, f"{{{NS_DC}}}description", description)
+    if keywords:
+        bag = ET.SubElement(ET.SubElement(node, f"{{{NS_DC}}}subject"), f"{{{NS_RDF}}}Bag")
+        for keyword in keywords:
+            ET.SubElement(bag, f"{{{NS_RDF}}}li").text = keyword
+
+    body = ET.tostring(root, encoding="unicode")
+    # Trailing whitespace lets other tools edit the packet in place later
+    padding = "\n".join([" " * 99] * (XMP_PADDING // 100))
+    return (XMP_PACKET_HEADER + body + "\n" + padding + XMP_PACKET_TRAILER).encode("utf-8")
+
+
+def _xmp_without_padding(packet):
+    # Used when a container is too small for the padded packet
+    body = packet.decode("utf-8")
+    head, _, _ = body.rpartition(XMP_PACKET_TRAILER)
+    return (head.rstrip() + XMP_PACKET_TRAILER).encode("utf-8")
+
+
+# --- IPTC ------------------------------------------------------------------
+
+def _truncate(text, limit):
+    return text.encode("utf-8")[:limit].decode("utf-8", "ignore").encode("utf-8")
+
+
+def parse_iptc(data):
+    """Split IPTC IIM bytes into ``[(record, dataset, value)]``; stops at anything it cannot read"""
+    datasets = []
+    position = 0
+    while position + 5 <= len(data) and data[position] == 0x1C:
+        record, dataset, length = struct.unpack_from(">BBH", data, position + 1)
+        if length & 0x8000:
+            break  # Extended dataset; never used for the fields we care about
+        start = position + 5
+        datasets.append((record, dataset, data[start:start + length]))
+        position = start + length
+    return datasets
+
+
+def build_iptc(metadata, existing=b""):
+    """Return IPTC IIM bytes with our datasets, keeping any other record 2 datasets from ``existing``"""
+    title, description, keywords = _fields(metadata)
+    owned = {IPTC_CHARSET, IPTC_OBJECT_NAME, IPTC_KEYWORDS, IPTC_CAPTION}
+    datasets = [(1, 90, b"\x1b%G")]  # Coded character set: UTF-8
+    datasets.extend(entry for entry in parse_iptc(existing or b"")
+                    if entry[0] == 2 and (entry[0], entry[1]) not in owned)
+    if title:
+        datasets.append(IPTC_OBJECT_NAME + (_truncate(title, IPTC_LIMITS[IPTC_OBJECT_NAME]),))
+    for keyword in keywords:
+        datasets.append(IPTC_KEYWORDS + (_truncate(keyword, IPTC_LIMITS[IPTC_KEYWORDS]),))
+    if description:
+        datasets.append(IPTC_CAPTION + (_truncate(description, IPTC_LIMITS[IPTC_CAPTION]),))
+    datasets.sort(key=lambda entry: (entry[0], entry[1]))
+    return b"".join(struct.pack(">BBBH", 0x1C, record, dataset, len(value)) + value
+                    for record, dataset, value in datasets)
+
+
+def _parse_photoshop_resources(data):
+    resources = []
+    position = 0
+    while position + 12 <= len(data) and data[position:position + 4] == b"8BIM":
+        resource_id = struct.unpack_from(">H", data, position + 4)[0]
+        name_end = position + 7 + data[position + 6]
+        name_end += (name_end - position - 6) & 1  # Pascal name padded to an even length
+        size = struct.unpack_from(">I", data, name_end)[0]
+        start = name_end + 4
+        resources.append((resource_id, data[position + 6:name_end], data[start:start + size]))
+        position = start + size + (size & 1)
+    return resources
+
+
+def _build_photoshop_resources(resources):
+    return b"".join(b"8BIM" + struct.pack(">H", resource_id) + name + struct.pack(">I", len(data)) + data +
+                    b"\x00" * (len(data) & 1)
+                    for resource_id, name, data in resources)
+
+
+def _photoshop_iptc(resources):
+    for resource_id, _, data in resources:
+        if resource_id == PHOTOSHOP_IPTC:
+            return data
+    return b""
+
+
+def _with_iptc(resources, iptc):
+    # The digest describes the old IPTC block; readers would flag a mismatch
+    kept = [resource for resource in resources if resource[0] not in (PHOTOSHOP_IPTC, PHOTOSHOP_IPTC_DIGEST)]
+    return kept + [(PHOTOSHOP_IPTC, b"\x00\x00", iptc)]
+
+
+# --- TIFF / EXIF -----------------------------------------------------------
+
+class _Ifd0:
+    """First IFD of a TIFF structure in a seekable stream, rewritten by appending a new copy.
+
+    Existing values stay where they are, so every offset elsewhere in the
+    file remains valid; only the header's IFD0 pointer changes.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        stream.seek(0)
+        header = stream.read(8)
+        if header[:4] not in (b"II*\x00", b"MM\x00*"):
+            if header[:4] in (b"II+\x00", b"MM\x00+"):
+                raise EmbedError("BigTIFF files are not supported")
+            raise EmbedError("Not a TIFF structure")
+        self.endian = "<" if header[:2] == b"II" else ">"
+        offset = struct.unpack(self.endian + "I", header[4:8])[0]
+        stream.seek(offset)
+        count = struct.unpack(self.endian + "H", stream.read(2))[0]
+        raw = stream.read(12 * count + 4)
+        if len(raw) < 12 * count + 4:
+            raise EmbedError("TIFF directory is truncated")
+        self.entries = {}
+        for index in range(count):
+            tag, kind, value_count = struct.unpack_from(self.endian + "HHI", raw, 12 * index)
+            self.entries[tag] = (kind, value_count, raw[12 * index + 8:12 * index + 12])
+        self.next_offset = struct.unpack_from(self.endian + "I", raw, 12 * count)[0]
+
+    def value(self, tag):
+        if tag not in self.entries:
+            return None
+        kind, count, raw = self.entries[tag]
+        size = TIFF_TYPE_SIZES.get(kind, 1) * count
+        if size <= 4:
+            return raw[:size]
+        self.stream.seek(struct.unpack(self.endian + "I", raw)[0])
+        return self.stream.read(size)
+
+    def rewrite(self, values):
+        """Append ``{tag: (type, bytes)}`` and a new IFD0 holding them, then point the header at it"""
+        stream = self.stream
+        entries = dict(self.entries)
+        stream.seek(0, io.SEEK_END)
+        position = stream.tell()
+        for tag, (kind, data) in sorted(values.items()):
+            count = len(data) // TIFF_TYPE_SIZES[kind]
+            if len(data) <= 4:
+                entries[tag] = (kind, count, data.ljust(4, b"\x00"))
+                continue
+            position += position & 1  # Values start on a word boundary
+            stream.seek(position)
+            stream.write(data)
+            entries[tag] = (kind, count, struct.pack(self.endian + "I", position))
+            position += len(data)
+        position += position & 1
+        if position + 6 + 12 * len(entries) > 0xFFFFFFFF:
+            raise EmbedError("TIFF file would exceed 4 GB")
+        stream.seek(position)
+        stream.write(struct.pack(self.endian + "H", len(entries)))
+        for tag in sorted(entries):
+            kind, count, raw = entries[tag]
+            stream.write(struct.pack(self.endian + "HHI", tag, kind, count) + raw)
+        stream.write(struct.pack(self.endian + "I", self.next_offset))
+        stream.seek(4)
+        stream.write(struct.pack(self.endian + "I", position))
+
+
+def _exif_values(metadata):
+    title, description, keywords = _fields(metadata)
+    values = {}
+    if description:
+        values[TIFF_IMAGE_DESCRIPTION] = (TIFF_ASCII, description.encode("utf-8") + b"\x00")
+    if title:
+        values[TIFF_XP_TITLE] = (TIFF_BYTE, (title + "\x00").encode("utf-16-le"))
+    if keywords:
+        values[TIFF_XP_KEYWORDS] = (TIFF_BYTE, ("; ".join(keywords) + "\x00").encode("utf-16-le"))
+    return values
+
+
+def _write_tiff(src, dst, metadata):
+    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    ifd = _Ifd0(dst)
+    values = _exif_values(metadata)
+    values[TIFF_XMP] = (TIFF_BYTE, build_xmp(metadata, ifd.value(TIFF_XMP)))
+    values[TIFF_IPTC] = (TIFF_UNDEFINED, build_iptc(metadata, ifd.value(TIFF_IPTC)))
+    ifd.rewrite(values)
+
+
+# --- JPEG ------------------------------------------------------------------
+
+def _write_jpeg(src, dst, metadata):
+    if src.read(2) != b"\xff\xd8":
+        raise EmbedError("Not a JPEG file")
+    segments = []
+    while True:
+        prefix = src.read(1)
+        if prefix != b"\xff":
+            raise EmbedError("Malformed JPEG marker")
+        marker = src.read(1)
+        while marker == b"\xff":  # Fill bytes
+            marker = src.read(1)
+        if not marker:
+            raise EmbedError("JPEG file is truncated")
+        marker = marker[0]
+        if marker in (0xDA, 0xD9):  # Start of scan: everything after is copied untouched
+            scan_marker = marker
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            segments.append((marker, None))
+            continue
+        length = struct.unpack(">H", src.read(2))[0]
+        payload = src.read(length - 2)
+        if len(payload) < length - 2:
+            raise EmbedError("JPEG file is truncated")
+        segments.append((marker, payload))
+
+    existing_xmp = None
+    resources = []
+    kept = []
+    for marker, payload in segments:
+        if marker == 0xE1 and payload.startswith(JPEG_XMP_SIGNATURE):
+            existing_xmp = payload[len(JPEG_XMP_SIGNATURE):]
+        elif marker == 0xED and payload.startswith(JPEG_PHOTOSHOP_SIGNATURE):
+            resources.extend(_parse_photoshop_resources(payload[len(JPEG_PHOTOSHOP_SIGNATURE):]))
+        elif marker == 0xE1 and payload.startswith(JPEG_EXIF_SIGNATURE):
+            kept.append((marker, _update_exif(payload, metadata)))
+        else:
+            kept.append((marker, payload))
+
+    xmp = build_xmp(metadata, existing_xmp)
+    if len(JPEG_XMP_SIGNATURE) + len(xmp) > JPEG_MAX_SEGMENT:
+        xmp = _xmp_without_padding(xmp)
+        if len(JPEG_XMP_SIGNATURE) + len(xmp) > JPEG_MAX_SEGMENT:
+            raise EmbedError("XMP packet does not fit in a JPEG segment")
+    photoshop = JPEG_PHOTOSHOP_SIGNATURE + _build_photoshop_resources(
+        _with_iptc(resources, build_iptc(metadata, _photoshop_iptc(resources))))
+    if len(photoshop) > JPEG_MAX_SEGMENT:
+        raise EmbedError("IPTC block does not fit in a JPEG segment")
+
+    # New segments go right after the leading JFIF/EXIF application segments
+    position = 0
+    while position < len(kept) and kept[position][0] in (0xE0, 0xE1):
+        position += 1
+    kept[position:position] = [(0xE1, JPEG_XMP_SIGNATURE + xmp), (0xED, photoshop)]
+
+    dst.write(b"\xff\xd8")
+    for marker, payload in kept:
+        if payload is None:
+            dst.write(bytes((0xFF, marker)))
+        else:
+            dst.write(bytes((0xFF, marker)) + struct.pack(">H", len(payload) + 2) + payload)
+    dst.write(bytes((0xFF, scan_marker)))
+    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+
+def _update_exif(payload, metadata):
+    values = _exif_values(metadata)
+    if not values:
+        return payload
+    buffer = io.BytesIO(payload[len(JPEG_EXIF_SIGNATURE):])
+    try:
+        _Ifd0(buffer).rewrite(values)
+    except (EmbedError, struct.error) as e:
+        logger.warning("Leaving EXIF untouched: %s", e)
+        return payload
+    updated = JPEG_EXIF_SIGNATURE + buffer.getvalue()
+    if len(updated) > JPEG_MAX_SEGMENT:
+        logger.warning("Leaving EXIF untouched: segment would exceed 64 KB")
+        return payload
+    return updated
+
+
+# --- PNG -------------------------------------------------------------------
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def _png_xmp_text(data):
+    # keyword \0 compression-flag compression-method language \0 translated-keyword \0 text
+    if not data.startswith(PNG_XMP_KEYWORD + b"\x00") or data[len(PNG_XMP_KEYWORD) + 1] != 0:
+        return None
+    rest = data[len(PNG_XMP_KEYWORD) + 3:]
+    _, _, rest = rest.partition(b"\x00")
+    _, _, text = rest.partition(b"\x00")
+    return text
+
+
+def _write_png(src, dst, metadata):
+    if src.read(8) != PNG_SIGNATURE:
+        raise EmbedError("Not a PNG file")
+    dst.write(PNG_SIGNATURE)
+    # Read the chunks before the image data so an existing packet can be merged
+    head = []
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            raise EmbedError("PNG file is truncated")
+        length, kind = struct.unpack(">I4s", header)
+        if kind in (b"IDAT", b"IEND"):
+            break
+        head.append((kind, src.read(length), src.read(4)))
+
+    existing_xmp = None
+    for kind, data, crc in head:
+        if kind == b"iTXt" and data.startswith(PNG_XMP_KEYWORD + b"\x00"):
+            existing_xmp = _png_xmp_text(data)
+            continue
+        dst.write(struct.pack(">I", len(data)) + kind + data + crc)
+    xmp = build_xmp(metadata, existing_xmp)
+    dst.write(_png_chunk(b"iTXt", PNG_XMP_KEYWORD + b"\x00\x00\x00\x00\x00" + xmp))
+
+    # Image data and anything after it is copied chunk by chunk, minus stale XMP
+    while True:
+        if kind == b"iTXt":
+            data = src.read(length)
+            crc = src.read(4)
+            if not data.startswith(PNG_XMP_KEYWORD + b"\x00"):
+                dst.write(header + data + crc)
+        else:
+            dst.write(header)
+            _copy_bytes(src, dst, length + 4)
+        if kind == b"IEND":
+            return
+        header = src.read(8)
+        if len(header) < 8:
+            raise EmbedError("PNG file is truncated")
+        length, kind = struct.unpack(">I4s", header)
+
+
+# --- MP4 / MOV -------------------------------------------------------------
+
+def _iter_boxes(src, end):
+    """Yield ``(offset, size, header_size, type, declared_size)`` for each top-level box"""
+    position = 0
+    while position + 8 <= end:
+        src.seek(position)
+        declared, kind = struct.unpack(">I4s", src.read(8))
+        size, header_size = declared, 8
+        if declared == 1:
+            size = struct.unpack(">Q", src.read(8))[0]
+            header_size = 16
+        elif declared == 0:
+            size = end - position
+        if size < header_size or position + size > end:
+            raise EmbedError("Malformed MP4 box")
+        yield position, size, header_size, kind, declared
+        position += size
+
+
+def _box_header(kind, payload_size):
+    if payload_size + 8 <= 0xFFFFFFFF:
+        return struct.pack(">I4s", payload_size + 8, kind)
+    return struct.pack(">I4sQ", 1, kind, payload_size + 16)
+
+
+def _copy_box(src, dst, offset, size, header_size, kind, declared):
+    src.seek(offset)
+    if declared == 0:
+        # "Extends to end of file" would swallow anything appended after it
+        if size > 0xFFFFFFFF:
+            raise EmbedError("Cannot append after an unsized box larger than 4 GB")
+        src.seek(offset + header_size)
+        dst.write(struct.pack(">I4s", size, kind))
+        _copy_bytes(src, dst, size - header_size)
+    else:
+        _copy_bytes(src, dst, size)
+
+
+def _write_mp4(src, dst, metadata):
+    end = os.fstat(src.fileno()).st_size
+    boxes = list(_iter_boxes(src, end))
+    existing_xmp = None
+    stale = []
+    for box in boxes:
+        offset, size, header_size, kind, _ = box
+        if kind == b"uuid" and size >= header_size + 16:
+            src.seek(offset + header_size)
+            if src.read(16) == MP4_XMP_UUID:
+                existing_xmp = src.read(size - header_size - 16)
+                stale.append(box)
+
+    for index, box in enumerate(boxes):
+        if box in stale:
+            offset, size, header_size, _, _ = box
+            if index == len(boxes) - 1:
+                continue  # Trailing packet: simply left out
+            # Anywhere else, blank it as a free box so later offsets do not move
+            dst.write(_box_header(b"free", size - header_size) if header_size == 8 else
+                      struct.pack(">I4sQ", 1, b"free", size))
+            _write_zeros(dst, size - header_size)
+            continue
+        _copy_box(src, dst, *box)
+    xmp = build_xmp(metadata, existing_xmp)
+    dst.write(_box_header(b"uuid", 16 + len(xmp)) + MP4_XMP_UUID + xmp)
+
+
+def _write_zeros(dst, length):
+    block = b"\x00" * min(length, COPY_CHUNK_SIZE)
+    while length > 0:
+        dst.write(block[:length])
+        length -= len(block)
+
+
+def _parse_atoms(data):
+    atoms = []
+    position = 0
+    while position + 8 <= len(data):
+        size, kind = struct.unpack_from(">I4s", data, position)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, position + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - position
+        if size < header_size or position + size > len(data):
+            raise EmbedError("Malformed QuickTime atom")
+        payload = data[position + header_size:position + size]
+        atoms.append([kind, _parse_atoms(payload) if kind in MOOV_CONTAINERS else payload])
+        position += size
+    return atoms
+
+
+def _serialize_atoms(atoms):
+    parts = []
+    for kind, content in atoms:
+        payload = _serialize_atoms(content) if isinstance(content, list) else content
+        parts.append(_box_header(kind, len(payload)) + payload)
+    return b"".join(parts)
+
+
+def _shift_chunk_offsets(atoms, threshold, delta):
+    for atom in atoms:
+        kind, content = atom
+        if isinstance(content, list):
+            _shift_chunk_offsets(content, threshold, delta)
+        elif kind in (b"stco", b"co64"):
+            code = ">I" if kind == b"stco" else ">Q"
+            width = struct.calcsize(code)
+            count = struct.unpack_from(">I", content, 4)[0]
+            table = bytearray(content)
+            for index in range(count):
+                position = 8 + index * width
+                value = struct.unpack_from(code, table, position)[0]
+                if value >= threshold:
+                    value += delta
+                    if kind == b"stco" and value > 0xFFFFFFFF:
+                        raise EmbedError("Chunk offsets would overflow; movie is too large to grow moov")
+                    struct.pack_into(code, table, position, value)
+            atom[1] = bytes(table)
+
+
+def _write_mov(src, dst, metadata):
+    end = os.fstat(src.fileno()).st_size
+    boxes = list(_iter_boxes(src, end))
+    moov = [box for box in boxes if box[3] == b"moov"]
+    if not moov:
+        raise EmbedError("No moov atom")
+    offset, size, header_size, _, _ = moov[0]
+    src.seek(offset + header_size)
+    atoms = _parse_atoms(src.read(size - header_size))
+
+    udta = next((atom for atom in atoms if atom[0] == b"udta"), None)
+    if udta is None:
+        udta = [b"udta", []]
+        atoms.append(udta)
+    existing_xmp = next((content for kind, content in udta[1] if kind == b"XMP_"), None)
+    udta[1] = [atom for atom in udta[1] if atom[0] != b"XMP_"]
+    udta[1].append([b"XMP_", build_xmp(metadata, existing_xmp)])
+
+    new_size = len(_box_header(b"moov", 0)) + len(_serialize_atoms(atoms))
+    delta = new_size - size
+    if delta and any(kind == b"moof" for _, _, _, kind, _ in boxes):
+        raise EmbedError("Fragmented movies are not supported")
+    # Media data behind moov moves by delta; offsets into data in front of it do not
+    _shift_chunk_offsets(atoms, offset + size, delta)
+    payload = _serialize_atoms(atoms)
+
+    for box in boxes:
+        if box is moov[0]:
+            dst.write(_box_header(b"moov", len(payload)) + payload)
+        else:
+            _copy_box(src, dst, *box)
+
+
+WRITERS = {
+    ".jpg": _write_jpeg,
+    ".jpeg": _write_jpeg,
+    ".png": _write_png,
+    ".tif": _write_tiff,
+    ".tiff": _write_tiff,
+    ".mp4": _write_mp4,
+    ".m4v": _write_mp4,
+    ".mov": _write_mov,
+}
+
+
+def can_embed(file_path):
+    return os.path.splitext(file_path)[1].lower() in WRITERS
+
+
+def embed_metadata(file_path, metadata, output_path=None, preserve_mtime=True):
+    """Write title, description and keywords into ``file_path`` (or a copy at ``output_path``).
+
+    The result is written to a temporary file in the target directory,
+    flushed to disk and renamed over the target, so readers never see a
+    half-written file.
+    """
+    writer = WRITERS.get(os.path.splitext(file_path)[1].lower())
+    if writer is None:
+        raise EmbedError(f"Cannot write metadata into {os.path.splitext(file_path)[1] or 'extensionless'} files")
+    target = output_path or file_path
+    descriptor, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp",
+                                             dir=os.path.dirname(os.path.abspath(target)))
+    try:
+        with open(file_path, 'rb') as src, os.fdopen(descriptor, 'w+b') as dst:
+            try:
+                writer(src, dst, metadata)
+            except struct.error:
+                raise EmbedError("File is truncated or malformed")
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copymode(file_path, temp_path)
+        if preserve_mtime:
+            stat = os.stat(file_path)
+            os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_results(path):
+    """Read a results file written by the CLI (JSON, JSON Lines or CSV) into a list of records"""
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        if path.lower().endswith(".csv"):
+            records = list(csv.DictReader(file))
+            for record in records:
+                record["keywords"] = split_keywords(record.get("keywords") or "")
+            return records
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in file if line.strip()]
+        records = json.load(file)
+    return records if isinstance(records, list) else [records]
+
+
+def apply_results(records, workers=DEFAULT_APPLY_WORKERS, on_result=None, on_error=None, preserve_mtime=True):
+    """Embed each record's metadata into its ``source_file`` on a pool of worker threads.
+
+    Records that carry an error or no title/keywords are skipped. Returns
+    ``(applied, failed, skipped)`` counts; callbacks receive the file path.
+    """
+    on_result = on_result or (lambda file_path: None)
+    on_error = on_error or (lambda file_path, message: None)
+    jobs = []
+    skipped = 0
+    for record in records:
+        file_path = record.get("source_file")
+        if not file_path or record.get("error") or not (record.get("title") or record.get("keywords")):
+            skipped += 1
+            continue
+        jobs.append((file_path, record))
+
+    applied = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(embed_metadata, file_path, record, preserve_mtime=preserve_mtime): file_path
+                   for file_path, record in jobs}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                future.result()
+            except EmbedError as e:
+                failed += 1
+                on_error(file_path, str(e))
+            except Exception as e:
+                failed += 1
+                on_error(file_path, f"Error: {str(e)}")
+            else:
+                applied += 1
+                on_result(file_path)
+    return applied, failed, skipped
@@ -0,0 +1,275 @@
+"""Streaming result writers: JSON, JSONL, CSV, XMP sidecars and stock-agency CSV templates.
+
+Each exporter writes a record the moment it arrives and keeps nothing
+around afterwards, so memory use does not grow with the batch size.
+``write`` may be called from several worker threads at once.
+"""
+import os
+import csv
+import sys
+import json
+import threading
+from datetime import datetime
+
+CSV_FIELDS = ["source_file", "title", "description", "keywords", "container", "codec", "generated_at", "error"]
+EXPORT_FORMATS = ("json", "jsonl", "csv", "xmp", "adobe-stock", "shutterstock")
+EXTENSION_FORMATS = {".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+
+# Upload CSV limits published by the agencies
+ADOBE_STOCK_TITLE_LIMIT = 200
+ADOBE_STOCK_KEYWORD_LIMIT = 49
+SHUTTERSTOCK_DESCRIPTION_LIMIT = 200
+SHUTTERSTOCK_KEYWORD_LIMIT = 50
+
+
+def make_record(file_path, metadata=None, error=None):
+    record = {"source_file": file_path}
+    if metadata is not None:
+        keywords = metadata.get("keywords", [])
+        record.update({
+            "title": metadata.get("title", ""),
+            "description": metadata.get("description", ""),
+            "keywords": keywords if isinstance(keywords, list) else [str(keywords)],
+        })
+        for field in ("container", "codec"):
+            if metadata.get(field):
+                record[field] = metadata[field]
+    if error is not None:
+        record["error"] = error
+    record["generated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+def format_for_path(path, default="json"):
+    return EXTENSION_FORMATS.get(os.path.splitext(path or "")[1].lower(), default)
+
+
+class Exporter:
+    """Base class: serialises ``write`` calls and owns the stream if it opened it.
+
+    With ``append`` an existing output file is extended instead of replaced.
+    """
+
+    newline = None
+    appendable = True
+
+    def __init__(self, output=None, append=False):
+        if append and not self.appendable:
+            raise ValueError(f"{type(self).__name__} cannot append to an existing file")
+        self._lock = threading.Lock()
+        self.count = 0
+        self.appending = False
+        if output is None or output == "-":
+            self.stream = sys.stdout
+            self._owns_stream = False
+        elif hasattr(output, "write"):
+            self.stream = output
+            self._owns_stream = False
+        else:
+            self.appending = append and os.path.exists(output) and os.path.getsize(output) > 0
+            self.stream = open(output, 'a' if append else 'w', newline=self.newline, encoding='utf-8')
+            self._owns_stream = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, record):
+        with self._lock:
+            if self._write(record):
+                self.count += 1
+                self.stream.flush()
+
+    def _write(self, record):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._finish()
+            if self._owns_stream:
+                self.stream.close()
+            else:
+                self.stream.flush()
+
+
+class JsonExporter(Exporter):
+    """A JSON array, written element by element; same layout as ``json.dump(records, indent=4)``"""
+
+    appendable = False
+
+    def _write(self, record):
+        text = json.dumps(record, indent=4).replace("\n", "\n    ")
+        self.stream.write(("[\n    " if self.count == 0 else ",\n    ") + text)
+        return True
+
+    def _finish(self):
+        self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+
+
+class JsonlExporter(Exporter):
+    """One JSON object per line; a crash loses at most the line being written"""
+
+    def _write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return True
+
+
+class CsvExporter(Exporter):
+    newline = ''
+    fields = CSV_FIELDS
+
+    def __init__(self, output=None, append=False):
+        super().__init__(output, append)
+        self.writer = csv.DictWriter(self.stream, fieldnames=self.fields, extrasaction="ignore")
+        if not self.appending:
+            self.writer.writeheader()
+
+    def _write(self, record):
+        row = dict(record)
+        row["keywords"] = ", ".join(record.get("keywords", []))
+        self.writer.writerow(row)
+        return True
+
+
+def _usable(record):
+    return not record.get("error") and (record.get("title") or record.get("keywords"))
+
+
+def _limit(text, limit):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0]
+
+
+class AdobeStockExporter(CsvExporter):
+    """Adobe Stock contributor CSV (Filename, Title, Keywords, Category, Releases)"""
+
+    fields = ["Filename", "Title", "Keywords", "Category", "Releases"]
+
+    def _write(self, record):
+        if not _usable(record):
+            return False
+        self.writer.writerow({
+            "Filename": os.path.basename(record["source_file"]),
+            "Title": _limit(record.get("title"), ADOBE_STOCK_TITLE_LIMIT),
+            "Keywords": ", ".join(record.get("keywords", [])[:ADOBE_STOCK_KEYWORD_LIMIT]),
+        })
+        return True
+
+
+class ShutterstockExporter(CsvExporter):
+    """Shutterstock submission CSV (Filename, Description, Keywords, Categories, ...)"""
+
+    fields = ["Filename", "Description", "Keywords", "Categories", "Editorial", "Mature content", "illustration"]
+
+    def _write(self, record):
+        if not _usable(record):
+            return False
+        self.writer.writerow({
+            "Filename": os.path.basename(record["source_file"]),
+            "Description": _limit(record.get("description") or record.get("title"),
+                                  SHUTTERSTOCK_DESCRIPTION_LIMIT),
+            "Keywords": ",".join(record.get("keywords", [])[:SHUTTERSTOCK_KEYWORD_LIMIT]),
+            "Editorial": "no",
+            "Mature content": "no",
+            "illustration": "no",
+        })
+        return True
+
+
+def sidecar_path(file_path, directory=None, root=None):
+    """``photo.jpg`` -> ``photo.jpg.xmp``, next to the file or inside ``directory``.
+
+    The full file name is kept, so ``photo.jpg`` and ``photo.png`` never share
+    a sidecar. Inside ``directory`` the folders below ``root`` are mirrored, so
+    ``root/a/img.jpg`` and ``root/b/img.jpg`` get ``a/img.jpg.xmp`` and ``b/img.jpg.xmp``.
+    """
+    folder, name = os.path.split(os.path.abspath(file_path))
+    base = name + ".xmp"
+    if not directory:
+        return os.path.join(folder, base)
+    relative = ""
+    if root:
+        try:
+            relative = os.path.relpath(folder, os.path.abspath(root))
+        except ValueError:
+            pass  # Another drive
+        if relative == os.curdir or relative.startswith(os.pardir):
+            relative = ""
+    return os.path.join(directory, relative, base)
+
+
+def common_root(paths):
+    """The deepest folder containing every one of ``paths`` (files or folders), or None"""
+    folders = [path if os.path.isdir(path) else os.path.dirname(path) for path in map(os.path.abspath, paths)]
+    try:
+        return os.path.commonpath(folders) if folders else None
+    except ValueError:
+        return None  # Different drives
+
+
+class SidecarExporter(Exporter):
+    """One ``.xmp`` sidecar per asset, merged into any sidecar already there.
+
+    With a ``directory``, sidecars go there instead, below the asset's folder
+    relative to ``root`` (see sidecar_path).
+    """
+
+    def __init__(self, directory=None, root=None):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.directory = directory
+        self.root = root
+        self.stream = None
+        self._owns_stream = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        # Sidecars are independent files, so no lock is held while writing
+        if not _usable(record):
+            return
+        from .embed import build_xmp
+
+        path = sidecar_path(record["source_file"], self.directory, self.root)
+        if self.directory:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        existing = None
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                existing = file.read()
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(build_xmp(record, existing))
+        os.replace(temp_path, path)
+        with self._lock:
+            self.count += 1
+
+    def close(self):
+        pass
+
+
+EXPORTERS = {
+    "json": JsonExporter,
+    "jsonl": JsonlExporter,
+    "csv": CsvExporter,
+    "xmp": SidecarExporter,
+    "adobe-stock": AdobeStockExporter,
+    "shutterstock": ShutterstockExporter,
+}
+
+
+def open_exporter(output_format, output=None, append=False, root=None):
+    """Create the exporter for ``output_format``; ``output`` is a path, a stream or None for stdout.
+
+    For ``xmp`` it is the sidecar directory instead (None puts each sidecar
+    next to its asset), and ``root`` the folder whose layout is mirrored there.
+    ``append`` extends an existing file (not for ``json``).
+    """
+    if output_format == "xmp":
+        return SidecarExporter(output, root)
+    return EXPORTERS[output_format](output, append)
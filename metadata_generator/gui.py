@@ -0,0 +1,1058 @@
+import os
+import sys
+import json
+from datetime import datetime
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
+                             QLabel, QPushButton, QLineEdit, QTextEdit, QFileDialog, 
+                             QTabWidget, QGridLayout, QMessageBox, QProgressBar, QComboBox,
+                             QSpinBox, QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView)
+import copy
+import threading
+from PyQt6.QtGui import QImage, QPixmap, QIcon, QFont
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+
+from .core import DEFAULT_MODEL, GeminiClient, GeminiError, collect_files, detect_file_type
+from .aio import AsyncBatchRunner, backend_available as async_backend_available
+from .batch import BatchRunner
+from .cache import ResultCache
+from .journal import JobJournal
+from .dedupe import DuplicateIndex, DuplicatePlan, available as dedupe_available
+from .embed import build_xmp, can_embed, embed_metadata
+from .export import format_for_path, make_record, open_exporter
+from .metrics import STAGES, metrics
+from .parsing import split_keywords
+from .prompts import ContextCache, TemplateError, load_template
+from .routing import MODEL_PRICES, ModelRouter, default_routes, route_summary_lines
+from .preprocess import DEFAULT_MAX_EDGE, ImagePreprocessor
+from .video import DEFAULT_FRAME_COUNT, KeyframeSampler
+from .thumbnails import ThumbnailCache
+from .transport import HttpTransport, RateLimiter
+
+AUTO_MODEL = "Auto (cheapest model, with failover)"
+
+BATCH_EXPORT_FILTERS = {
+    "JSON Lines (*.jsonl)": "jsonl",
+    "CSV (*.csv)": "csv",
+    "JSON (*.json)": "json",
+    "Adobe Stock CSV (*.csv)": "adobe-stock",
+    "Shutterstock CSV (*.csv)": "shutterstock",
+    "XMP sidecars next to each file (*.xmp)": "xmp",
+}
+
+
+class GeminiThread(QThread):
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    
+    def __init__(self, api_key, file_path, file_type, cache=None, preprocessor=None, frame_sampler=None,
+                 transport=None, model=DEFAULT_MODEL, router=None, prompt_template=None, context_cache=None):
+        super().__init__()
+        self.api_key = api_key
+        self.file_path = file_path
+        self.file_type = file_type
+        self.cache = cache
+        self.preprocessor = preprocessor
+        self.frame_sampler = frame_sampler
+        self.transport = transport
+        self.model = model
+        self.router = router
+        self.prompt_template = prompt_template
+        self.context_cache = context_cache
+        
+    def run(self):
+        try:
+            client = GeminiClient(self.api_key, model=self.model, cache=self.cache, preprocessor=self.preprocessor,
+                                  frame_sampler=self.frame_sampler, transport=self.transport, router=self.router,
+                                  prompt_template=self.prompt_template, context_cache=self.context_cache)
+            metadata = client.generate(self.file_path, self.file_type, progress=self.progress.emit)
+            self.finished.emit(metadata)
+        except GeminiError as e:
+            self.error.emit(str(e))
+        except Exception as e:
+            self.error.emit(f"Error: {str(e)}")
+
+
+class BatchThread(QThread):
+    """Qt wrapper that runs a batch off the GUI thread and re-emits its callbacks as signals.
+
+    With engine="asyncio" the thread hosts an asyncio event loop instead of a
+    thread pool; results still reach the window through the same signals.
+    Every result is written to ``journal`` as it arrives; with ``resume`` set,
+    files the journal already has are replayed from it instead of re-sent.
+    With a ``duplicate_index``, near-duplicate images are found before the
+    first request and copy the result of the one image sent for them.
+    """
+    file_started = pyqtSignal(int)
+    file_progress = pyqtSignal(int, int)
+    file_finished = pyqtSignal(int, dict)
+    file_error = pyqtSignal(int, str)
+    overall_progress = pyqtSignal(int, int)
+    
+    def __init__(self, api_key, file_paths, workers=4, cache=None, preprocessor=None, frame_sampler=None,
+                 transport=None, engine="threads", files_per_request=1, journal=None, resume=True,
+                 model=DEFAULT_MODEL, router=None, duplicate_index=None, prompt_template=None, context_cache=None):
+        super().__init__()
+        self.file_paths = file_paths
+        self.journal = journal
+        self.workers = workers
+        self.duplicate_index = duplicate_index
+        self.plan = None
+        self.finished_files = {}
+        self.pending = list(range(len(file_paths)))
+        if journal is not None and resume:
+            self.finished_files, self.pending = journal.resume(file_paths)
+        
+        client = GeminiClient(api_key, model=model, cache=cache, preprocessor=preprocessor,
+                              frame_sampler=frame_sampler, transport=transport, router=router,
+                              prompt_template=prompt_template, context_cache=context_cache)
+        # The runner only sees the pending files; translate its indices back to table rows
+        callbacks = dict(
+            on_start=lambda position: self.file_started.emit(self.pending[position]),
+            on_progress=lambda position, value: self.file_progress.emit(self.pending[position], value),
+            on_result=self.record_result,
+            on_error=self.record_error,
+            on_done=lambda done, total: self.overall_progress.emit(
+                done + len(self.file_paths) - len(self.pending), len(self.file_paths))
+        )
+        pending_paths = [file_paths[index] for index in self.pending]
+        if engine == "asyncio":
+            self.runner = AsyncBatchRunner(client, pending_paths, workers=workers,
+                                           rate_limiter=client.transport.rate_limiter, **callbacks)
+        else:
+            self.runner = BatchRunner(client, pending_paths, workers=workers,
+                                      files_per_request=files_per_request, **callbacks)
+    
+    def record_result(self, position, metadata):
+        index = self.pending[position]
+        self.finish_file(index, metadata)
+        if self.plan is not None:
+            for follower, follower_metadata in self.plan.record(index, metadata):
+                metrics.file_done(self.file_paths[follower], duplicate_of=self.file_paths[index])
+                self.finish_file(follower, follower_metadata)
+    
+    def record_error(self, position, error_message):
+        index = self.pending[position]
+        self.fail_file(index, error_message)
+        if self.plan is not None:
+            reason = f"Near-duplicate of {self.file_paths[index]}, which failed: {error_message}"
+            for follower in self.plan.followers.get(index, []):
+                metrics.file_done(self.file_paths[follower], error=reason)
+                self.fail_file(follower, reason)
+    
+    def finish_file(self, index, metadata):
+        if self.journal is not None:
+            self.journal.record_result(self.file_paths[index], metadata)
+        self.file_finished.emit(index, metadata)
+    
+    def fail_file(self, index, error_message):
+        if self.journal is not None:
+            self.journal.record_error(self.file_paths[index], error_message)
+        self.file_error.emit(index, error_message)
+    
+    def pause(self):
+        self.runner.pause()
+    
+    def resume(self):
+        self.runner.resume()
+    
+    def is_paused(self):
+        return self.runner.is_paused()
+    
+    def is_cancelled(self):
+        return self.runner.is_cancelled()
+    
+    def cancel(self):
+        self.runner.cancel()
+    
+    def run(self):
+        for index, metadata in self.finished_files.items():
+            self.file_finished.emit(index, metadata)
+        if self.duplicate_index is not None:
+            # Hashing reads every image, so it happens here rather than on the GUI thread
+            self.plan = DuplicatePlan(self.duplicate_index, self.file_paths, self.pending, self.workers)
+            for index, (source, metadata) in self.plan.reused.items():
+                metrics.file_done(self.file_paths[index], duplicate_of=source)
+                self.finish_file(index, copy.deepcopy(metadata))
+            self.pending = self.plan.unique
+            self.runner.file_paths = [self.file_paths[index] for index in self.pending]
+        self.runner.run()
+
+
+class PreviewThread(QThread):
+    """Decodes preview thumbnails off the GUI thread.
+
+    Only the most recent request matters: asking for a new file while one is
+    being decoded replaces anything still queued, so scrolling through a
+    batch never builds up a backlog.
+    """
+    loaded = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str, str)
+    
+    def __init__(self, thumbnail_cache=None):
+        super().__init__()
+        self.thumbnail_cache = thumbnail_cache
+        self._wanted = None
+        self._stopped = False
+        self._condition = threading.Condition()
+    
+    def request(self, file_path, file_type):
+        with self._condition:
+            self._wanted = (file_path, file_type)
+            self._condition.notify()
+    
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.wait()
+    
+    def run(self):
+        while True:
+            with self._condition:
+                while self._wanted is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                file_path, file_type = self._wanted
+                self._wanted = None
+            try:
+                self.loaded.emit(file_path, self.load(file_path, file_type))
+            except Exception as e:
+                self.failed.emit(file_path, str(e))
+    
+    def load(self, file_path, file_type):
+        if self.thumbnail_cache is not None:
+            image = QImage.fromData(self.thumbnail_cache.get(file_path, file_type))
+        elif file_type == "image":
+            # Without Pillow, let Qt decode the full image; still off the GUI thread
+            image = QImage(file_path)
+            if not image.isNull():
+                image = image.scaled(512, 512, Qt.AspectRatioMode.KeepAspectRatio,
+                                     Qt.TransformationMode.SmoothTransformation)
+        else:
+            raise RuntimeError("Pillow is needed for video previews")
+        if image.isNull():
+            raise RuntimeError("Unable to decode preview")
+        return image
+
+
+class MetadataGeneratorApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Metadata Generator - Gemini 1.5 Flash")
+        self.setGeometry(100, 100, 1000, 800)
+        self.setup_ui()
+        
+        # Store the current file path
+        self.current_file_path = None
+        self.current_file_type = None
+        
+        # Shared result cache so unchanged files are never sent twice
+        try:
+            self.result_cache = ResultCache()
+        except Exception:
+            self.result_cache = None
+        
+        # Journal of finished batch files, so a closed window or crash loses nothing
+        try:
+            self.job_journal = JobJournal()
+        except Exception:
+            self.job_journal = None
+        
+        # One keep-alive connection pool for every request the window makes
+        self.transport = None
+        self.router = None
+        
+        # Prompt template chosen by the user; its system instructions are cached server-side per model
+        self.prompt_template = None
+        self.context_cache = ContextCache()
+        
+        # Perceptual hashes of every result this session, so near-duplicates are never sent twice
+        self.duplicate_index = DuplicateIndex() if dedupe_available() else None
+        
+        # Thumbnails are decoded on a worker thread and cached in memory and on disk
+        thumbnail_cache = None
+        if ThumbnailCache.available():
+            try:
+                thumbnail_cache = ThumbnailCache()
+            except Exception:
+                thumbnail_cache = None
+        self.preview_thread = PreviewThread(thumbnail_cache)
+        self.preview_thread.loaded.connect(self.preview_loaded)
+        self.preview_thread.failed.connect(self.preview_failed)
+        self.preview_thread.start()
+        
+        # Batch state
+        self.batch_thread = None
+        self.batch_files = []
+        self.batch_results = {}
+        
+    def setup_ui(self):
+        # Main widget and layout
+        main_widget = QWidget()
+        main_layout = QVBoxLayout()
+        
+        # Title and version
+        title_layout = QHBoxLayout()
+        title_label = QLabel("Metadata Generator")
+        title_label.setFont(QFont("Arial", 16, QFont.Weight.Bold))
+        version_label = QLabel("v1.1 - Powered by Gemini 1.5 Flash")
+        version_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        title_layout.addWidget(title_label)
+        title_layout.addWidget(version_label)
+        
+        # API Key section
+        api_key_layout = QHBoxLayout()
+        api_key_label = QLabel("Gemini API Key:")
+        self.api_key_input = QLineEdit()
+        self.api_key_input.setPlaceholderText("Enter your Gemini AI API key...")
+        self.api_key_input.setEchoMode(QLineEdit.EchoMode.Password)
+        
+        load_key_button = QPushButton("Load from File")
+        load_key_button.clicked.connect(self.load_api_key)
+        
+        save_key_button = QPushButton("Save Key")
+        save_key_button.clicked.connect(self.save_api_key)
+        
+        api_key_layout.addWidget(api_key_label)
+        api_key_layout.addWidget(self.api_key_input)
+        api_key_layout.addWidget(load_key_button)
+        api_key_layout.addWidget(save_key_button)
+        
+        # Model selection section
+        model_layout = QHBoxLayout()
+        model_label = QLabel("Model:")
+        self.model_combo = QComboBox()
+        self.model_combo.addItems([AUTO_MODEL] + list(MODEL_PRICES))
+        self.model_combo.setCurrentText(DEFAULT_MODEL)
+        self.downscale_check = QCheckBox("Downscale images to max edge:")
+        self.downscale_check.setChecked(ImagePreprocessor.available())
+        self.downscale_check.setEnabled(ImagePreprocessor.available())
+        self.max_edge_spin = QSpinBox()
+        self.max_edge_spin.setRange(256, 8192)
+        self.max_edge_spin.setValue(DEFAULT_MAX_EDGE)
+        self.max_edge_spin.setSuffix(" px")
+        model_layout.addWidget(model_label)
+        model_layout.addWidget(self.model_combo)
+        model_layout.addStretch()
+        model_layout.addWidget(self.downscale_check)
+        model_layout.addWidget(self.max_edge_spin)
+        
+        self.frames_check = QCheckBox("Sample video frames:")
+        self.frames_check.setEnabled(KeyframeSampler.available())
+        self.frames_spin = QSpinBox()
+        self.frames_spin.setRange(1, 64)
+        self.frames_spin.setValue(DEFAULT_FRAME_COUNT)
+        model_layout.addWidget(self.frames_check)
+        model_layout.addWidget(self.frames_spin)
+        
+        # Prompt template section
+        template_layout = QHBoxLayout()
+        template_title = QLabel("Prompt Template:")
+        self.template_label = QLabel("Built-in prompts")
+        load_template_button = QPushButton("Load Template...")
+        load_template_button.clicked.connect(self.load_template)
+        clear_template_button = QPushButton("Use Built-in")
+        clear_template_button.clicked.connect(self.clear_template)
+        template_layout.addWidget(template_title)
+        template_layout.addWidget(self.template_label)
+        template_layout.addStretch()
+        template_layout.addWidget(load_template_button)
+        template_layout.addWidget(clear_template_button)
+        
+        # File selection section
+        file_section_layout = QHBoxLayout()
+        
+        # File type selection
+        file_type_layout = QVBoxLayout()
+        file_type_label = QLabel("File Type:")
+        self.file_type_combo = QComboBox()
+        self.file_type_combo.addItems(["Image", "Video"])
+        file_type_layout.addWidget(file_type_label)
+        file_type_layout.addWidget(self.file_type_combo)
+        
+        # File browser
+        self.file_path_input = QLineEdit()
+        self.file_path_input.setPlaceholderText("Select a file...")
+        
+        browse_button = QPushButton("Browse")
+        browse_button.clicked.connect(self.browse_file)
+        
+        file_browser_layout = QHBoxLayout()
+        file_browser_layout.addWidget(self.file_path_input)
+        file_browser_layout.addWidget(browse_button)
+        
+        file_section_layout.addLayout(file_type_layout)
+        file_section_layout.addLayout(file_browser_layout)
+        
+        # Preview section
+        preview_layout = QVBoxLayout()
+        preview_label = QLabel("Preview:")
+        self.preview_image = QLabel()
+        self.preview_image.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.preview_image.setFixedHeight(300)
+        self.preview_image.setStyleSheet("border: 1px solid #ccc; background-color: #f5f5f5;")
+        
+        preview_layout.addWidget(preview_label)
+        preview_layout.addWidget(self.preview_image)
+        
+        # Generate section
+        generate_layout = QHBoxLayout()
+        self.generate_button = QPushButton("Generate Metadata")
+        self.generate_button.setFixedHeight(50)
+        self.generate_button.clicked.connect(self.generate_metadata)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        
+        generate_layout.addWidget(self.generate_button)
+        generate_layout.addWidget(self.progress_bar)
+        
+        # Batch section
+        batch_layout = QHBoxLayout()
+        batch_label = QLabel("Batch:")
+        self.batch_source_input = QLineEdit()
+        self.batch_source_input.setPlaceholderText("Folder or glob pattern (e.g. /photos/**/*.jpg)...")
+        
+        browse_folder_button = QPushButton("Browse Folder")
+        browse_folder_button.clicked.connect(self.browse_folder)
+        
+        workers_label = QLabel("Workers:")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 512)
+        self.workers_spin.setValue(4)
+        
+        engine_label = QLabel("Engine:")
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItems(["Threads"])
+        if async_backend_available():
+            self.engine_combo.addItems(["Asyncio"])
+        
+        per_request_label = QLabel("Files/request:")
+        self.per_request_spin = QSpinBox()
+        self.per_request_spin.setRange(1, 32)
+        self.per_request_spin.setValue(1)
+        self.per_request_spin.setToolTip("Pack several images into one request (threads engine only)")
+        self.engine_combo.currentTextChanged.connect(
+            lambda engine: self.per_request_spin.setEnabled(engine == "Threads"))
+        
+        rpm_label = QLabel("Requests/min:")
+        self.rpm_spin = QSpinBox()
+        self.rpm_spin.setRange(0, 10000)
+        self.rpm_spin.setSpecialValueText("No limit")
+        self.rpm_spin.setValue(0)
+        
+        self.resume_check = QCheckBox("Resume")
+        self.resume_check.setChecked(True)
+        self.resume_check.setToolTip("Skip files finished in an earlier run and retry the ones that failed")
+        
+        self.dedupe_check = QCheckBox("Skip near-duplicates")
+        self.dedupe_check.setToolTip("Send one image per group of burst shots or resized copies "
+                                     "and reuse its result for the rest")
+        self.dedupe_check.setEnabled(dedupe_available())
+        
+        self.batch_button = QPushButton("Start Batch")
+        self.batch_button.clicked.connect(self.start_batch)
+        
+        self.pause_button = QPushButton("Pause")
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause_batch)
+        
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_batch)
+        
+        batch_layout.addWidget(batch_label)
+        batch_layout.addWidget(self.batch_source_input)
+        batch_layout.addWidget(browse_folder_button)
+        batch_layout.addWidget(workers_label)
+        batch_layout.addWidget(self.workers_spin)
+        batch_layout.addWidget(engine_label)
+        batch_layout.addWidget(self.engine_combo)
+        batch_layout.addWidget(per_request_label)
+        batch_layout.addWidget(self.per_request_spin)
+        batch_layout.addWidget(rpm_label)
+        batch_layout.addWidget(self.rpm_spin)
+        batch_layout.addWidget(self.resume_check)
+        batch_layout.addWidget(self.dedupe_check)
+        batch_layout.addWidget(self.batch_button)
+        batch_layout.addWidget(self.pause_button)
+        batch_layout.addWidget(self.cancel_button)
+        
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setFormat("%v / %m files")
+        self.batch_progress_bar.setValue(0)
+        
+        # Results section
+        results_tabs = QTabWidget()
+        
+        # Title tab
+        title_widget = QWidget()
+        title_layout = QVBoxLayout()
+        title_label = QLabel("Title:")
+        self.title_input = QTextEdit()
+        title_layout.addWidget(title_label)
+        title_layout.addWidget(self.title_input)
+        title_widget.setLayout(title_layout)
+        
+        # Description tab
+        desc_widget = QWidget()
+        desc_layout = QVBoxLayout()
+        desc_label = QLabel("Description:")
+        self.desc_input = QTextEdit()
+        desc_layout.addWidget(desc_label)
+        desc_layout.addWidget(self.desc_input)
+        desc_widget.setLayout(desc_layout)
+        
+        # Keywords tab
+        keywords_widget = QWidget()
+        keywords_layout = QVBoxLayout()
+        keywords_label = QLabel("Keywords (comma-separated):")
+        self.keywords_input = QTextEdit()
+        keywords_layout.addWidget(keywords_label)
+        keywords_layout.addWidget(self.keywords_input)
+        keywords_widget.setLayout(keywords_layout)
+        
+        results_tabs.addTab(title_widget, "Title")
+        results_tabs.addTab(desc_widget, "Description")
+        results_tabs.addTab(keywords_widget, "Keywords")
+        
+        # Batch results tab
+        self.batch_table = QTableWidget(0, 5)
+        self.batch_table.setHorizontalHeaderLabels(["File", "Status", "Progress", "Title", "Keywords"])
+        self.batch_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.batch_table.horizontalHeader().setStretchLastSection(True)
+        self.batch_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.batch_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.batch_table.cellClicked.connect(self.show_batch_result)
+        results_tabs.addTab(self.batch_table, "Batch Results")
+        
+        # Performance tab: where the time goes, refreshed while a batch runs
+        perf_widget = QWidget()
+        perf_layout = QVBoxLayout()
+        self.perf_summary_label = QLabel("No requests yet")
+        self.perf_table = QTableWidget(len(STAGES), 5)
+        self.perf_table.setHorizontalHeaderLabels(["Stage", "Count", "p50 (ms)", "p95 (ms)", "Max (ms)"])
+        self.perf_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.perf_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.perf_table.verticalHeader().setVisible(False)
+        for row, stage in enumerate(STAGES):
+            self.perf_table.setItem(row, 0, QTableWidgetItem(stage))
+        perf_layout.addWidget(self.perf_summary_label)
+        perf_layout.addWidget(self.perf_table)
+        perf_widget.setLayout(perf_layout)
+        results_tabs.addTab(perf_widget, "Performance")
+        
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.refresh_metrics)
+        
+        # Export section
+        export_layout = QHBoxLayout()
+        self.export_button = QPushButton("Export Metadata")
+        self.export_button.setFixedHeight(40)
+        self.export_button.clicked.connect(self.export_metadata)
+        
+        apply_button = QPushButton("Apply to File")
+        apply_button.setFixedHeight(40)
+        apply_button.clicked.connect(self.apply_to_file)
+        
+        export_batch_button = QPushButton("Export Batch")
+        export_batch_button.setFixedHeight(40)
+        export_batch_button.clicked.connect(self.export_batch)
+        
+        export_layout.addWidget(self.export_button)
+        export_layout.addWidget(apply_button)
+        export_layout.addWidget(export_batch_button)
+        
+        # Add all sections to main layout
+        main_layout.addLayout(title_layout)
+        main_layout.addLayout(api_key_layout)
+        main_layout.addLayout(model_layout)
+        main_layout.addLayout(template_layout)
+        main_layout.addLayout(file_section_layout)
+        main_layout.addLayout(preview_layout)
+        main_layout.addLayout(generate_layout)
+        main_layout.addLayout(batch_layout)
+        main_layout.addWidget(self.batch_progress_bar)
+        main_layout.addWidget(results_tabs)
+        main_layout.addLayout(export_layout)
+        
+        # Set the main layout
+        main_widget.setLayout(main_layout)
+        self.setCentralWidget(main_widget)
+    
+    def load_api_key(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select API Key File", "", "Text Files (*.txt)")
+        if file_path:
+            try:
+                with open(file_path, 'r') as file:
+                    api_key = file.read().strip()
+                    self.api_key_input.setText(api_key)
+                    QMessageBox.information(self, "Success", "API Key loaded successfully!")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to load API key: {str(e)}")
+    
+    def save_api_key(self):
+        api_key = self.api_key_input.text().strip()
+        if not api_key:
+            QMessageBox.warning(self, "Warning", "Please enter an API key first.")
+            return
+            
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save API Key", "", "Text Files (*.txt)")
+        if file_path:
+            try:
+                with open(file_path, 'w') as file:
+                    file.write(api_key)
+                QMessageBox.information(self, "Success", "API Key saved successfully!")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save API key: {str(e)}")
+    
+    def load_template(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select Prompt Template", "", "Templates (*.json)")
+        if not file_path:
+            return
+        try:
+            self.prompt_template = load_template(file_path)
+        except TemplateError as e:
+            QMessageBox.critical(self, "Error", f"Invalid template: {str(e)}")
+            return
+        self.template_label.setText(f"{self.prompt_template.signature} ({os.path.basename(file_path)})")
+    
+    def clear_template(self):
+        self.prompt_template = None
+        self.template_label.setText("Built-in prompts")
+    
+    def browse_file(self):
+        file_type = self.file_type_combo.currentText().lower()
+        
+        if file_type == "image":
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Select Image", "", "Image Files (*.png *.jpg *.jpeg *.bmp *.gif)"
+            )
+        else:  # video
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Select Video", "", "Video Files (*.mp4 *.avi *.mov *.mkv)"
+            )
+            
+        if file_path:
+            self.file_path_input.setText(file_path)
+            self.current_file_path = file_path
+            self.current_file_type = file_type
+            self.update_preview()
+    
+    def update_preview(self):
+        if not self.current_file_path:
+            return
+        
+        self.preview_image.setText(f"Loading preview: {os.path.basename(self.current_file_path)}")
+        self.preview_thread.request(self.current_file_path, self.current_file_type)
+    
+    def preview_loaded(self, file_path, image):
+        if file_path != self.current_file_path:
+            return  # The selection moved on while this one was decoding
+        pixmap = QPixmap.fromImage(image).scaled(
+            self.preview_image.width(), self.preview_image.height(),
+            Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+        self.preview_image.setPixmap(pixmap)
+    
+    def preview_failed(self, file_path, error_message):
+        if file_path != self.current_file_path:
+            return
+        if self.current_file_type == "video":
+            self.preview_image.setText(f"Video file selected: {os.path.basename(file_path)}")
+        else:
+            self.preview_image.setText(f"Preview error: {error_message}")
+    
+    def generate_metadata(self):
+        api_key = self.api_key_input.text().strip()
+        if not api_key:
+            QMessageBox.warning(self, "Warning", "Please enter your Gemini API key.")
+            return
+        
+        if not self.current_file_path:
+            QMessageBox.warning(self, "Warning", "Please select a file first.")
+            return
+        
+        # Reset progress bar
+        self.progress_bar.setValue(0)
+        
+        # Disable the generate button while processing
+        self.generate_button.setEnabled(False)
+        self.generate_button.setText("Generating...")
+        
+        # Create and start the processing thread
+        self.thread = GeminiThread(api_key, self.current_file_path, self.current_file_type,
+                                   cache=self.result_cache, preprocessor=self.image_preprocessor(),
+                                   frame_sampler=self.frame_sampler(), transport=self.http_transport(),
+                                   model=self.model_combo.currentText(), router=self.model_router(),
+                                   prompt_template=self.prompt_template, context_cache=self.context_cache)
+        self.thread.finished.connect(self.metadata_received)
+        self.thread.error.connect(self.show_error)
+        self.thread.progress.connect(self.update_progress)
+        self.thread.start()
+    
+    def image_preprocessor(self):
+        if not self.downscale_check.isChecked():
+            return None
+        return ImagePreprocessor(max_edge=self.max_edge_spin.value())
+    
+    def http_transport(self):
+        if self.transport is None:
+            self.transport = HttpTransport()
+        rpm = self.rpm_spin.value()
+        self.transport.rate_limiter = RateLimiter(rpm) if rpm else None
+        return self.transport
+    
+    def model_router(self):
+        """A router over the default models when "Auto" is selected; kept for the Performance tab"""
+        if self.model_combo.currentText() != AUTO_MODEL:
+            return None
+        if self.router is None:
+            self.router = ModelRouter(default_routes())
+        return self.router
+    
+    def frame_sampler(self):
+        if not self.frames_check.isChecked():
+            return None
+        return KeyframeSampler(count=self.frames_spin.value())
+    
+    def update_progress(self, value):
+        self.progress_bar.setValue(value)
+    
+    def refresh_metrics(self):
+        snapshot = metrics.snapshot()
+        counters = snapshot["counters"]
+        lines = [
+            f"{snapshot['processed']} files ({counters['files']} succeeded, {counters['cache_hits']} cached, "
+            f"{counters['duplicates']} duplicates, {counters['errors']} failed), "
+            f"{snapshot['files_per_second']:.2f} files/s, "
+            f"{(counters['bytes_sent'] + counters['bytes_uploaded']) / (1024 * 1024):.1f} MB sent, "
+            f"{counters['total_tokens'] or counters['prompt_tokens'] + counters['output_tokens']} tokens"
+        ]
+        if self.router is not None:
+            lines += route_summary_lines(self.router.snapshot())
+        self.perf_summary_label.setText("\n".join(lines))
+        for row, stage in enumerate(STAGES):
+            stats = snapshot["stages"].get(stage)
+            values = [str(stats["count"])] + [f"{stats[key] * 1000:.1f}" for key in ("p50", "p95", "max")] \
+                if stats else ["0", "", "", ""]
+            for column, value in enumerate(values, start=1):
+                self.perf_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def metadata_received(self, metadata):
+        self.refresh_metrics()
+        # Update the UI with the received metadata
+        self.title_input.setText(metadata.get('title', ''))
+        self.desc_input.setText(metadata.get('description', ''))
+        
+        keywords = metadata.get('keywords', [])
+        if isinstance(keywords, list):
+            self.keywords_input.setText(', '.join(keywords))
+        else:
+            self.keywords_input.setText(str(keywords))
+        
+        # Re-enable the generate button
+        self.generate_button.setEnabled(True)
+        self.generate_button.setText("Generate Metadata")
+        
+        # Complete the progress bar
+        self.progress_bar.setValue(100)
+        
+        QMessageBox.information(self, "Success", "Metadata generated successfully!")
+    
+    def show_error(self, error_message):
+        QMessageBox.critical(self, "Error", error_message)
+        self.generate_button.setEnabled(True)
+        self.generate_button.setText("Generate Metadata")
+        self.progress_bar.setValue(0)
+    
+    def browse_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder")
+        if folder:
+            self.batch_source_input.setText(folder)
+    
+    def start_batch(self):
+        api_key = self.api_key_input.text().strip()
+        if not api_key:
+            QMessageBox.warning(self, "Warning", "Please enter your Gemini API key.")
+            return
+        
+        source = self.batch_source_input.text().strip()
+        if not source:
+            QMessageBox.warning(self, "Warning", "Please select a folder or enter a glob pattern.")
+            return
+        
+        self.batch_files = collect_files(source)
+        if not self.batch_files:
+            QMessageBox.warning(self, "Warning", "No image or video files matched.")
+            return
+        
+        # Fill the results table with one queued row per file
+        self.batch_results = {}
+        self.batch_table.setRowCount(len(self.batch_files))
+        for row, file_path in enumerate(self.batch_files):
+            self.batch_table.setItem(row, 0, QTableWidgetItem(file_path))
+            self.batch_table.setItem(row, 1, QTableWidgetItem("Queued"))
+            self.batch_table.setItem(row, 2, QTableWidgetItem("0%"))
+            self.batch_table.setItem(row, 3, QTableWidgetItem(""))
+            self.batch_table.setItem(row, 4, QTableWidgetItem(""))
+        
+        self.batch_progress_bar.setRange(0, len(self.batch_files))
+        self.batch_progress_bar.setValue(0)
+        
+        self.batch_button.setEnabled(False)
+        self.pause_button.setEnabled(True)
+        self.pause_button.setText("Pause")
+        self.cancel_button.setEnabled(True)
+        
+        self.batch_thread = BatchThread(api_key, self.batch_files, self.workers_spin.value(),
+                                        cache=self.result_cache, preprocessor=self.image_preprocessor(),
+                                        frame_sampler=self.frame_sampler(), transport=self.http_transport(),
+                                        engine=self.engine_combo.currentText().lower(),
+                                        files_per_request=self.per_request_spin.value(),
+                                        journal=self.job_journal, resume=self.resume_check.isChecked(),
+                                        model=self.model_combo.currentText(), router=self.model_router(),
+                                        duplicate_index=self.duplicate_index if self.dedupe_check.isChecked()
+                                        else None,
+                                        prompt_template=self.prompt_template, context_cache=self.context_cache)
+        self.batch_thread.file_started.connect(self.batch_file_started)
+        self.batch_thread.file_progress.connect(self.batch_file_progress)
+        self.batch_thread.file_finished.connect(self.batch_file_finished)
+        self.batch_thread.file_error.connect(self.batch_file_error)
+        self.batch_thread.overall_progress.connect(self.batch_overall_progress)
+        self.batch_thread.finished.connect(self.batch_done)
+        metrics.reset()
+        self.metrics_timer.start()
+        self.batch_thread.start()
+    
+    def toggle_pause_batch(self):
+        if not self.batch_thread:
+            return
+        
+        if self.batch_thread.is_paused():
+            self.batch_thread.resume()
+            self.pause_button.setText("Pause")
+        else:
+            self.batch_thread.pause()
+            self.pause_button.setText("Resume")
+    
+    def cancel_batch(self):
+        if self.batch_thread:
+            self.batch_thread.cancel()
+            self.cancel_button.setEnabled(False)
+            self.pause_button.setEnabled(False)
+    
+    def batch_file_started(self, row):
+        self.batch_table.item(row, 1).setText("Processing")
+    
+    def batch_file_progress(self, row, value):
+        self.batch_table.item(row, 2).setText(f"{value}%")
+    
+    def batch_file_finished(self, row, metadata):
+        self.batch_results[row] = metadata
+        keywords = metadata.get('keywords', [])
+        if isinstance(keywords, list):
+            keywords = ', '.join(keywords)
+        self.batch_table.item(row, 1).setText("Done")
+        self.batch_table.item(row, 2).setText("100%")
+        self.batch_table.item(row, 3).setText(metadata.get('title', ''))
+        self.batch_table.item(row, 4).setText(str(keywords))
+    
+    def batch_file_error(self, row, error_message):
+        self.batch_table.item(row, 1).setText("Failed")
+        self.batch_table.item(row, 1).setToolTip(error_message)
+    
+    def batch_overall_progress(self, done, total):
+        self.batch_progress_bar.setValue(done)
+    
+    def batch_done(self):
+        self.metrics_timer.stop()
+        self.refresh_metrics()
+        cancelled = self.batch_thread.is_cancelled()
+        if cancelled:
+            # Anything still queued was never sent
+            for row in range(self.batch_table.rowCount()):
+                if self.batch_table.item(row, 1).text() == "Queued":
+                    self.batch_table.item(row, 1).setText("Cancelled")
+        
+        self.batch_button.setEnabled(True)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText("Pause")
+        self.cancel_button.setEnabled(False)
+        
+        failed = sum(1 for row in range(self.batch_table.rowCount())
+                     if self.batch_table.item(row, 1).text() == "Failed")
+        status = "Batch cancelled" if cancelled else "Batch complete"
+        QMessageBox.information(self, status, 
+                                f"{len(self.batch_results)} succeeded, {failed} failed "
+                                f"out of {len(self.batch_files)} files.")
+    
+    def show_batch_result(self, row, column):
+        metadata = self.batch_results.get(row)
+        if metadata is None:
+            return
+        
+        # Load the selected result into the editors so it can be exported
+        self.current_file_path = self.batch_files[row]
+        self.current_file_type = detect_file_type(self.current_file_path)
+        self.file_path_input.setText(self.current_file_path)
+        self.title_input.setText(metadata.get('title', ''))
+        self.desc_input.setText(metadata.get('description', ''))
+        keywords = metadata.get('keywords', [])
+        if isinstance(keywords, list):
+            self.keywords_input.setText(', '.join(keywords))
+        else:
+            self.keywords_input.setText(str(keywords))
+        self.update_preview()
+    
+    def export_metadata(self):
+        if not self.title_input.toPlainText().strip():
+            QMessageBox.warning(self, "Warning", "No metadata to export. Generate metadata first.")
+            return
+        
+        # Create metadata dictionary
+        metadata = {
+            "title": self.title_input.toPlainText().strip(),
+            "description": self.desc_input.toPlainText().strip(),
+            "keywords": split_keywords(self.keywords_input.toPlainText()),
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "source_file": self.current_file_path if self.current_file_path else "Unknown"
+        }
+        
+        # Export to file
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Metadata", "", "JSON Files (*.json);;Text Files (*.txt);;XMP Sidecar (*.xmp)"
+        )
+        
+        if not file_path:
+            return
+        
+        try:
+            if file_path.endswith('.xmp'):
+                with open(file_path, 'wb') as file:
+                    file.write(build_xmp(metadata))
+                QMessageBox.information(self, "Success", f"Metadata exported successfully to {file_path}")
+                return
+            
+            with open(file_path, 'w') as file:
+                if file_path.endswith('.json'):
+                    json.dump(metadata, file, indent=4)
+                else:
+                    file.write(f"Title: {metadata['title']}\n\n")
+                    file.write(f"Description: {metadata['description']}\n\n")
+                    file.write(f"Keywords: {', '.join(metadata['keywords'])}\n\n")
+                    file.write(f"Generated at: {metadata['generated_at']}\n")
+                    file.write(f"Source file: {metadata['source_file']}\n")
+                    
+            QMessageBox.information(self, "Success", f"Metadata exported successfully to {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to export metadata: {str(e)}")
+    
+    def export_batch(self):
+        if not self.batch_results:
+            QMessageBox.warning(self, "Warning", "No batch results to export. Run a batch first.")
+            return
+        
+        file_path, selected = QFileDialog.getSaveFileName(self, "Export Batch", "", ";;".join(BATCH_EXPORT_FILTERS))
+        if not file_path:
+            return
+        output_format = BATCH_EXPORT_FILTERS.get(selected) or format_for_path(file_path)
+        # Sidecars go next to each asset; the chosen name only picks the format
+        output = None if output_format == "xmp" else file_path
+        
+        try:
+            with open_exporter(output_format, output) as exporter:
+                for row in sorted(self.batch_results):
+                    exporter.write(make_record(self.batch_files[row], metadata=self.batch_results[row]))
+            QMessageBox.information(self, "Success", f"Exported {exporter.count} results")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to export batch: {str(e)}")
+    
+    def apply_to_file(self):
+        if not self.current_file_path:
+            QMessageBox.warning(self, "Warning", "Please select a file first.")
+            return
+        if not self.title_input.toPlainText().strip():
+            QMessageBox.warning(self, "Warning", "No metadata to apply. Generate metadata first.")
+            return
+        if not can_embed(self.current_file_path):
+            QMessageBox.warning(self, "Warning", "Metadata can only be written into JPEG, PNG, TIFF, "
+                                                 "MP4 and MOV files.")
+            return
+        
+        metadata = {
+            "title": self.title_input.toPlainText().strip(),
+            "description": self.desc_input.toPlainText().strip(),
+            "keywords": split_keywords(self.keywords_input.toPlainText())
+        }
+        try:
+            embed_metadata(self.current_file_path, metadata)
+            QMessageBox.information(self, "Success", f"Metadata written to {self.current_file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to apply metadata: {str(e)}")
+    
+    def closeEvent(self, event):
+        self.preview_thread.stop()
+        self.context_cache.close()
+        super().closeEvent(event)
+
+def main():
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')  # Use Fusion style for better cross-platform look
+    
+    # Set application stylesheet for better aesthetics
+    app.setStyleSheet("""
+        QMainWindow {
+            background-color: #f5f5f5;
+        }
+        QLabel {
+            font-weight: bold;
+        }
+        QPushButton {
+            background-color: #0078d7;
+            color: white;
+            border-radius: 4px;
+            padding: 6px;
+            font-weight: bold;
+        }
+        QPushButton:hover {
+            background-color: #1a88e0;
+        }
+        QPushButton:disabled {
+            background-color: #cccccc;
+        }
+        QTextEdit, QLineEdit {
+            border: 1px solid #aaa;
+            border-radius: 4px;
+            padding: 5px;
+            background-color: white;
+        }
+        QTabWidget::pane {
+            border: 1px solid #aaa;
+            background-color: white;
+        }
+        QTabBar::tab {
+            background-color: #e1e1e1;
+            border: 1px solid #aaa;
+            border-bottom: none;
+            border-top-left-radius: 4px;
+            border-top-right-radius: 4px;
+            padding: 5px 10px;
+        }
+        QTabBar::tab:selected {
+            background-color: white;
+        }
+    """)
+    
+    window = MetadataGeneratorApp()
+    window.show()
+    
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
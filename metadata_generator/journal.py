@@ -0,0 +1,119 @@
+"""Append-only job journal so an interrupted batch can pick up where it stopped.
+
+Every finished file is written (with its result or error) the moment it
+completes. On restart, files already marked done are skipped without any API
+call and failed ones are queued again. Files whose size or modification time
+changed since they were recorded count as new.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from .cache import default_cache_path
+
+DONE = "done"
+FAILED = "failed"
+
+
+def default_journal_path():
+    return os.path.join(os.path.dirname(default_cache_path()), "journal.sqlite")
+
+
+def _file_identity(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class JobJournal:
+    """SQLite (WAL mode) record of each file's status and result.
+
+    WAL keeps every completed file durable with one cheap commit while
+    readers never block the writer. Safe to share between worker threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is crash-safe in WAL mode; only a power loss can drop the last few commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def resume(self, file_paths):
+        """Split ``file_paths`` into finished work and work still to do.
+
+        Returns ``(finished, pending)``: a dict mapping index to the recorded
+        metadata for files already done, and the list of remaining indices.
+        """
+        with self._lock:
+            rows = {path: (size, mtime, status, result) for path, size, mtime, status, result in
+                    self._conn.execute("SELECT path, size, mtime, status, result FROM jobs WHERE status = ?",
+                                       (DONE,))}
+        finished = {}
+        pending = []
+        for index, file_path in enumerate(file_paths):
+            row = rows.get(os.path.abspath(file_path))
+            if row is not None:
+                try:
+                    unchanged = _file_identity(file_path) == row[:2]
+                except OSError:
+                    unchanged = False
+                if unchanged:
+                    finished[index] = json.loads(row[3])
+                    continue
+            pending.append(index)
+        return finished, pending
+
+    def _record(self, file_path, status, result=None, error=None):
+        try:
+            size, mtime = _file_identity(file_path)
+        except OSError:
+            size = mtime = None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (path, size, mtime, status, result, error, attempts, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+                "status = excluded.status, result = excluded.result, error = excluded.error, "
+                "attempts = jobs.attempts + 1, updated = excluded.updated",
+                (os.path.abspath(file_path), size, mtime, status, result, error, time.time())
+            )
+            self._conn.commit()
+
+    def record_result(self, file_path, metadata):
+        self._record(file_path, DONE, result=json.dumps(metadata))
+
+    def record_error(self, file_path, message):
+        self._record(file_path, FAILED, error=message)
+
+    def failures(self):
+        """Return ``[(path, error, attempts)]`` for files whose last attempt failed"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, error, attempts FROM jobs WHERE status = ? ORDER BY path", (FAILED,)
+            ).fetchall()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {"done": counts.get(DONE, 0), "failed": counts.get(FAILED, 0)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
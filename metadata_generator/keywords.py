@@ -0,0 +1,322 @@
+"""Keyword clean-up: normalisation, plural folding, stop words, taxonomy mapping and frequency stats.
+
+A day's results repeat the same keywords over and over, so each distinct raw
+keyword is resolved once and remembered; a keyword list is then rebuilt with
+dict lookups, and whole result sets go through ``process_many`` in one pass::
+
+    processor = KeywordProcessor(Taxonomy.load("vocabulary.txt"))
+    records = processor.process_records(load_results("results.jsonl"))
+    processor.most_common(20)
+
+A taxonomy (controlled vocabulary) is a text file with one concept per line,
+the preferred term first and its synonyms after ``|`` (``#`` starts a
+comment), or a JSON object mapping each preferred term to a list of synonyms.
+"""
+import re
+import csv
+import json
+import threading
+import unicodedata
+from itertools import chain
+from collections import Counter
+
+from .parsing import split_keywords
+
+# Dropped wherever they appear as a whole keyword (compared after normalisation)
+DEFAULT_STOP_WORDS = frozenset({
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "with", "by", "from", "as",
+    "it", "its", "this", "that", "image", "photo", "photograph", "picture", "pic", "stock", "stock photo",
+    "stock image", "royalty free",
+})
+# Stripped from the front of a phrase ("a red apple" -> "red apple")
+LEADING_ARTICLES = ("a", "an", "the")
+# Distinct raw keywords remembered before the memo starts over (bounds memory in --watch runs)
+MEMO_LIMIT = 1000000
+
+_NON_WORD_RE = re.compile(r"[^\w\s'&+-]+")
+_EDGE_PUNCTUATION = "'-&+_"
+
+# Plural nouns that do not follow the rules below
+IRREGULAR_PLURALS = {
+    "children": "child", "men": "man", "women": "woman", "mice": "mouse", "geese": "goose", "feet": "foot",
+    "teeth": "tooth", "oxen": "ox", "lice": "louse", "dice": "die", "wolves": "wolf", "leaves": "leaf",
+    "knives": "knife", "wives": "wife", "lives": "life", "shelves": "shelf", "calves": "calf", "halves": "half",
+    "loaves": "loaf", "thieves": "thief", "scarves": "scarf", "hooves": "hoof", "elves": "elf",
+    "selves": "self", "cacti": "cactus", "fungi": "fungus", "criteria": "criterion", "phenomena": "phenomenon",
+    "axes": "axe",
+}
+# Words ending in "s" that are not plurals, or whose plural is the usual keyword
+INVARIANT_WORDS = frozenset({
+    "people", "news", "series", "species", "means", "jeans", "pants", "shorts", "trousers", "scissors",
+    "glasses", "sunglasses", "binoculars", "clothes", "goggles", "headphones", "earphones", "pajamas",
+    "politics", "physics", "mathematics", "economics", "athletics", "gymnastics", "aerobics", "electronics",
+    "graphics", "statistics", "ethics", "diabetes", "measles", "headquarters", "christmas", "lens", "gas",
+    "atlas", "canvas", "bias", "alias", "chaos", "cosmos", "ethos", "thermos", "texas", "paris", "always",
+    "perhaps", "yes", "this", "its", "his", "hers", "ours", "yours", "theirs", "sometimes", "outdoors",
+    "indoors", "upstairs", "downstairs", "overseas", "nevertheless", "whereas", "towards", "afterwards",
+})
+# "-ies" words whose singular ends in "ie", not "y"
+IE_PLURALS = frozenset({
+    "movies", "cookies", "zombies", "selfies", "smoothies", "brownies", "calories", "hoodies", "veggies",
+    "rookies", "pixies", "hippies", "goalies", "genies", "collies", "newbies", "freebies", "budgies",
+    "birdies", "boogies", "aussies", "lingeries", "prairies", "rotisseries", "sweeties", "techies",
+})
+# "-ches"/"-oes" words that only take an "s"
+E_PLURALS = frozenset({
+    "avalanches", "niches", "quiches", "cliches", "caches", "moustaches", "mustaches", "canoes", "oboes",
+    "tiptoes", "floes", "horseshoes", "snowshoes",
+})
+# "-ses" words whose singular ends in "s" (most, like houses and roses, only take an "s")
+S_PLURALS = frozenset({
+    "buses", "minibuses", "gases", "lenses", "atlases", "canvases", "biases", "aliases", "bonuses", "viruses",
+    "campuses", "circuses", "octopuses", "walruses", "platypuses", "hippopotamuses", "cactuses", "irises",
+    "choruses", "censuses", "focuses", "geniuses", "thermoses", "christmases",
+})
+
+
+def singular(word):
+    """Fold an English plural noun to its singular by rule (with exceptions); other words pass through"""
+    if "-" in word:
+        head, _, tail = word.rpartition("-")  # t-shirts -> t-shirt
+        return f"{head}-{singular(tail)}"
+    if len(word) <= 3 or word in INVARIANT_WORDS or not word.isalpha():
+        return IRREGULAR_PLURALS.get(word, word)
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in IE_PLURALS or word in E_PLURALS:
+        return word[:-1]
+    if word in S_PLURALS:
+        return word[:-2]
+    if word.endswith("ies") and len(word) > 4 and word[-4] not in "aeiou":
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "zzes", "shes")):
+        return word[:-2]
+    if word.endswith("ches"):
+        # beaches -> beach, but headaches -> headache
+        if word.endswith("aches") and (len(word) < 6 or word[-6] not in "aeiou"):
+            return word[:-1]
+        return word[:-2]
+    if word.endswith("oes") and len(word) > 5 and not word.endswith("shoes"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_keyword(keyword, lemmatize=True):
+    """Canonical form of a keyword: NFKC, case-folded, punctuation and extra spaces removed,
+    leading articles dropped and (with ``lemmatize``) the head noun, its last word, made singular"""
+    text = _NON_WORD_RE.sub(" ", unicodedata.normalize("NFKC", str(keyword)).casefold())
+    words = [word.strip(_EDGE_PUNCTUATION) for word in text.split()]
+    words = [word for word in words if word]
+    while len(words) > 1 and words[0] in LEADING_ARTICLES:
+        del words[0]
+    if lemmatize and words:
+        words[-1] = singular(words[-1])
+    return " ".join(words)
+
+
+class Taxonomy:
+    """Controlled vocabulary indexed for lookups by normalised form.
+
+    ``index`` maps the normalised form of every term and synonym to its
+    preferred term. ``trie`` holds the same forms word by word, so phrases
+    of the vocabulary can be found inside longer keywords without trying
+    every substring.
+    """
+
+    _END = ""  # Trie key marking the end of a term; never a word
+
+    def __init__(self, concepts, lemmatize=True):
+        """``concepts`` is an iterable of ``(preferred, synonyms)`` pairs"""
+        self.lemmatize = lemmatize
+        self.index = {}
+        self.trie = {}
+        self.terms = []
+        for preferred, synonyms in concepts:
+            preferred = str(preferred).strip()
+            if not preferred:
+                continue
+            self.terms.append(preferred)
+            for name in chain([preferred], synonyms or ()):
+                form = normalize_keyword(name, lemmatize)
+                if not form:
+                    continue
+                known = self.index.setdefault(form, preferred)
+                if known != preferred:
+                    raise ValueError(f"'{name}' is listed under both '{known}' and '{preferred}'")
+                node = self.trie
+                for word in form.split(" "):
+                    node = node.setdefault(word, {})
+                node[self._END] = preferred
+
+    def __len__(self):
+        return len(self.terms)
+
+    def lookup(self, form):
+        """Preferred term for a whole normalised keyword, or None"""
+        return self.index.get(form)
+
+    def find(self, form):
+        """Preferred terms of the vocabulary phrases inside a normalised keyword, longest match first at each word"""
+        words = form.split(" ")
+        if self.lemmatize:
+            # Only the last word of a keyword is folded; a phrase may end on any of the others
+            words = [(word, singular(word)) for word in words]
+        else:
+            words = [(word, word) for word in words]
+        found = []
+        start = 0
+        while start < len(words):
+            node = self.trie
+            match = None
+            end = start
+            for position in range(start, len(words)):
+                word, folded = words[position]
+                node = node.get(word) or node.get(folded)
+                if node is None:
+                    break
+                if self._END in node:
+                    match, end = node[self._END], position + 1
+            if match is None:
+                start += 1
+                continue
+            found.append(match)
+            start = end
+        return found
+
+    @classmethod
+    def load(cls, path, lemmatize=True):
+        """Read a taxonomy from a text file (``preferred | synonym | ...`` per line) or a JSON file"""
+        with open(path, 'r', encoding='utf-8') as file:
+            if path.lower().endswith(".json"):
+                data = json.load(file)
+                if isinstance(data, dict):
+                    concepts = [(term, [synonyms] if isinstance(synonyms, str) else synonyms)
+                                for term, synonyms in data.items()]
+                elif isinstance(data, list):
+                    concepts = [(term, ()) for term in data]
+                else:
+                    raise ValueError(f"{path}: expected a JSON object or list")
+            else:
+                concepts = []
+                for line in file:
+                    names = [name.strip() for name in line.split("#", 1)[0].split("|")]
+                    if names[0]:
+                        concepts.append((names[0], [name for name in names[1:] if name]))
+        return cls(concepts, lemmatize)
+
+
+def load_stop_words(path):
+    """Stop words from a text file, one per line (``#`` starts a comment)"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return {line.split("#", 1)[0].strip() for line in file} - {""}
+
+
+class KeywordProcessor:
+    """Normalise, filter, map and dedupe keyword lists, and count how often each result keyword occurs.
+
+    A keyword is normalised (normalize_keyword) and dropped if it is a stop
+    word. With a ``taxonomy`` it becomes the preferred term it matches as a
+    whole, or else every vocabulary phrase found inside it; keywords that
+    match nothing are kept in normalised form unless ``keep_unmapped`` is
+    false. Lists keep their order, lose duplicates and are cut to
+    ``max_keywords``. Safe to share between threads.
+    """
+
+    def __init__(self, taxonomy=None, stop_words=DEFAULT_STOP_WORDS, keep_unmapped=True, max_keywords=None,
+                 lemmatize=True):
+        self.taxonomy = taxonomy
+        self.lemmatize = lemmatize
+        # Stop words are compared in the same normalised form as the keywords
+        self.stop_words = {normalize_keyword(word, lemmatize) for word in stop_words}
+        self.keep_unmapped = keep_unmapped
+        self.max_keywords = max_keywords
+        self.frequencies = Counter()
+        self.outcomes = Counter()
+        self.assets = 0
+        self.keywords_in = 0
+        self.keywords_out = 0
+        self._terms = {}  # raw keyword -> output terms
+        self._outcomes = {}  # raw keyword -> "kept", "mapped", "unmapped" or "stopped"
+        self._lock = threading.Lock()
+
+    def _resolve(self, keyword):
+        form = normalize_keyword(keyword, self.lemmatize)
+        if not form or form in self.stop_words:
+            return (), "stopped"
+        if self.taxonomy is None:
+            return (form,), "kept"
+        preferred = self.taxonomy.lookup(form)
+        if preferred is not None:
+            return (preferred,), "mapped"
+        found = self.taxonomy.find(form)
+        if found:
+            return tuple(found), "mapped"
+        if self.keep_unmapped:
+            return (form,), "unmapped"
+        return (), "unmapped"
+
+    def process_many(self, keyword_lists):
+        """Clean many keyword lists (lists or comma-separated strings) at once; returns the new lists in order"""
+        lists = [split_keywords(keywords) if isinstance(keywords, str) else [str(keyword) for keyword in keywords]
+                 for keywords in keyword_lists]
+        with self._lock:
+            terms, outcomes = self._terms, self._outcomes
+            if len(terms) > MEMO_LIMIT:
+                terms.clear()
+                outcomes.clear()
+            # Each distinct raw keyword of the whole set is resolved once; the lists are then rebuilt by lookup
+            for keyword in set(chain.from_iterable(lists)).difference(terms):
+                terms[keyword], outcomes[keyword] = self._resolve(keyword)
+            results = [list(dict.fromkeys(chain.from_iterable(map(terms.__getitem__, keywords))))
+                       for keywords in lists]
+            if self.max_keywords is not None:
+                results = [result[:self.max_keywords] for result in results]
+            self.outcomes.update(map(outcomes.__getitem__, chain.from_iterable(lists)))
+            self.frequencies.update(chain.from_iterable(results))
+            self.assets += len(lists)
+            self.keywords_in += sum(map(len, lists))
+            self.keywords_out += sum(map(len, results))
+        return results
+
+    def process(self, keywords):
+        """Clean one keyword list"""
+        return self.process_many([keywords])[0]
+
+    def apply(self, metadata):
+        """A copy of a metadata dict with its keywords cleaned"""
+        if not isinstance(metadata, dict) or "keywords" not in metadata:
+            return metadata
+        return dict(metadata, keywords=self.process(metadata["keywords"] or []))
+
+    def process_records(self, records):
+        """Clean the keywords of every result record (as written by -o) in one batch; failed records pass through"""
+        records = list(records)
+        positions = [index for index, record in enumerate(records)
+                     if not record.get("error") and record.get("keywords") is not None]
+        cleaned = self.process_many(records[index]["keywords"] for index in positions)
+        for index, keywords in zip(positions, cleaned):
+            records[index] = dict(records[index], keywords=keywords)
+        return records
+
+    def most_common(self, count=None):
+        with self._lock:
+            return self.frequencies.most_common(count)
+
+    def stats(self):
+        with self._lock:
+            return {"assets": self.assets, "keywords_in": self.keywords_in, "keywords_out": self.keywords_out,
+                    "distinct_out": len(self.frequencies), "mapped": self.outcomes["mapped"],
+                    "unmapped": self.outcomes["unmapped"], "stopped": self.outcomes["stopped"]}
+
+    def write_frequencies(self, path):
+        """CSV of every result keyword with the number and share of assets it appears in, most frequent first"""
+        with self._lock:
+            rows = self.frequencies.most_common()
+            assets = self.assets
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["keyword", "assets", "share"])
+            for keyword, count in rows:
+                writer.writerow([keyword, count, f"{count / assets:.4f}" if assets else "0"])
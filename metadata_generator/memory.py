@@ -0,0 +1,81 @@
+"""A global budget for the bytes held by requests in flight.
+
+Every file reserves an estimate of the memory it will hold (decoded pixels,
+the encoded request body) before it is read, and gives it back once its
+request has finished. When the budget is used up, workers wait, so the number
+of concurrent files drops automatically while large videos are in flight and
+rises again for small images.
+"""
+import time
+import threading
+
+ASYNC_POLL_INTERVAL = 0.05
+
+
+def base64_length(size):
+    """Length of the base64 encoding of ``size`` bytes"""
+    return (size + 2) // 3 * 4
+
+
+class MemoryBudget:
+    """Counting semaphore over bytes, shared by worker threads and event loops.
+
+    A reservation larger than the whole budget is granted once nothing else
+    is reserved, so an oversized file still runs, just on its own.
+    """
+
+    def __init__(self, max_bytes):
+        if max_bytes <= 0:
+            raise ValueError("The memory budget must be positive")
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._condition = threading.Condition()
+
+    def _fits(self, nbytes):
+        return self.in_use == 0 or self.in_use + nbytes <= self.max_bytes
+
+    def _take(self, nbytes):
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+
+    def acquire(self, nbytes):
+        """Block until ``nbytes`` fit into the budget and reserve them"""
+        with self._condition:
+            if self._fits(nbytes):
+                self._take(nbytes)
+                return
+            started = time.perf_counter()
+            self.waits += 1
+            while not self._fits(nbytes):
+                self._condition.wait()
+            self._take(nbytes)
+            self.wait_seconds += time.perf_counter() - started
+
+    async def acquire_async(self, nbytes):
+        import asyncio
+
+        started = None
+        while True:
+            with self._condition:
+                if self._fits(nbytes):
+                    self._take(nbytes)
+                    if started is not None:
+                        self.wait_seconds += time.perf_counter() - started
+                    return
+                if started is None:
+                    started = time.perf_counter()
+                    self.waits += 1
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+    def release(self, nbytes):
+        with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {"max_bytes": self.max_bytes, "in_use": self.in_use, "peak": self.peak,
+                    "waits": self.waits, "wait_seconds": self.wait_seconds}
@@ -0,0 +1,199 @@
+"""Per-stage timings, byte and token counters, and their Prometheus text rendering.
+
+Every stage of a request (cache lookup, waiting for the memory budget, file
+read, preprocessing, encoding, upload, the generateContent round trip,
+parsing) is timed into a histogram on the module-level ``metrics`` registry.
+Finished files are additionally logged as one JSON object each on the
+``metadata_generator.trace`` logger.
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from .parsing import parse_stats
+
+trace_logger = logging.getLogger("metadata_generator.trace")
+
+STAGES = ("cache", "memory", "read", "preprocess", "encode", "upload", "request", "parse")
+COUNTERS = ("files", "errors", "cache_hits", "duplicates", "bytes_read", "bytes_sent", "bytes_uploaded",
+            "prompt_tokens", "output_tokens", "total_tokens", "cached_tokens")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Percentiles are computed over the most recent samples of each stage
+SAMPLE_WINDOW = 10000
+USAGE_FIELDS = {"promptTokenCount": "prompt_tokens", "candidatesTokenCount": "output_tokens",
+                "totalTokenCount": "total_tokens", "cachedContentTokenCount": "cached_tokens"}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Metrics:
+    """Thread-safe registry of stage histograms and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self._counters = dict.fromkeys(COUNTERS, 0)
+            self._buckets = {stage: [0] * (len(BUCKETS) + 1) for stage in STAGES}
+            self._sums = dict.fromkeys(STAGES, 0.0)
+            self._samples = {stage: deque(maxlen=SAMPLE_WINDOW) for stage in STAGES}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._buckets[stage][bisect.bisect_left(BUCKETS, seconds)] += 1
+            self._sums[stage] += seconds
+            self._samples[stage].append(seconds)
+
+    def record(self, stage, seconds, timings=None):
+        """Observe ``seconds`` of ``stage``, also adding them to the per-file ``timings`` dict"""
+        self.observe(stage, seconds)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def time(self, stage, timings=None):
+        """Time the enclosed block as ``stage``, also adding it to the per-file ``timings`` dict"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started, timings)
+
+    def add(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def record_usage(self, response_data):
+        """Count the ``usageMetadata`` token totals of a response and return them"""
+        usage = {}
+        try:
+            reported = response_data.get("usageMetadata") or {}
+        except AttributeError:
+            return usage
+        for field, counter in USAGE_FIELDS.items():
+            if isinstance(reported.get(field), int):
+                usage[counter] = reported[field]
+        with self._lock:
+            for counter, value in usage.items():
+                self._counters[counter] += value
+        return usage
+
+    def file_done(self, file_path, timings=None, usage=None, error=None, cached=False, duplicate_of=None):
+        """Count a finished file and emit its trace record"""
+        with self._lock:
+            self._counters["errors" if error is not None else "files"] += 1
+            if cached:
+                self._counters["cache_hits"] += 1
+            if duplicate_of is not None:
+                self._counters["duplicates"] += 1
+        if trace_logger.isEnabledFor(logging.INFO):
+            status = ("error" if error is not None else "duplicate" if duplicate_of is not None
+                      else "cached" if cached else "ok")
+            record = {"file": file_path, "status": status,
+                      "ms": {stage: round(seconds * 1000, 2) for stage, seconds in (timings or {}).items()}}
+            if usage:
+                record["tokens"] = usage
+            if error is not None:
+                record["error"] = error
+            if duplicate_of is not None:
+                record["duplicate_of"] = duplicate_of
+            trace_logger.info(json.dumps(record))
+
+    def snapshot(self):
+        """Counters plus per-stage count/total/p50/p95/max, and overall files per second"""
+        with self._lock:
+            counters = dict(self._counters)
+            elapsed = time.monotonic() - self.started
+            stages = {}
+            for stage in STAGES:
+                samples = sorted(self._samples[stage])
+                count = sum(self._buckets[stage])
+                if not count:
+                    continue
+                stages[stage] = {"count": count, "total": self._sums[stage], "p50": percentile(samples, 0.5),
+                                 "p95": percentile(samples, 0.95), "max": samples[-1]}
+        # The files counter holds successes only
+        done = counters["files"] + counters["errors"]
+        return {"elapsed": elapsed, "processed": done, "files_per_second": done / elapsed if elapsed > 0 else 0.0,
+                "counters": counters, "stages": stages}
+
+    def render_prometheus(self):
+        """Render everything in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            buckets = {stage: list(counts) for stage, counts in self._buckets.items()}
+            sums = dict(self._sums)
+        lines = []
+        for counter in COUNTERS:
+            name = f"metadata_generator_{counter}_total"
+            lines += [f"# TYPE {name} counter", f"{name} {counters[counter]}"]
+        lines.append("# TYPE metadata_generator_parse_total counter")
+        for path, count in parse_stats.snapshot().items():
+            lines.append(f'metadata_generator_parse_total{{path="{path}"}} {count}')
+        lines.append("# TYPE metadata_generator_stage_seconds histogram")
+        for stage in STAGES:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), buckets[stage]):
+                cumulative += count
+                lines.append(f'metadata_generator_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'metadata_generator_stage_seconds_sum{{stage="{stage}"}} {sums[stage]:.6f}')
+            lines.append(f'metadata_generator_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write the text format to ``path`` (e.g. for node_exporter's textfile collector)"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+
+metrics = Metrics()
+
+
+def summary_lines(snapshot):
+    """Human-readable summary of a snapshot, one line per topic"""
+    counters = snapshot["counters"]
+    lines = [f"{snapshot['processed']} files ({counters['files']} succeeded, {counters['cache_hits']} cached, "
+             f"{counters['duplicates']} duplicates, {counters['errors']} failed) in "
+             f"{snapshot['elapsed']:.1f}s, {snapshot['files_per_second']:.2f} files/s; "
+             f"{counters['bytes_sent'] + counters['bytes_uploaded']} bytes sent, "
+             f"{counters['total_tokens'] or counters['prompt_tokens'] + counters['output_tokens']} tokens"
+             + (f" ({counters['cached_tokens']} from cached contexts)" if counters['cached_tokens'] else "")]
+    for stage, stats in snapshot["stages"].items():
+        lines.append(f"{stage:<10} n={stats['count']:<6} p50={stats['p50'] * 1000:8.1f} ms  "
+                     f"p95={stats['p95'] * 1000:8.1f} ms  max={stats['max'] * 1000:8.1f} ms")
+    return lines
+
+
+def serve_prometheus(port, host="127.0.0.1", registry=metrics):
+    """Serve ``/metrics`` on a daemon thread; returns the server (call ``shutdown`` to stop)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
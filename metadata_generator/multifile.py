@@ -0,0 +1,188 @@
+"""Pack several small images into one generateContent call and split the answer back per file.
+
+Per-request overhead (round trip, prompt tokens) dominates for thumbnails, so
+K images share one request and one prompt. Any item the model's answer does
+not cover cleanly is retried on its own with a regular single-file request.
+"""
+import logging
+
+from .core import GENERATION_CONFIG, GeminiError, structured_generation_config
+from .metrics import metrics
+from .parsing import BATCH_METADATA_SCHEMA, normalize_metadata, parse_json_text, parse_stats
+from .prompts import DEFAULT_PROMPTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 8
+# Inline requests are capped at 20 MB in total; leave room for the prompt and JSON overhead
+DEFAULT_BATCH_BYTES = 16 * 1024 * 1024
+
+BATCH_PROMPT = DEFAULT_PROMPTS["batch"]
+
+
+def build_batch_payload(parts, generation_config=None, prompt=None):
+    """Build one request from a list of inline_data parts, labelling each with its index.
+
+    ``prompt`` is a format string taking ``count`` and ``last``, like BATCH_PROMPT.
+    """
+    contents = [{"text": (prompt or BATCH_PROMPT).format(count=len(parts), last=len(parts) - 1)}]
+    for index, part in enumerate(parts):
+        contents.append({"text": f"Image {index}:"})
+        contents.append(part)
+    return {
+        "contents": [{"parts": contents}],
+        "generation_config": generation_config or GENERATION_CONFIG
+    }
+
+
+def parse_batch_response(response_data, count):
+    """Return a list of ``count`` metadata dicts (None where the answer was unusable)"""
+    results = [None] * count
+    try:
+        text_content = response_data['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+        parse_stats.record("failed")
+        return results
+
+    items, path = parse_json_text(text_content)
+    if not isinstance(items, list):
+        parse_stats.record("failed")
+        return results
+    parse_stats.record(path)
+
+    keyed = all(isinstance(item, dict) and isinstance(item.get('index'), int) for item in items)
+    for position, item in enumerate(items):
+        metadata = normalize_metadata(item)
+        if metadata is None:
+            continue
+        index = metadata.pop('index', None)
+        if not keyed:
+            index = position
+        if 0 <= index < count and results[index] is None:
+            results[index] = metadata
+    return results
+
+
+def _inline_size(part):
+    return len(part["inline_data"]["data"])
+
+
+def pack_batches(items, max_items=DEFAULT_BATCH_SIZE, max_bytes=DEFAULT_BATCH_BYTES):
+    """Greedily group ``(key, part)`` items so each group stays within both limits"""
+    batches = []
+    current = []
+    current_bytes = 0
+    for key, part in items:
+        size = _inline_size(part)
+        if current and (len(current) >= max_items or current_bytes + size > max_bytes):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append((key, part))
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _batchable_part(request):
+    """The single inline_data part of a prepared single-image request, or None"""
+    # Videos, even small inline ones, need the video prompt and schema
+    if request.file_type != "image" or request.uploaded is not None:
+        return None
+    parts = request.payload["contents"][0]["parts"]
+    if len(parts) != 2 or "inline_data" not in parts[1]:
+        return None
+    return parts[1]
+
+
+def generate_batch(client, file_paths, max_items=DEFAULT_BATCH_SIZE, max_bytes=DEFAULT_BATCH_BYTES):
+    """Generate metadata for several files with as few requests as possible.
+
+    Returns one entry per path, in order: a metadata dict or the exception
+    that made that file fail. Cache hits, videos and uploaded files are
+    handled individually; images are packed into shared requests. With a
+    memory budget, the whole group is reserved at once so a worker never
+    waits on its own reservations.
+    """
+    budget = client.memory_budget
+    if budget is None:
+        return _generate_batch(client, file_paths, max_items, max_bytes)
+
+    reserved = 0
+    for file_path in file_paths:
+        try:
+            reserved += client.memory_cost(file_path)
+        except Exception:
+            pass  # prepare_request reports the problem
+    with metrics.time("memory"):
+        budget.acquire(reserved)
+    try:
+        return _generate_batch(client, file_paths, max_items, max_bytes)
+    finally:
+        budget.release(reserved)
+
+
+def _generate_batch(client, file_paths, max_items, max_bytes):
+    results = [None] * len(file_paths)
+    requests_by_index = {}
+    batchable = []
+
+    for index, file_path in enumerate(file_paths):
+        try:
+            request = client.prepare_request(file_path, reserve=False)
+        except Exception as e:
+            metrics.file_done(file_path, error=str(e))
+            results[index] = e
+            continue
+        if request.cached is not None:
+            metrics.file_done(file_path, request.timings, cached=True)
+            results[index] = request.cached
+            continue
+        requests_by_index[index] = request
+        part = _batchable_part(request)
+        if part is not None and max_items > 1:
+            batchable.append((index, part))
+
+    generation_config = structured_generation_config(BATCH_METADATA_SCHEMA) if client.structured_output else None
+    batched = {index for index, _ in batchable}
+    singles = [index for index in requests_by_index if index not in batched]
+    for batch in pack_batches(batchable, max_items, max_bytes):
+        if len(batch) == 1:
+            singles.append(batch[0][0])
+            continue
+        timings = {}
+        try:
+            payload = build_batch_payload([part for _, part in batch], generation_config,
+                                          prompt=client.prompt_template.prompt("batch"))
+            response_data = client.generate_content(payload, timings)
+            with metrics.time("parse", timings):
+                parsed = parse_batch_response(response_data, len(batch))
+            metrics.record_usage(response_data)
+        except GeminiError as e:
+            logger.warning("Batch of %d failed, retrying individually: %s", len(batch), e)
+            parsed = [None] * len(batch)
+        for (index, _), metadata in zip(batch, parsed):
+            if metadata is None:
+                singles.append(index)
+                continue
+            request = requests_by_index[index]
+            if request.cache_key is not None:
+                client.cache.put(request.cache_key, metadata)
+            # The shared request and parse time is attributed to every file in the batch
+            metrics.file_done(request.file_path, dict(request.timings, **timings))
+            results[index] = metadata
+        fallbacks = sum(metadata is None for metadata in parsed)
+        if fallbacks:
+            logger.info("Batch of %d: %d items fell back to single requests", len(batch), fallbacks)
+
+    for index in sorted(singles):
+        request = requests_by_index[index]
+        try:
+            results[index] = client.complete_request(request)
+        except Exception as e:
+            metrics.file_done(request.file_path, request.timings, error=str(e))
+            results[index] = e
+        finally:
+            client.release_request(request)
+    return results
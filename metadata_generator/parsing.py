@@ -0,0 +1,182 @@
+"""Turn the model's text answer into validated metadata.
+
+With structured output the answer is plain JSON and a single ``json.loads``
+does the job. Older or free-form answers fall back to fenced-JSON and then a
+single-pass header scan; every path is counted in ``parse_stats`` so the
+fallback rate can be monitored.
+"""
+import re
+import json
+import threading
+
+METADATA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "keywords": {"type": "ARRAY", "items": {"type": "STRING"}}
+    },
+    "required": ["title", "description", "keywords"]
+}
+
+BATCH_METADATA_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": dict(METADATA_SCHEMA["properties"], index={"type": "INTEGER"}),
+        "required": ["index"] + METADATA_SCHEMA["required"]
+    }
+}
+
+FENCED_JSON_RE = re.compile(r'```(?:json)?[ \t]*\n?(.*?)```', re.DOTALL | re.IGNORECASE)
+# "Title: ...", "**Keywords:** ...", "- Description - ..." at the start of a line
+SECTION_RE = re.compile(r'^[ \t>*#-]*\**[ \t]*(title|description|keywords)[ \t]*\**[ \t]*[:\-][ \t]*\**[ \t]*',
+                        re.IGNORECASE | re.MULTILINE)
+JSON_STRING_FIELD_RE = re.compile(r'"(title|description)"\s*:\s*"((?:[^"\\]|\\.)*)"', re.IGNORECASE)
+JSON_KEYWORDS_RE = re.compile(r'"keywords"\s*:\s*\[([^\]]*)\]', re.IGNORECASE)
+QUOTED_RE = re.compile(r'"((?:[^"\\]|\\.)+)"')
+KEYWORD_SEPARATOR_RE = re.compile(r'[,;\n]+')
+KEYWORD_STRIP = ' \t\r"\'*-•'
+
+
+class ParseStats:
+    """Thread-safe counters of which parsing path each answer took"""
+
+    PATHS = ("json", "fenced", "manual", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, path):
+        with self._lock:
+            self._counts[path] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.PATHS, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def fallbacks(self):
+        """Answers that were not clean JSON"""
+        counts = self.snapshot()
+        return counts["fenced"] + counts["manual"] + counts["failed"]
+
+
+parse_stats = ParseStats()
+
+
+def parse_json_text(text_content):
+    """Decode a JSON answer, bare or inside a markdown fence; returns (value, path) or (None, None)"""
+    try:
+        return json.loads(text_content), "json"
+    except ValueError:
+        pass
+
+    match = FENCED_JSON_RE.search(text_content)
+    if match:
+        try:
+            return json.loads(match.group(1)), "fenced"
+        except ValueError:
+            pass
+    return None, None
+
+
+def _clean_keyword(text):
+    """Strip quotes, bullets and spaces, and the sentence period of a phrase ("golden retriever.").
+
+    Periods that belong to the last word stay: "U.S.", "Washington D.C.", "Main St.".
+    """
+    text = text.strip(KEYWORD_STRIP)
+    head, _, last = text.rpartition(' ')
+    if head and len(last) > 3 and last.endswith('.') and '.' not in last[:-1]:
+        text = text[:-1].rstrip(KEYWORD_STRIP)
+    return text
+
+
+def split_keywords(text):
+    """Split a keyword list on commas, semicolons or line breaks (never on plain spaces)"""
+    keywords = []
+    for keyword in KEYWORD_SEPARATOR_RE.split(text):
+        keyword = _clean_keyword(keyword)
+        if keyword:
+            keywords.append(keyword)
+    return keywords
+
+
+def normalize_metadata(value):
+    """Validate a decoded answer and coerce it to title/description strings and a keyword list.
+
+    Returns None when there is nothing usable. Extra keys are kept.
+    """
+    if not isinstance(value, dict):
+        return None
+    metadata = dict(value)
+    metadata['title'] = str(value.get('title') or '').strip()
+    metadata['description'] = str(value.get('description') or '').strip()
+    keywords = value.get('keywords') or []
+    if isinstance(keywords, str):
+        keywords = split_keywords(keywords)
+    elif isinstance(keywords, list):
+        keywords = [_clean_keyword(str(keyword)) for keyword in keywords]
+    else:
+        keywords = []
+    # Drop empty entries and repeats that differ only in case, keeping the first spelling
+    unique = {}
+    for keyword in keywords:
+        if keyword:
+            unique.setdefault(keyword.casefold(), keyword)
+    metadata['keywords'] = list(unique.values())
+    if not metadata['title'] and not metadata['keywords']:
+        return None
+    return metadata
+
+
+def extract_metadata_manually(text):
+    """Extract metadata from a free-form answer in one pass over its section headers"""
+    metadata = {
+        'title': '',
+        'description': '',
+        'keywords': []
+    }
+
+    headers = list(SECTION_RE.finditer(text))
+    if headers:
+        for position, header in enumerate(headers):
+            end = headers[position + 1].start() if position + 1 < len(headers) else len(text)
+            field = header.group(1).lower()
+            body = text[header.end():end].strip()
+            if not body or metadata[field]:
+                continue
+            if field == 'title':
+                metadata['title'] = _clean_keyword(body.splitlines()[0])
+            elif field == 'description':
+                metadata['description'] = body.split('\n\n', 1)[0].strip()
+            else:
+                metadata['keywords'] = split_keywords(body.split('\n\n', 1)[0])
+        return metadata
+
+    # No headers: probably broken JSON, so pick out the fields that are intact
+    for match in JSON_STRING_FIELD_RE.finditer(text):
+        field = match.group(1).lower()
+        if not metadata[field]:
+            metadata[field] = match.group(2).replace('\\"', '"').strip()
+    keywords_match = JSON_KEYWORDS_RE.search(text)
+    if keywords_match:
+        metadata['keywords'] = [keyword.strip() for keyword in QUOTED_RE.findall(keywords_match.group(1))
+                                if keyword.strip()]
+    return metadata
+
+
+def parse_metadata_text(text_content):
+    """Parse the model's text answer into a validated metadata dict, or None if nothing usable was found"""
+    value, path = parse_json_text(text_content)
+    metadata = normalize_metadata(value) if value is not None else None
+    if metadata is None:
+        metadata = normalize_metadata(extract_metadata_manually(text_content))
+        path = "manual" if metadata is not None else "failed"
+    parse_stats.record(path)
+    return metadata
@@ -0,0 +1,139 @@
+"""Client-side image preprocessing: real format detection, EXIF orientation, downscale and re-encode.
+
+Pillow is imported lazily so the rest of the package keeps working without it.
+"""
+import io
+import os
+import logging
+import threading
+from collections import namedtuple
+
+from .memory import base64_length
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EDGE = 1568
+DEFAULT_QUALITY = 85
+OUTPUT_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+# Formats Gemini accepts as-is, so an already small file can be sent untouched
+PASSTHROUGH_MIME_TYPES = ("image/jpeg", "image/png", "image/webp", "image/heic", "image/heif")
+
+PreparedImage = namedtuple("PreparedImage", "data mime_type original_bytes width height")
+
+
+class ImagePreprocessor:
+    """Shrink images to ``max_edge`` pixels and re-encode them before upload.
+
+    Instances are shared between worker threads; ``original_bytes`` and
+    ``sent_bytes`` accumulate totals over every prepared file.
+    """
+
+    def __init__(self, max_edge=DEFAULT_MAX_EDGE, output_format="jpeg", quality=DEFAULT_QUALITY):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.max_edge = max_edge
+        self.output_format = output_format
+        self.quality = quality
+        self.files = 0
+        self.original_bytes = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def signature(self):
+        """Identify the settings so cached results are not shared across different encodings"""
+        return f"{self.output_format}:{self.max_edge}:{self.quality}"
+
+    def __call__(self, file_path):
+        return self.prepare(file_path)
+
+    def memory_estimate(self, file_path):
+        """Upper bound on the bytes held while preparing and sending ``file_path``.
+
+        Reads only the image header: the decoded pixels (at the reduced scale
+        JPEG ``draft`` decodes to) plus the encoded body, which is never
+        larger than that of the original file.
+        """
+        from PIL import Image
+
+        original_bytes = os.path.getsize(file_path)
+        try:
+            with Image.open(file_path) as image:
+                width, height = image.size
+                scale = 1
+                if image.format == "JPEG":
+                    while scale < 8 and max(width, height) // (scale * 2) >= self.max_edge:
+                        scale *= 2
+        except Exception:
+            return base64_length(original_bytes)
+        return (width // scale) * (height // scale) * 4 + base64_length(original_bytes)
+
+    def prepare(self, file_path):
+        """Return a PreparedImage with the bytes to upload and their real MIME type"""
+        from PIL import Image, ImageOps
+
+        original_bytes = os.path.getsize(file_path)
+        with Image.open(file_path) as image:
+            source_mime = Image.MIME.get(image.format)
+            width, height = image.size
+            orientation = image.getexif().get(0x0112, 1)
+
+            if (source_mime in PASSTHROUGH_MIME_TYPES and orientation == 1
+                    and max(width, height) <= self.max_edge):
+                # Nothing to gain from re-encoding; send the original bytes with their real type
+                with open(file_path, 'rb') as file:
+                    prepared = PreparedImage(file.read(), source_mime, original_bytes, width, height)
+                return self._record(file_path, prepared)
+
+            # Let the JPEG decoder skip straight to a reduced scale when it can
+            image.draft("RGB", (self.max_edge, self.max_edge))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+
+            pil_format, mime_type = OUTPUT_FORMATS[self.output_format]
+            if pil_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+                image = _flatten(image)
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=pil_format, quality=self.quality)
+            prepared = PreparedImage(buffer.getvalue(), mime_type, original_bytes, *image.size)
+
+        return self._record(file_path, prepared)
+
+    def _record(self, file_path, prepared):
+        with self._lock:
+            self.files += 1
+            self.original_bytes += prepared.original_bytes
+            self.sent_bytes += len(prepared.data)
+        logger.info("%s: %d -> %d bytes (%d saved, %dx%d %s)", file_path, prepared.original_bytes,
+                    len(prepared.data), prepared.original_bytes - len(prepared.data),
+                    prepared.width, prepared.height, prepared.mime_type)
+        return prepared
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": self.files,
+                "original_bytes": self.original_bytes,
+                "sent_bytes": self.sent_bytes,
+                "saved_bytes": self.original_bytes - self.sent_bytes
+            }
+
+
+def _flatten(image):
+    """Convert any mode to RGB, compositing transparency onto white"""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
@@ -0,0 +1,306 @@
+"""Prompt templates, and context caching for their shared system instructions.
+
+A template is a JSON file, so each customer can have their own::
+
+    {
+        "name": "acme-stock",
+        "version": 3,
+        "variables": {"keyword_count": 49, "language": "German", "site": "Adobe Stock"},
+        "system": "You write metadata for {site} in {language}. ... (the site's full rules)",
+        "prompts": {"image": "Describe this image with exactly {keyword_count} keywords."}
+    }
+
+``{name}`` placeholders are filled from ``variables`` once, when the file is
+loaded (literal braces are doubled, as in ``str.format``); prompt kinds left
+out fall back to the built-in prompts. The batch prompt also gets ``{count}``
+and ``{last}``, the number of images in the request and the last index. The
+template's name, version and texts are part of every result-cache key, so
+changing a template never serves answers written for the old one.
+
+A long ``system`` instruction is sent once per model through the API's
+context caching (``cachedContents``) and referenced from every request
+afterwards, instead of being billed and processed again each time.
+Instructions too short for the API's minimum are sent inline.
+"""
+import os
+import json
+import time
+import string
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROMPT_KINDS = ("image", "video", "video_frames", "batch")
+# Filled per request rather than from the template's variables
+BATCH_FIELDS = ("count", "last")
+TEMPLATE_KEYS = {"name", "version", "description", "variables", "system", "prompts"}
+
+DEFAULT_PROMPTS = {
+    "image": "Generate comprehensive metadata for this image including a descriptive title, detailed description, and relevant keywords. Format the response as JSON with fields 'title', 'description', and 'keywords' (as an array).",
+    "video": "Generate comprehensive metadata for this video including a descriptive title, detailed description, and relevant keywords. Format the response as JSON with fields 'title', 'description', and 'keywords' (as an array).",
+    "video_frames": "The following images are frames sampled in order from a single video. Generate comprehensive metadata for the video including a descriptive title, detailed description, and relevant keywords. Format the response as JSON with fields 'title', 'description', and 'keywords' (as an array).",
+    "batch": ("The following {count} images are numbered 0 to {last}. Generate comprehensive metadata "
+              "for each image including a descriptive title, detailed description, and relevant keywords. "
+              "Format the response as a JSON array with exactly one object per image, each with fields "
+              "'index' (the image number), 'title', 'description', and 'keywords' (as an array)."),
+}
+
+DEFAULT_CONTEXT_TTL = 3600
+# The API refuses to cache fewer tokens than this (more for some models)
+MIN_CONTEXT_TOKENS = 1024
+# Rough size of a token, for deciding whether an instruction is worth caching
+CHARS_PER_TOKEN = 4
+# A cached context is replaced this long before it would expire
+CONTEXT_RENEW_MARGIN = 60
+# After the API refuses to create a cached context, instructions go inline for this long
+CONTEXT_RETRY_INTERVAL = 600
+# generateContent answers these when a referenced cached context has expired or been deleted
+STALE_CONTEXT_STATUSES = (403, 404)
+
+
+class TemplateError(ValueError):
+    """A template file that cannot be used; the message says what is wrong with it"""
+
+
+def _escape(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _render(text, variables, where, runtime=()):
+    """Fill ``{name}`` placeholders from ``variables``.
+
+    ``runtime`` placeholders are kept, and the result is then itself a format
+    string (literal braces stay doubled) to be filled per request.
+    """
+    formatter = string.Formatter()
+    try:
+        pieces = list(formatter.parse(text))
+    except ValueError as e:
+        raise TemplateError(f"{where}: {e}")
+    unknown = sorted({field for _, field, _, _ in pieces
+                      if field is not None and field not in variables and field not in runtime})
+    if unknown:
+        raise TemplateError(f"{where}: unknown variable(s) {', '.join(unknown) or '{}'}")
+    rendered = []
+    for literal, field, spec, conversion in pieces:
+        rendered.append(_escape(literal) if runtime else literal)
+        if field is None:
+            continue
+        if field in runtime:
+            rendered.append(f"{{{field}}}")
+            continue
+        try:
+            value = format(formatter.convert_field(variables[field], conversion), spec)
+        except ValueError as e:
+            raise TemplateError(f"{where}: {field}: {e}")
+        rendered.append(_escape(value) if runtime else value)
+    return "".join(rendered)
+
+
+class PromptTemplate:
+    """Prompts for every request kind, plus an optional shared system instruction, with variables filled in.
+
+    ``builtin`` marks the default template, whose cache keys predate templates.
+    """
+
+    def __init__(self, name, version, prompts=None, system=None, variables=None, description=None, builtin=False):
+        if not isinstance(name, str) or not name.strip():
+            raise TemplateError("'name' must be a non-empty string")
+        if not isinstance(version, int) or isinstance(version, bool) or version < 1:
+            raise TemplateError(f"{name}: 'version' must be a positive integer")
+        variables = variables or {}
+        if not isinstance(variables, dict):
+            raise TemplateError(f"{name}: 'variables' must be an object")
+        for key, value in variables.items():
+            if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+                raise TemplateError(f"{name}: variable {key} must be a string or a number")
+        prompts = prompts or {}
+        if not isinstance(prompts, dict):
+            raise TemplateError(f"{name}: 'prompts' must be an object")
+        unknown = sorted(set(prompts) - set(PROMPT_KINDS))
+        if unknown:
+            raise TemplateError(f"{name}: unknown prompt kind(s) {', '.join(unknown)}; "
+                                f"expected {', '.join(PROMPT_KINDS)}")
+        if system is not None and (not isinstance(system, str) or not system.strip()):
+            raise TemplateError(f"{name}: 'system' must be a non-empty string")
+
+        self.name = name
+        self.version = version
+        self.description = description
+        self.variables = dict(variables)
+        self.prompts = {}
+        for kind in PROMPT_KINDS:
+            text = prompts.get(kind)
+            if text is None:
+                self.prompts[kind] = DEFAULT_PROMPTS[kind]
+                continue
+            if not isinstance(text, str) or not text.strip():
+                raise TemplateError(f"{name}: prompt {kind} must be a non-empty string")
+            runtime = BATCH_FIELDS if kind == "batch" else ()
+            self.prompts[kind] = _render(text, variables, f"{name}: prompt {kind}", runtime)
+        self.system = _render(system, variables, f"{name}: system") if system is not None else None
+        self.builtin = builtin
+        material = json.dumps([self.system, self.prompts], sort_keys=True)
+        self.digest = hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def signature(self):
+        return f"{self.name}@{self.version}"
+
+    def prompt(self, kind):
+        return self.prompts[kind]
+
+    def cache_material(self, kind):
+        """What the result-cache key records about the prompt for ``kind``"""
+        if self.builtin:
+            return self.prompts[kind]  # Keys from before templates existed stay valid
+        return [self.signature, self.digest, self.prompts[kind]]
+
+    @classmethod
+    def from_dict(cls, data, source="template"):
+        if not isinstance(data, dict):
+            raise TemplateError(f"{source}: a template must be a JSON object")
+        unknown = sorted(set(data) - TEMPLATE_KEYS)
+        if unknown:
+            raise TemplateError(f"{source}: unknown key(s) {', '.join(unknown)}")
+        for key in ("name", "version"):
+            if key not in data:
+                raise TemplateError(f"{source}: '{key}' is required")
+        return cls(data["name"], data["version"], prompts=data.get("prompts"), system=data.get("system"),
+                   variables=data.get("variables"), description=data.get("description"))
+
+
+DEFAULT_TEMPLATE = PromptTemplate("builtin", 1, builtin=True)
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_template(path):
+    """Read and validate a template file; each version of a file is parsed only once"""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise TemplateError(f"{path}: {e.strerror}")
+    identity = (path, stat.st_size, stat.st_mtime_ns)
+    with _loaded_lock:
+        template = _loaded.get(identity)
+    if template is not None:
+        return template
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except OSError as e:
+        raise TemplateError(f"{path}: {e.strerror}")
+    except ValueError as e:
+        raise TemplateError(f"{path}: not valid JSON ({e})")
+    template = PromptTemplate.from_dict(data, source=path)
+    with _loaded_lock:
+        _loaded[identity] = template
+    return template
+
+
+class ContextCache:
+    """Server-side cached contexts holding templates' system instructions, one per model and template.
+
+    ``lookup`` returns the name of a context to reference from a request,
+    creating (or renewing) it on first use, or None when the instruction has
+    to be sent inline. One instance can be shared by every client; ``close``
+    deletes the contexts it created.
+    """
+
+    def __init__(self, ttl=DEFAULT_CONTEXT_TTL, min_tokens=MIN_CONTEXT_TOKENS):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.created = 0
+        self.failed = 0
+        self._contexts = {}  # (model, template digest) -> (name, renew_at, client)
+        self._refused = {}  # (model, template digest) -> retry_at
+        self._creating = {}  # (model, template digest) -> Event set once the create call has finished
+        self._lock = threading.Lock()
+
+    def worthwhile(self, template):
+        return template.system is not None and len(template.system) // CHARS_PER_TOKEN >= self.min_tokens
+
+    def lookup(self, client, model, template):
+        if not self.worthwhile(template):
+            return None
+        key = (model, template.digest)
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._contexts.get(key)
+                if entry is not None and now < entry[1]:
+                    return entry[0]
+                if now < self._refused.get(key, 0):
+                    return None
+                creating = self._creating.get(key)
+                if creating is None:
+                    creating = self._creating[key] = threading.Event()
+                    break
+            # Concurrent first requests share the context another thread is creating
+            creating.wait()
+
+        # The lock is not held across the HTTP call, so lookups for other templates go on meanwhile
+        name = None
+        try:
+            name = self._create(client, model, template)
+        finally:
+            with self._lock:
+                del self._creating[key]
+                if name is None:
+                    self.failed += 1
+                    self._refused[key] = now + CONTEXT_RETRY_INTERVAL
+                else:
+                    self.created += 1
+                    self._contexts[key] = (name, now + max(self.ttl - CONTEXT_RENEW_MARGIN, self.ttl / 2), client)
+            creating.set()
+        return name
+
+    def _create(self, client, model, template):
+        import requests
+
+        body = {
+            "model": f"models/{model}",
+            "displayName": template.signature,
+            "systemInstruction": {"parts": [{"text": template.system}]},
+            "ttl": f"{self.ttl}s",
+        }
+        try:
+            response = client.transport.post(f"{client.base_url}/cachedContents", json=body,
+                                             headers=client.auth_headers())
+            if response.status_code == 200:
+                return response.json()["name"]
+            logger.warning("Could not cache the %s instructions for %s (HTTP %d); sending them inline",
+                           template.signature, model, response.status_code)
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            logger.warning("Could not cache the %s instructions for %s (%s); sending them inline",
+                           template.signature, model, e)
+        return None
+
+    def discard(self, name):
+        """Forget a context the API no longer knows (it expired early or was deleted)"""
+        with self._lock:
+            for key, entry in list(self._contexts.items()):
+                if entry[0] == name:
+                    del self._contexts[key]
+
+    def close(self):
+        """Best-effort deletion of every context created here; unreachable ones expire with their TTL"""
+        import requests
+
+        with self._lock:
+            entries = list(self._contexts.values())
+            self._contexts.clear()
+        for name, _, client in entries:
+            try:
+                client.transport.delete(f"{client.base_url}/{name}", headers=client.auth_headers())
+            except requests.RequestException:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"created": self.created, "failed": self.failed, "live": len(self._contexts)}
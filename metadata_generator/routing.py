@@ -0,0 +1,237 @@
+"""Spread requests over several Gemini models by asset size, load, quota and health.
+
+Each ModelRoute has its own concurrency limit, optional requests-per-minute
+quota and token prices. Small assets go to the cheapest model that takes
+them, larger ones to the cheapest model without a size cap. A request that
+fails with 429/5xx, a network error or an unusable answer is retried on the
+next model. A model that answered 429 is skipped until its Retry-After delay
+has passed, so one exhausted quota does not stall the batch.
+"""
+import time
+import threading
+from collections import deque
+
+from .metrics import SAMPLE_WINDOW, USAGE_FIELDS, percentile
+from .transport import RateLimiter
+
+# USD per million input / output tokens (prompts up to 128k tokens)
+MODEL_PRICES = {
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+# Prompt tokens read from a cached context are billed at this fraction of the input price
+CACHED_INPUT_DISCOUNT = 0.25
+DEFAULT_ROUTE_CONCURRENCY = 16
+# Assets up to this size count as small enough for a size-capped (cheaper) model
+SMALL_ASSET_BYTES = 512 * 1024
+# Cooldown after a 429 without Retry-After; doubles on each consecutive 429
+DEFAULT_COOLDOWN = 2.0
+MAX_COOLDOWN = 300.0
+# Errors another model would fail the same way (bad request, bad key)
+PERMANENT_STATUSES = (400, 401, 403)
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class ModelRoute:
+    """One model the router may use, with its limits and running statistics.
+
+    ``max_bytes`` marks a model as preferred only for assets up to that size;
+    it still serves larger ones when every other model is busy or failing.
+    Prices default to the published ones in MODEL_PRICES.
+    """
+
+    def __init__(self, model, concurrency=DEFAULT_ROUTE_CONCURRENCY, requests_per_minute=None, burst=1,
+                 max_bytes=None, input_price=None, output_price=None):
+        default_input, default_output = MODEL_PRICES.get(model, (0.0, 0.0))
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute, burst) if requests_per_minute else None
+        self.max_bytes = max_bytes
+        self.input_price = default_input if input_price is None else input_price
+        self.output_price = default_output if output_price is None else output_price
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+        self.outcomes = dict.fromkeys(("ok", "rate_limited", "error", "unparsable"), 0)
+        self.tokens = dict.fromkeys(USAGE_FIELDS.values(), 0)
+        self.latencies = deque(maxlen=SAMPLE_WINDOW)
+
+    def cost(self):
+        # promptTokenCount includes the tokens served from a cached context
+        cached = self.tokens["cached_tokens"]
+        return ((self.tokens["prompt_tokens"] - cached + cached * CACHED_INPUT_DISCOUNT) * self.input_price
+                + self.tokens["output_tokens"] * self.output_price) / 1e6
+
+
+# --route option -> (ModelRoute argument, converter)
+ROUTE_OPTIONS = {
+    "concurrency": ("concurrency", int),
+    "rpm": ("requests_per_minute", float),
+    "burst": ("burst", int),
+    "max-kb": ("max_bytes", lambda value: int(float(value) * 1024)),
+    "input-price": ("input_price", float),
+    "output-price": ("output_price", float),
+}
+
+
+def parse_route(spec):
+    """Parse ``MODEL[:key=value,...]`` into a ModelRoute.
+
+    Keys: ``concurrency``, ``rpm``, ``burst``, ``max-kb``, ``input-price`` and
+    ``output-price`` (USD per million tokens), e.g.
+    ``gemini-1.5-flash-8b:max-kb=512,rpm=4000``.
+    """
+    model, _, options = spec.partition(":")
+    if not model:
+        raise ValueError(f"Missing model name in route {spec!r}")
+    kwargs = {}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in ROUTE_OPTIONS:
+            raise ValueError(f"Unknown route option {key!r} in {spec!r}")
+        name, convert = ROUTE_OPTIONS[key]
+        try:
+            kwargs[name] = convert(value)
+        except ValueError:
+            raise ValueError(f"Bad value for route option {key!r} in {spec!r}") from None
+    return ModelRoute(model, **kwargs)
+
+
+def default_routes():
+    """The cheapest model for small assets, with the standard Flash model for everything else"""
+    return [ModelRoute("gemini-1.5-flash-8b", max_bytes=SMALL_ASSET_BYTES), ModelRoute("gemini-1.5-flash")]
+
+
+class ModelRouter:
+    """Chooses a model per request and keeps per-model latency, outcome and cost figures.
+
+    Callers ``acquire`` a route, make the request, and ``release`` it with
+    the outcome. Safe to share between worker threads and event loops.
+    """
+
+    def __init__(self, routes):
+        if not routes:
+            raise ValueError("A router needs at least one model")
+        self.routes = list(routes)
+        self._condition = threading.Condition()
+
+    def signature(self):
+        """Identify the model set, e.g. for cache keys"""
+        return "+".join(route.model for route in self.routes)
+
+    def candidates(self, size):
+        """Routes in order of preference for an asset of ``size`` bytes"""
+        def preference(route):
+            oversized = route.max_bytes is not None and size > route.max_bytes
+            return oversized, route.input_price + route.output_price
+        return sorted(self.routes, key=preference)
+
+    def remaining(self, tried):
+        """How many models have not been tried yet"""
+        return sum(route.model not in tried for route in self.routes)
+
+    def _pick(self, size, tried):
+        # Returns (route, None) when one is free, (None, seconds) to wait, or (None, None) if none is left
+        now = time.monotonic()
+        waits = []
+        for route in self.candidates(size):
+            if route.model in tried:
+                continue
+            if route.cooldown_until > now:
+                waits.append(route.cooldown_until - now)
+                continue
+            if route.in_flight >= route.concurrency:
+                waits.append(ASYNC_POLL_INTERVAL)
+                continue
+            if route.rate_limiter is not None:
+                wait = route.rate_limiter.try_acquire()
+                if wait:
+                    waits.append(wait)
+                    continue
+            route.in_flight += 1
+            return route, None
+        return None, min(waits) if waits else None
+
+    def acquire(self, size, tried=()):
+        """Block until an untried model is free and return it, or None when every model was tried"""
+        with self._condition:
+            while True:
+                route, wait = self._pick(size, tried)
+                if route is not None or wait is None:
+                    return route
+                # Woken early by release() when a slot frees up
+                self._condition.wait(wait)
+
+    async def acquire_async(self, size, tried=()):
+        import asyncio
+
+        while True:
+            with self._condition:
+                route, wait = self._pick(size, tried)
+            if route is not None or wait is None:
+                return route
+            await asyncio.sleep(min(wait, ASYNC_POLL_INTERVAL))
+
+    def release(self, route, seconds, error=None):
+        """Return a route acquired earlier, recording the call's outcome"""
+        with self._condition:
+            route.in_flight -= 1
+            route.latencies.append(seconds)
+            status = getattr(error, "status", None)
+            if error is None:
+                route.outcomes["ok"] += 1
+                route.consecutive_429 = 0
+            elif status == 429:
+                route.outcomes["rate_limited"] += 1
+                route.consecutive_429 += 1
+                delay = getattr(error, "retry_after", None)
+                if delay is None:
+                    delay = DEFAULT_COOLDOWN * 2 ** (route.consecutive_429 - 1)
+                route.cooldown_until = time.monotonic() + min(MAX_COOLDOWN, delay)
+            elif status is None and getattr(error, "unparsable", False):
+                route.outcomes["unparsable"] += 1
+            else:
+                route.outcomes["error"] += 1
+            self._condition.notify_all()
+
+    def record_usage(self, route, response_data):
+        try:
+            reported = response_data.get("usageMetadata") or {}
+        except AttributeError:
+            return
+        with self._condition:
+            for field, counter in USAGE_FIELDS.items():
+                if isinstance(reported.get(field), int):
+                    route.tokens[counter] += reported[field]
+
+    @staticmethod
+    def fails_over(error):
+        """Whether another model might succeed where this error happened"""
+        return getattr(error, "status", None) not in PERMANENT_STATUSES
+
+    def snapshot(self):
+        """Per-model outcomes, latency p50/p95, tokens and estimated cost"""
+        with self._condition:
+            models = {}
+            for route in self.routes:
+                latencies = sorted(route.latencies)
+                models[route.model] = dict(route.outcomes, requests=sum(route.outcomes.values()),
+                                           p50=percentile(latencies, 0.5), p95=percentile(latencies, 0.95),
+                                           cost=route.cost(), **route.tokens)
+        return models
+
+
+def route_summary_lines(snapshot):
+    """One human-readable line per model that handled any request"""
+    lines = []
+    for model, stats in snapshot.items():
+        if not stats["requests"]:
+            continue
+        lines.append(f"{model}: {stats['ok']}/{stats['requests']} ok, {stats['rate_limited']} rate limited, "
+                     f"{stats['error']} errors, {stats['unparsable']} unparsable; "
+                     f"p50={stats['p50'] * 1000:.0f} ms p95={stats['p95'] * 1000:.0f} ms; "
+                     f"{stats['prompt_tokens'] + stats['output_tokens']} tokens, ${stats['cost']:.4f}")
+    return lines
@@ -0,0 +1,179 @@
+"""Small preview images for the GUI, decoded cheaply and cached in memory and on disk.
+
+Images are decoded with Pillow at reduced scale (JPEG ``draft`` mode) or
+taken from the embedded EXIF thumbnail when that is big enough, so even a
+100 MP file costs a fraction of a full decode. Videos get a poster frame from
+the middle of the clip. Thumbnails are JPEG bytes keyed by path, size and
+modification time; an edited file therefore gets a fresh thumbnail.
+"""
+import io
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .cache import default_cache_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THUMBNAIL_EDGE = 512
+DEFAULT_MEMORY_ENTRIES = 256
+THUMBNAIL_QUALITY = 85
+# EXIF IFD1 tags locating the embedded JPEG thumbnail
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+
+def default_thumbnail_dir():
+    return os.path.join(os.path.dirname(default_cache_path()), "thumbnails")
+
+
+def _embedded_thumbnail(image):
+    """Return the EXIF thumbnail of an open image as a PIL image, or None"""
+    from PIL import ExifTags, Image
+
+    exif_data = image.info.get("exif")
+    if not exif_data:
+        return None
+    try:
+        ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    except Exception:
+        return None
+    offset = ifd1.get(JPEG_INTERCHANGE_FORMAT)
+    length = ifd1.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+    if not offset or not length:
+        return None
+    # Offsets are relative to the TIFF header, which follows the "Exif\0\0" prefix in JPEG APP1
+    start = offset + (6 if exif_data.startswith(b"Exif\x00\x00") else 0)
+    data = exif_data[start:start + length]
+    if not data.startswith(b'\xff\xd8'):
+        return None
+    thumbnail = Image.open(io.BytesIO(data))
+    thumbnail.load()
+    return thumbnail
+
+
+def make_image_thumbnail(file_path, edge=DEFAULT_THUMBNAIL_EDGE):
+    """Decode ``file_path`` at roughly ``edge`` pixels and return JPEG bytes"""
+    from PIL import Image, ImageOps
+
+    from .preprocess import _flatten
+
+    with Image.open(file_path) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        thumbnail = None
+        if max(image.size) > edge * 2:
+            embedded = _embedded_thumbnail(image)
+            if embedded is not None and max(embedded.size) >= edge // 2:
+                thumbnail = embedded
+        if thumbnail is None:
+            # JPEGs decode straight to 1/2 .. 1/8 scale; other formats ignore draft()
+            image.draft("RGB", (edge, edge))
+            thumbnail = image
+        thumbnail.thumbnail((edge, edge), Image.Resampling.BILINEAR)
+        if orientation != 1:
+            thumbnail.getexif()[0x0112] = orientation
+            thumbnail = ImageOps.exif_transpose(thumbnail)
+        buffer = io.BytesIO()
+        _flatten(thumbnail).save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def make_video_thumbnail(file_path, edge=DEFAULT_THUMBNAIL_EDGE):
+    """Return a JPEG poster frame from the middle of the clip"""
+    from .video import KeyframeSampler
+
+    _, frames = KeyframeSampler(count=1, max_edge=edge).sample(file_path)
+    return frames[0]
+
+
+class ThumbnailCache:
+    """LRU of recent thumbnails in memory, backed by JPEG files in ``directory``.
+
+    ``directory=None`` uses the default location next to the result cache;
+    pass ``False`` for a memory-only cache. Safe to share between threads.
+    """
+
+    def __init__(self, directory=None, edge=DEFAULT_THUMBNAIL_EDGE, max_entries=DEFAULT_MEMORY_ENTRIES):
+        self.directory = default_thumbnail_dir() if directory is None else directory
+        self.edge = edge
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def key(self, file_path):
+        stat = os.stat(file_path)
+        material = f"{os.path.abspath(file_path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0{self.edge}"
+        return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".jpg")
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, file_path, file_type="image"):
+        """Return JPEG thumbnail bytes for ``file_path``, creating and caching them on a miss"""
+        key = self.key(file_path)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.directory:
+            try:
+                with open(self._disk_path(key), 'rb') as file:
+                    data = file.read()
+            except OSError:
+                data = None
+            if data:
+                self.hits += 1
+                self._remember(key, data)
+                return data
+
+        self.misses += 1
+        make = make_video_thumbnail if file_type == "video" else make_image_thumbnail
+        data = make(file_path, self.edge)
+        self._remember(key, data)
+        if self.directory:
+            self._store(key, data)
+        return data
+
+    def _store(self, key, data):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # A read-only or full disk only costs us the persistence
+            logger.debug("Could not store thumbnail %s: %s", path, e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.directory and os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith(".jpg"):
+                        os.remove(os.path.join(root, name))
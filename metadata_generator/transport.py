@@ -0,0 +1,211 @@
+"""Shared HTTP transport: pooled keep-alive session, retries with backoff, and a token-bucket rate limiter."""
+import re
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+DEFAULT_POOL_SIZE = 32
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+_KEY_PARAMETER = re.compile(r"([?&]key=)[^&\s'\"]+")
+
+
+class RateLimiter:
+    """Token bucket refilled at ``requests_per_minute``; ``acquire`` blocks until a token is free.
+
+    ``burst`` is the bucket size, i.e. how many requests may go out back to
+    back after an idle period.
+    """
+
+    def __init__(self, requests_per_minute, burst=1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available and return 0; otherwise return how long to wait for the next"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        import asyncio
+
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reported the quota exhausted"""
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+def retry_after_seconds(response):
+    """Read the server's requested delay from Retry-After or a google.rpc.RetryInfo detail"""
+    try:
+        error_data = response.json()
+    except Exception:
+        error_data = None
+    return retry_delay(response.headers, error_data)
+
+
+def retry_delay(headers, error_data=None):
+    """Like retry_after_seconds, from raw headers and an already decoded error body"""
+    header = headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    try:
+        details = error_data.get("error", {}).get("details", [])
+    except AttributeError:
+        return None
+    for detail in details or []:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return max(0.0, float(delay[:-1]))
+            except ValueError:
+                pass
+    return None
+
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, cap=DEFAULT_BACKOFF_MAX):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class HttpTransport:
+    """A requests.Session shared by every worker, with retry/backoff and optional rate limiting.
+
+    Retries cover connection errors, timeouts and RETRY_STATUSES. The delay
+    is the server's Retry-After when given, else exponential backoff with full
+    jitter. A 429 also holds back every other request on this transport until
+    the requested delay has passed, so workers do not stampede the quota.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX, rate_limiter=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt):
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max)
+
+    def _wait_for_cooldown(self):
+        with self._lock:
+            delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _cool_down(self, delay):
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        if self.rate_limiter is not None:
+            self.rate_limiter.drain()
+
+    def request(self, method, url, rate_limited=False, retries=None, **kwargs):
+        """Send a request, retrying transient failures; returns the final response.
+
+        ``rate_limited`` requests take a token from the rate limiter first.
+        ``retries`` overrides the transport's retry count for this call.
+        Connection errors are re-raised once retries are exhausted.
+        """
+        import requests
+
+        kwargs.setdefault("timeout", self.timeout)
+        if retries is None:
+            retries = self.retries
+        attempt = 0
+        while True:
+            self._wait_for_cooldown()
+            if rate_limited and self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("%s %s failed (%s); retrying in %.1fs", method, redact(url), e, delay)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                delay = retry_after_seconds(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                if response.status_code == 429:
+                    self._cool_down(delay)
+                logger.warning("%s %s returned %d; retrying in %.1fs", method, redact(url),
+                               response.status_code, delay)
+                response.close()
+
+            attempt += 1
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def redact(url):
+    # Keep API keys out of log output
+    return url.split("?", 1)[0]
+
+
+def redact_text(text):
+    """Mask API keys in free text, such as an exception message quoting a URL"""
+    return _KEY_PARAMETER.sub(r"\1REDACTED", text)
@@ -0,0 +1,304 @@
+"""Video probing and keyframe sampling with ffmpeg or PyAV, whichever is available."""
+import io
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+import subprocess
+from collections import deque, namedtuple
+
+from .memory import base64_length
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRAME_COUNT = 8
+DEFAULT_FRAME_EDGE = 768
+DEFAULT_SCENE_THRESHOLD = 0.3
+FRAME_QUALITY = 85
+SELECTION_MODES = ("uniform", "scene")
+# One decoded 3840x2160 RGB frame, the most a sampler holds at once before scaling it down
+DECODED_FRAME_BYTES = 3840 * 2160 * 3
+PIPE_READ_SIZE = 64 * 1024
+JPEG_START = b'\xff\xd8'
+# A showinfo log line: the selected frame's number and timestamp
+_SHOWINFO = re.compile(r"\bn:\s*(\d+)\b.*\bpts_time:\s*(-?[\d.]+)")
+
+VideoInfo = namedtuple("VideoInfo", "container codec duration width height")
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def pyav_available():
+    try:
+        import av  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def decoder_available():
+    return ffmpeg_available() or pyav_available()
+
+
+def probe_video(file_path):
+    """Return the real container/codec and basic stream details, or None if no decoder is installed"""
+    if ffmpeg_available():
+        return _probe_ffmpeg(file_path)
+    if pyav_available():
+        return _probe_pyav(file_path)
+    return None
+
+
+def _probe_ffmpeg(file_path):
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-print_format", "json",
+         "-show_format", "-show_streams", file_path],
+        capture_output=True, check=True
+    ).stdout
+    info = json.loads(output)
+    stream = (info.get("streams") or [{}])[0]
+    fmt = info.get("format", {})
+    return VideoInfo(
+        container=fmt.get("format_name"),
+        codec=stream.get("codec_name"),
+        duration=float(fmt.get("duration") or stream.get("duration") or 0),
+        width=stream.get("width"),
+        height=stream.get("height")
+    )
+
+
+def _probe_pyav(file_path):
+    import av
+
+    with av.open(file_path) as container:
+        stream = container.streams.video[0]
+        duration = float(container.duration / av.time_base) if container.duration else 0.0
+        return VideoInfo(
+            container=container.format.name,
+            codec=stream.codec_context.name,
+            duration=duration,
+            width=stream.codec_context.width,
+            height=stream.codec_context.height
+        )
+
+
+def _uniform_times(duration, count):
+    """Midpoints of ``count`` equal slices, so the very first and last (often black) frames are skipped"""
+    return [duration * (i + 0.5) / count for i in range(count)]
+
+
+def _spread(items, count):
+    """Pick ``count`` evenly spaced items"""
+    if len(items) <= count:
+        return list(items)
+    step = len(items) / count
+    return [items[int(i * step + step / 2)] for i in range(count)]
+
+
+class _EvenSample:
+    """An evenly spaced subset of a stream of unknown length, holding at most ``2 * count + 1`` items.
+
+    Every ``stride``-th item is kept; whenever too many are held, every other
+    one is dropped and the stride doubles.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.stride = 1
+        self.seen = 0
+        self.items = []
+
+    def keeps_next(self):
+        """Whether the stream's next item is kept (then pass it to ``add``), so unkept ones need not be built"""
+        keep = self.seen % self.stride == 0
+        self.seen += 1
+        return keep
+
+    def add(self, item):
+        self.items.append(item)
+        if len(self.items) > 2 * self.count:
+            self.items = self.items[::2]
+            self.stride *= 2
+
+    def result(self):
+        return _spread(self.items, self.count)
+
+
+def _read_jpegs(stream, on_frame):
+    """Call ``on_frame(jpeg)`` for every frame of an MJPEG stream as it arrives"""
+    buffer = b''
+    while True:
+        chunk = stream.read(PIPE_READ_SIZE)
+        if not chunk:
+            break
+        searched = max(len(JPEG_START), len(buffer) - len(JPEG_START))
+        buffer += chunk
+        # 0xFFD8 cannot occur inside entropy-coded JPEG data, so it reliably marks each frame start
+        start = buffer.find(JPEG_START, searched)
+        while start != -1:
+            on_frame(buffer[:start])
+            buffer = buffer[start:]
+            start = buffer.find(JPEG_START, len(JPEG_START))
+    if buffer:
+        on_frame(buffer)
+
+
+class KeyframeSampler:
+    """Extract a handful of representative JPEG frames from a video.
+
+    ``mode`` is "uniform" (evenly spaced timestamps) or "scene" (frames at
+    scene changes, thinned out to ``count`` and topped up uniformly when the
+    clip has too few cuts).
+    """
+
+    def __init__(self, count=DEFAULT_FRAME_COUNT, mode="uniform", max_edge=DEFAULT_FRAME_EDGE,
+                 scene_threshold=DEFAULT_SCENE_THRESHOLD):
+        if mode not in SELECTION_MODES:
+            raise ValueError(f"Unsupported frame selection mode: {mode}")
+        self.count = max(1, count)
+        self.mode = mode
+        self.max_edge = max_edge
+        self.scene_threshold = scene_threshold
+
+    @staticmethod
+    def available():
+        return decoder_available()
+
+    def signature(self):
+        return f"frames:{self.mode}:{self.count}:{self.max_edge}"
+
+    def __call__(self, file_path):
+        return self.sample(file_path)
+
+    def memory_estimate(self, file_path):
+        """Upper bound on the bytes held while sampling ``file_path``.
+
+        One decoded 4K frame, the scaled-down frames kept so far (up to
+        ``2 * count + 1`` while scene mode thins them out) and the JPEGs.
+        """
+        held = 2 * self.count + 1 if self.mode == "scene" else self.count
+        return (DECODED_FRAME_BYTES + held * self.max_edge ** 2 * 3
+                + self.count * base64_length(self.max_edge ** 2))
+
+    def sample(self, file_path):
+        """Return (VideoInfo, [jpeg bytes, ...])"""
+        info = probe_video(file_path)
+        if info is None:
+            raise RuntimeError("Neither ffmpeg nor PyAV is installed")
+
+        if ffmpeg_available():
+            frames = self._sample_ffmpeg(file_path, info)
+        else:
+            frames = self._sample_pyav(file_path, info)
+        if not frames:
+            raise RuntimeError(f"No frames could be decoded from {os.path.basename(file_path)}")
+
+        logger.info("%s: %s/%s, %.1fs, sampled %d frames (%d bytes)", file_path, info.container,
+                    info.codec, info.duration, len(frames), sum(len(frame) for frame in frames))
+        return info, frames
+
+    def _scale_filter(self):
+        edge = self.max_edge
+        return f"scale='if(gt(iw,ih),min({edge},iw),-2)':'if(gt(iw,ih),-2,min({edge},ih))'"
+
+    def _ffmpeg_frame_at(self, file_path, seconds):
+        # -ss before -i seeks on the demuxer, so only the frames around the target are decoded
+        return subprocess.run(
+            ["ffmpeg", "-v", "error", "-ss", f"{seconds:.3f}", "-i", file_path, "-frames:v", "1",
+             "-vf", self._scale_filter(), "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", "3", "-"],
+            capture_output=True, check=True
+        ).stdout
+
+    def _ffmpeg_scene_frames(self, file_path):
+        """``(seconds, jpeg)`` at scene changes, thinned out while ffmpeg streams them (seconds may be None)"""
+        # showinfo logs each selected frame's timestamp, at info level
+        command = ["ffmpeg", "-hide_banner", "-nostats", "-v", "info", "-i", file_path,
+                   "-vf", f"select='gt(scene,{self.scene_threshold})',showinfo,{self._scale_filter()}",
+                   "-vsync", "vfr", "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", "3", "-"]
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        times = {}
+        log = deque(maxlen=20)
+
+        def read_log():
+            for line in process.stderr:
+                line = line.decode("utf-8", "replace").rstrip()
+                match = _SHOWINFO.search(line)
+                if match:
+                    times[int(match.group(1))] = float(match.group(2))
+                else:
+                    log.append(line)
+
+        reader = threading.Thread(target=read_log, daemon=True)
+        reader.start()
+        sample = _EvenSample(self.count)
+        index = 0
+
+        def on_frame(frame):
+            nonlocal index
+            if sample.keeps_next():
+                sample.add((index, frame))
+            index += 1
+
+        try:
+            _read_jpegs(process.stdout, on_frame)
+        finally:
+            process.stdout.close()
+            process.wait()
+            reader.join()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command, stderr="\n".join(log))
+        return [(times.get(index), frame) for index, frame in sample.result()]
+
+    def _sample_ffmpeg(self, file_path, info):
+        frames = []
+        if self.mode == "scene":
+            frames = self._ffmpeg_scene_frames(file_path)
+
+        if len(frames) < self.count:
+            times = _uniform_times(info.duration, self.count - len(frames)) if info.duration else [0]
+            for seconds in times:
+                frame = self._ffmpeg_frame_at(file_path, seconds)
+                if frame:
+                    frames.append((seconds, frame))
+        if all(seconds is not None for seconds, _ in frames):
+            # Top-up frames go between the scene changes, in the order they appear in the clip
+            frames.sort(key=lambda entry: entry[0])
+        return [frame for _, frame in frames]
+
+    def _shrink(self, image):
+        image.thumbnail((self.max_edge, self.max_edge))
+        return image
+
+    def _sample_pyav(self, file_path, info):
+        import av
+
+        with av.open(file_path) as container:
+            stream = container.streams.video[0]
+            if self.mode == "scene":
+                # PyAV has no scene detector; keyframes are the closest cheap stand-in
+                stream.codec_context.skip_frame = "NONKEY"
+                # Thinned and shrunk as they are decoded, so long clips never hold many frames
+                sample = _EvenSample(self.count)
+                for frame in container.decode(stream):
+                    if sample.keeps_next():
+                        sample.add(self._shrink(frame.to_image()))
+                images = sample.result()
+            else:
+                images = []
+                for seconds in _uniform_times(info.duration, self.count) if info.duration else [0]:
+                    container.seek(int(seconds * av.time_base))
+                    for frame in container.decode(stream):
+                        images.append(self._shrink(frame.to_image()))
+                        break
+
+        frames = []
+        for image in images:
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=FRAME_QUALITY)
+            frames.append(buffer.getvalue())
+        return frames
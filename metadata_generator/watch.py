@@ -0,0 +1,318 @@
+"""Watch folders and process media as it arrives (``python -m metadata_generator --watch DIR``).
+
+On Linux the watcher sleeps in inotify (through ctypes, no extra dependency)
+until something changes, so an idle service uses no CPU. Elsewhere, or when
+inotify is unavailable, the directories are rescanned every ``poll_interval``
+seconds. A file is queued only once its size and modification time have not
+changed for ``settle`` seconds, so copies still in progress are left alone.
+The queue is bounded: when the workers fall behind, the watcher stops taking
+new files until there is room again.
+"""
+import os
+import sys
+import time
+import queue
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from collections import OrderedDict
+
+from .core import GeminiError, detect_file_type
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_QUEUE_SIZE = 64
+# Files remembered as already queued, so a rescan does not send them again; the oldest are forgotten first
+QUEUED_MEMORY = 100000
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+# Deletions and moves away are reported too, so their files can be forgotten
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def is_candidate(file_path):
+    """Media files only; hidden files (editor and copy temporaries) are ignored"""
+    return not os.path.basename(file_path).startswith(".") and detect_file_type(file_path) is not None
+
+
+def scan(directories):
+    """Every candidate file below ``directories``"""
+    for directory in directories:
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in names:
+                path = os.path.join(root, name)
+                if is_candidate(path):
+                    yield path
+
+
+class InotifyWatcher:
+    """Recursive inotify watch; ``wait`` blocks in the kernel until files change"""
+
+    def __init__(self, directories):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1: {os.strerror(error)}")
+        # A pipe to wake a blocked wait() from another thread
+        self._wake_read, self._wake_write = os.pipe()
+        self._directories = {}
+        for directory in directories:
+            self._add_tree(directory)
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith("linux") and ctypes.util.find_library("c") is not None
+
+    def _add_tree(self, directory):
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(root), WATCH_MASK)
+            if descriptor < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached (raise fs.inotify.max_user_watches)")
+                logger.warning("Cannot watch %s: %s", root, os.strerror(error))
+                continue
+            self._directories[descriptor] = root
+
+    def wait(self, timeout=None):
+        """Return the paths that changed, [] on timeout, or None when events were lost and a rescan is due"""
+        ready, _, _ = select.select([self._fd, self._wake_read], [], [], timeout)
+        if self._wake_read in ready:
+            os.read(self._wake_read, READ_SIZE)
+        if self._fd not in ready:
+            return []
+
+        data = os.read(self._fd, READ_SIZE)
+        paths = []
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            directory = self._directories.get(descriptor)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not os.path.basename(path).startswith("."):
+                    # Files may have landed in a new directory before its watch existed
+                    self._add_tree(path)
+                    paths.extend(scan([path]))
+                continue
+            paths.append(path)
+        return None if overflow else paths
+
+    def wake(self):
+        os.write(self._wake_write, b"\0")
+
+    def close(self):
+        for fd in (self._fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+
+class PollingWatcher:
+    """Rescans the directories every ``interval`` seconds and reports files that changed size or mtime or vanished"""
+
+    def __init__(self, directories, interval=DEFAULT_POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self._known = self._snapshot()
+        self._next_scan = time.monotonic() + interval
+        self._woken = threading.Event()
+
+    def _snapshot(self):
+        known = {}
+        for path in scan(self.directories):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            known[path] = (stat.st_size, stat.st_mtime_ns)
+        return known
+
+    def wait(self, timeout=None):
+        delay = max(0.0, self._next_scan - time.monotonic())
+        if timeout is not None and timeout < delay:
+            self._woken.wait(timeout)
+            self._woken.clear()
+            return []
+        if self._woken.wait(delay):
+            self._woken.clear()
+            return []
+        self._next_scan = time.monotonic() + self.interval
+        known = self._snapshot()
+        changed = [path for path, identity in known.items() if self._known.get(path) != identity]
+        changed.extend(path for path in self._known if path not in known)
+        self._known = known
+        return changed
+
+    def wake(self):
+        self._woken.set()
+
+    def close(self):
+        pass
+
+
+class WatchService:
+    """Feed settled new or changed files from ``directories`` to ``workers`` threads running ``client.generate``.
+
+    Files present at start-up are processed too; ``skip(path)`` can exclude
+    ones already done (e.g. according to a JobJournal). ``on_result(path,
+    metadata)`` and ``on_error(path, message)`` are called from the worker
+    threads. ``run`` blocks until ``stop`` is called.
+    """
+
+    def __init__(self, client, directories, workers=4, queue_size=DEFAULT_QUEUE_SIZE, settle=DEFAULT_SETTLE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, polling=False, skip=None, on_result=None, on_error=None):
+        self.client = client
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.polling = polling
+        self.skip = skip or (lambda path: False)
+        self.on_result = on_result or (lambda path, metadata: None)
+        self.on_error = on_error or (lambda path, message: None)
+        self.watcher = None
+        self.processed = 0
+        self.failed = 0
+        self._pending = {}
+        self._queued = OrderedDict()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def _make_watcher(self):
+        if not self.polling and InotifyWatcher.available():
+            try:
+                return InotifyWatcher(self.directories)
+            except OSError as e:
+                logger.warning("inotify unavailable (%s); polling every %.0fs", e, self.poll_interval)
+        return PollingWatcher(self.directories, self.poll_interval)
+
+    def stop(self):
+        """Stop watching; files already being processed finish, queued ones are left for the next start"""
+        self._stopped.set()
+        if self.watcher is not None:
+            self.watcher.wake()
+
+    def _note(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Deleted or renamed away, maybe before it even settled
+            self._pending.pop(path, None)
+            self._queued.pop(path, None)
+            return
+        identity = (stat.st_size, stat.st_mtime_ns)
+        if self._queued.get(path) == identity:
+            return
+        entry = self._pending.get(path)
+        if entry is None or entry[0] != identity:
+            self._pending[path] = (identity, time.monotonic())
+
+    def _promote(self):
+        """Queue every pending file that has not changed for ``settle`` seconds"""
+        now = time.monotonic()
+        for path, (identity, since) in list(self._pending.items()):
+            if now - since < self.settle:
+                continue
+            self._note(path)
+            entry = self._pending.get(path)
+            if entry is None or entry[1] != since:
+                continue  # Changed since it was last seen; the settle timer restarted
+            del self._pending[path]
+            self._queued[path] = identity
+            self._queued.move_to_end(path)
+            if len(self._queued) > QUEUED_MEMORY:
+                self._queued.popitem(last=False)
+            if self.skip(path):
+                continue
+            self._put(path)
+
+    def _put(self, path):
+        # Backpressure: hold the watcher here until a worker frees a slot
+        while not self._stopped.is_set():
+            try:
+                self.queue.put(path, timeout=1.0)
+                return
+            except queue.Full:
+                logger.debug("Queue full; waiting to add %s", path)
+
+    def _work(self):
+        while True:
+            path = self.queue.get()
+            if path is None:
+                return
+            try:
+                metadata = self.client.generate(path)
+            except GeminiError as e:
+                self._count("failed")
+                self.on_error(path, str(e))
+            except Exception as e:
+                self._count("failed")
+                self.on_error(path, f"Error: {str(e)}")
+            else:
+                self._count("processed")
+                self.on_result(path, metadata)
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def run(self):
+        self.watcher = self._make_watcher()
+        threads = [threading.Thread(target=self._work, name=f"watch-worker-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        logger.info("Watching %s with %s", ", ".join(self.directories), type(self.watcher).__name__)
+        try:
+            for path in scan(self.directories):
+                self._note(path)
+            while not self._stopped.is_set():
+                self._promote()
+                # Sleep until something changes; wake up only while files are settling
+                changed = self.watcher.wait(self.settle / 2 if self._pending else None)
+                if changed is None:
+                    logger.warning("Change events were lost; rescanning")
+                    changed = scan(self.directories)
+                for path in changed:
+                    if is_candidate(path):
+                        self._note(path)
+        finally:
+            self._stopped.set()
+            # Drop what has not started yet so shutdown is quick; it is picked up again next time
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+            self.watcher.close()
@@ -0,0 +1,81 @@
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from benchmarks.mock_gemini import CANNED_METADATA, MockGeminiServer
+from metadata_generator.cli import main
+from metadata_generator.embed import NS_DC, NS_RDF, NS_X
+from metadata_generator.metrics import metrics
+from metadata_generator.parsing import parse_stats
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def server():
+    with MockGeminiServer(seed=1) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    parse_stats.reset()
+    yield
+
+
+def make_image(path, color=(200, 40, 40), size=(64, 48), **save_options):
+    """A small image with a gradient, so each colour gives distinct pixels"""
+    image = Image.new("RGB", size, color)
+    for x in range(size[0]):
+        image.putpixel((x, x * size[1] // size[0]), (x * 4 % 256, 255 - color[1], color[2]))
+    image.save(path, **save_options)
+    return str(path)
+
+
+@pytest.fixture
+def photos(tmp_path):
+    """Four distinct JPEG and PNG files in a ``photos`` directory"""
+    directory = tmp_path / "photos"
+    directory.mkdir()
+    colors = [(200, 40, 40), (40, 200, 40), (40, 40, 200), (200, 200, 40)]
+    names = ["a.jpg", "b.jpg", "c.png", "d.jpg"]
+    return [make_image(directory / name, color) for name, color in zip(names, colors)]
+
+
+def read_xmp(path):
+    """(title, description, keywords) from the single XMP packet in a file"""
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data.count(b"<?xpacket begin") == 1
+    start = data.index(b"?>", data.index(b"<?xpacket begin")) + 2
+    root = ET.fromstring(data[start:data.index(b"<?xpacket end", start)].strip())
+    assert root.tag == f"{{{NS_X}}}xmpmeta"
+    node = root.find(f"{{{NS_RDF}}}RDF/{{{NS_RDF}}}Description")
+
+    def text(tag):
+        item = node.find(f"{{{NS_DC}}}{tag}/{{{NS_RDF}}}Alt/{{{NS_RDF}}}li")
+        return item.text if item is not None else None
+
+    keywords = [item.text for item in node.findall(f"{{{NS_DC}}}subject/{{{NS_RDF}}}Bag/{{{NS_RDF}}}li")]
+    return text("title"), text("description"), keywords
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def run_cli(server, *args):
+    """Run the CLI against the mock server with caching and retries off"""
+    return main(["--api-key", "SECRETKEY", "--base-url", server.base_url, "--no-cache", "--retries", "0",
+                 *map(str, args)])
+
+
+def assert_canned(records, paths):
+    assert sorted(record["source_file"] for record in records) == sorted(paths)
+    for record in records:
+        assert "error" not in record
+        assert record["title"] == CANNED_METADATA["title"]
+        assert record["keywords"] == CANNED_METADATA["keywords"]
@@ -0,0 +1,83 @@
+import time
+import asyncio
+
+import pytest
+
+from metadata_generator.aio import AsyncBatchRunner, AsyncGeminiClient, Result, backend_available
+from metadata_generator.core import GeminiClient, GeminiError
+
+from conftest import assert_canned, read_records, run_cli
+
+pytestmark = pytest.mark.skipif(not backend_available(), reason="neither aiohttp nor httpx is installed")
+
+BODY = {"contents": [{"parts": [{"text": "Describe nothing"}]}]}
+
+
+def test_asyncio_engine(server, photos, tmp_path):
+    output = tmp_path / "results.jsonl"
+    assert run_cli(server, *photos, "-o", output, "--engine", "asyncio", "-w", 4) == 0
+    assert_canned(read_records(output), photos)
+    assert server.requests == len(photos)
+    assert (server.keys_in_url, server.unauthenticated) == (0, 0)
+
+
+def test_batch_runner_reports_every_file(server, photos):
+    results, errors, progress = {}, {}, []
+    runner = AsyncBatchRunner(GeminiClient("K", base_url=server.base_url), photos + ["missing.jpg"], workers=2,
+                              on_result=results.__setitem__, on_error=errors.__setitem__,
+                              on_done=lambda done, total: progress.append((done, total)))
+    runner.run()
+    assert sorted(results) == [0, 1, 2, 3]
+    assert list(errors) == [4]
+    assert progress[-1] == (5, 5)
+
+
+def test_finished_files_are_yielded_while_paused():
+    async def main():
+        engine = AsyncGeminiClient(None, client=GeminiClient("K"), concurrency=2)
+
+        async def fake_result(index, file_path):
+            await asyncio.sleep(0.05 * (index + 1))
+            return Result(index, file_path, {}, None)
+
+        engine._generate_result = fake_result
+        gate = asyncio.Event()
+        gate.set()
+        yielded = []
+
+        async def consume():
+            async for result in engine.generate_many(["a", "b", "c"], gate=gate):
+                yielded.append(result.index)
+                if result.index == 0:
+                    gate.clear()
+
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.3)
+        # "b" was already in flight when the stream was paused; "c" has not started
+        assert yielded == [0, 1]
+        gate.set()
+        await consumer
+        assert yielded == [0, 1, 2]
+        await engine.aclose()
+
+    asyncio.run(main())
+
+
+def test_rate_limit_holds_back_every_request(server):
+    server.rate_limit_rate = 1.0
+    server.retry_after = 0.3
+
+    async def main():
+        async with AsyncGeminiClient(None, client=GeminiClient("K", base_url=server.base_url), retries=1) as engine:
+            started = time.monotonic()
+
+            async def attempt():
+                with pytest.raises(GeminiError, match="exhausted"):
+                    await engine.generate_content(BODY)
+
+            await asyncio.gather(*(attempt() for _ in range(3)))
+            assert time.monotonic() - started >= 0.3
+            assert engine._cooldown_until > started
+
+    asyncio.run(main())
+    assert server.requests == 6
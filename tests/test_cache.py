@@ -0,0 +1,74 @@
+import hashlib
+
+from metadata_generator import cache
+from metadata_generator.cache import ResultCache, hash_file, make_key
+from metadata_generator.cli import main
+
+from conftest import assert_canned, read_records
+
+
+def test_hash_file_reads_in_chunks(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 100)
+    assert hash_file(str(path), chunk_size=1000) == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_key_covers_every_input():
+    key = make_key("abc", "model", "prompt", {"temperature": 0})
+    assert make_key("abc", "model", "prompt", {"temperature": 0}) == key
+    assert make_key("abd", "model", "prompt", {"temperature": 0}) != key
+    assert make_key("abc", "other", "prompt", {"temperature": 0}) != key
+    assert make_key("abc", "model", "prompt", {"temperature": 1}) != key
+    assert make_key("abc", "model", "prompt", {"temperature": 0}, variant={"max_edge": 768}) != key
+
+
+def test_hits_misses_and_persistence(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    results = ResultCache(path)
+    assert results.get("k") is None
+    results.put("k", {"title": "T", "keywords": ["a"]})
+    assert results.get("k") == {"title": "T", "keywords": ["a"]}
+    results.close()
+
+    reopened = ResultCache(path)
+    assert reopened.get("k") == {"title": "T", "keywords": ["a"]}
+    assert reopened.stats()["entries"] == 1
+    assert (results.hits, results.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted():
+    results = ResultCache(":memory:", max_entries=2)
+    for key in ("a", "b", "c"):
+        results.put(key, {"title": key})
+    results.get("a")  # "b" is now the least recently used
+    results.evict()
+    assert results.get("b") is None
+    assert results.get("a") is not None and results.get("c") is not None
+
+
+def test_size_limit():
+    results = ResultCache(":memory:", max_bytes=100)
+    for key in "abcdef":
+        results.put(key, {"title": key * 20})
+    results.evict()
+    assert results.stats()["bytes"] <= 100
+    assert results.get("f") is not None
+
+
+def test_stale_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    results = ResultCache(":memory:", max_age=60)
+    results.put("k", {"title": "T"})
+    now[0] += 61
+    assert results.get("k") is None
+    assert results.stats()["entries"] == 0
+
+
+def test_rerun_is_served_from_the_cache(server, photos, tmp_path):
+    database = tmp_path / "cache.sqlite"
+    for name in ("first.jsonl", "second.jsonl"):
+        assert main(["--api-key", "K", "--base-url", server.base_url, "--cache", str(database),
+                     *photos, "-o", str(tmp_path / name)]) == 0
+    assert_canned(read_records(tmp_path / "second.jsonl"), photos)
+    assert server.requests == len(photos)
@@ -0,0 +1,22 @@
+import os
+import sys
+import subprocess
+
+from conftest import assert_canned, read_records, run_cli as run
+
+
+def test_results_file(server, photos, tmp_path):
+    output = tmp_path / "results.jsonl"
+    assert run(server, os.path.dirname(photos[0]), "-o", output, "-w", 2) == 0
+    assert_canned(read_records(output), photos)
+    assert server.requests == len(photos)
+    assert (server.keys_in_url, server.unauthenticated) == (0, 0)
+
+
+def test_startup_skips_optional_modules():
+    code = "import sys, metadata_generator.cli; print('\\n'.join(sys.modules))"
+    loaded = set(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.split())
+    assert not {"PyQt6", "asyncio"} & loaded
+    for module in ("gui", "watch", "dedupe", "keywords", "embed", "routing"):
+        assert f"metadata_generator.{module}" not in loaded
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from metadata_generator.core import GeminiClient, GeminiError
+
+from conftest import assert_canned, read_records, run_cli
+
+
+def test_large_files_are_uploaded(server, photos, tmp_path):
+    output = tmp_path / "results.jsonl"
+    # Original bytes, and every file above the threshold, so each one goes through the Files API
+    assert run_cli(server, *photos, "-o", output, "--no-preprocess", "--upload-threshold-mb", 0.0001) == 0
+    assert_canned(read_records(output), photos)
+    assert server.uploads == {}  # Every upload session was finalised
+    # Start, one chunk and generateContent per file, plus deleting the uploaded file
+    assert server.requests == 4 * len(photos)
+    assert (server.keys_in_url, server.unauthenticated) == (0, 0)
+
+
+def test_upload_is_sent_in_chunks(server, tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(bytes(range(10)))
+    sent = []
+    client = GeminiClient("K", base_url=server.base_url, upload_chunk_size=4)
+    resource = client.upload_file(str(path), "video/mp4", progress=lambda done, total: sent.append((done, total)))
+    assert resource["mimeType"] == "video/mp4"
+    assert sent == [(4, 10), (8, 10), (10, 10)]
+    assert server.requests == 1 + 3
+    assert server.uploads == {}
+
+
+def test_upload_of_a_shrinking_file_fails(server, tmp_path, monkeypatch):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(bytes(10))
+    monkeypatch.setattr(os.path, "getsize", lambda file_path: 100)  # Truncated after its size was read
+    with pytest.raises(GeminiError, match="changed during the upload"):
+        GeminiClient("K", base_url=server.base_url).upload_file(str(path), "video/mp4")
+
+
+def test_upload_network_errors_are_gemini_errors(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(bytes(10))
+    client = GeminiClient("SECRETKEY", base_url="http://127.0.0.1:1/v1beta")
+    client.transport.retries = 0
+    with pytest.raises(GeminiError, match="Network error") as error:
+        client.upload_file(str(path), "video/mp4")
+    assert "SECRETKEY" not in str(error.value)
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from metadata_generator.dedupe import BKTree, DuplicateIndex, DuplicatePlan, dhash, hamming, phash
+
+from conftest import Image, assert_canned, read_records, run_cli
+
+
+def noise(path, seed, size=(64, 48)):
+    """A blocky random picture; resized copies keep its structure"""
+    rng = random.Random(seed)
+    small = Image.new("L", (8, 6))
+    small.putdata([rng.randrange(256) for _ in range(8 * 6)])
+    small.resize(size, Image.Resampling.NEAREST).convert("RGB").save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("hasher", [dhash, phash])
+def test_resized_copies_hash_alike(tmp_path, hasher):
+    original = noise(tmp_path / "a.png", 1, (640, 480))
+    copy = noise(tmp_path / "a.jpg", 1, (320, 240))
+    other = noise(tmp_path / "b.png", 2, (640, 480))
+    assert hamming(hasher(original), hasher(copy)) <= 6
+    assert hamming(hasher(original), hasher(other)) > 12
+
+
+def test_bk_tree_matches_a_full_scan():
+    rng = random.Random(3)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, index)
+    for _ in range(50):
+        probe = values[rng.randrange(len(values))] ^ (1 << rng.randrange(64))
+        distance, index = tree.nearest(probe, 6)
+        assert distance == min(hamming(probe, value) for value in values)
+        assert hamming(probe, values[index]) == distance
+
+
+def test_plan_groups_near_duplicates(tmp_path):
+    paths = [noise(tmp_path / "a.png", 1, (640, 480)), noise(tmp_path / "a_small.jpg", 1, (320, 240)),
+             noise(tmp_path / "b.png", 2)]
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    paths.append(str(broken))
+    index = DuplicateIndex()
+    plan = DuplicatePlan(index, paths, range(len(paths)), workers=2)
+    assert plan.unique == [0, 2, 3]
+    assert plan.followers == {0: [1]}
+    assert plan.avoided == 1
+
+    metadata = {"title": "A", "keywords": ["a"]}
+    (follower, copied), = plan.record(0, metadata)
+    assert follower == 1 and copied == metadata and copied is not metadata
+
+    # A later batch reuses the recorded result
+    again = DuplicatePlan(index, [noise(tmp_path / "a_copy.png", 1)], [0])
+    assert again.unique == []
+    assert again.reused == {0: (paths[0], metadata)}
+
+
+def test_cli_sends_one_file_per_group(server, tmp_path):
+    source = tmp_path / "burst"
+    source.mkdir()
+    paths = [noise(source / f"{name}.png", seed) for name, seed in (("a", 1), ("a2", 1), ("b", 2))]
+    output = tmp_path / "results.jsonl"
+    assert run_cli(server, source, "-o", output, "--dedupe") == 0
+    assert_canned(read_records(output), paths)
+    assert server.requests == 2
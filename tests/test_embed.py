@@ -0,0 +1,161 @@
+import os
+
+import pytest
+
+from benchmarks.mock_gemini import CANNED_METADATA
+from metadata_generator.cli import main
+from metadata_generator.embed import EmbedError, apply_results, build_xmp, embed_metadata, load_results
+
+from conftest import Image, make_image, read_xmp, run_cli
+
+METADATA = {"title": "Red barn", "description": "A red barn in a field at dusk.",
+            "keywords": ["barn", "farm", "dusk", "Käse & Brot"]}
+
+
+def pixels(path):
+    with Image.open(path) as image:
+        return image.convert("RGB").tobytes()
+
+
+@pytest.mark.parametrize("name, options", [
+    ("photo.jpg", {}),
+    ("photo.png", {}),
+    ("photo.tif", {}),
+    ("photo.tiff", {"compression": "tiff_lzw"}),
+])
+def test_image_round_trip(tmp_path, name, options):
+    path = make_image(tmp_path / name, **options)
+    before = pixels(path)
+    embed_metadata(path, METADATA)
+    assert read_xmp(path) == (METADATA["title"], METADATA["description"], METADATA["keywords"])
+    assert pixels(path) == before
+
+
+def test_embedding_twice_replaces_our_fields(tmp_path):
+    path = make_image(tmp_path / "photo.jpg")
+    embed_metadata(path, METADATA)
+    embed_metadata(path, {"title": "Blue barn", "keywords": ["barn"]})
+    assert read_xmp(path) == ("Blue barn", None, ["barn"])
+
+
+def test_other_xmp_properties_are_kept():
+    existing = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+                b'<rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmp:Rating="5"/>'
+                b'</rdf:RDF></x:xmpmeta>')
+    packet = build_xmp(METADATA, existing)
+    assert b'Rating="5"' in packet
+    assert b"Red barn" in packet
+
+
+def test_jpeg_iptc_and_exif(tmp_path):
+    from PIL import IptcImagePlugin
+
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    path = make_image(tmp_path / "photo.jpg", exif=exif.tobytes())
+    embed_metadata(path, METADATA)
+    with Image.open(path) as image:
+        iptc = IptcImagePlugin.getiptcinfo(image)
+        exif = image.getexif()
+    assert iptc[(2, 5)] == b"Red barn"
+    assert [keyword.decode("utf-8") for keyword in iptc[(2, 25)]] == METADATA["keywords"]
+    assert exif[0x010F] == "Camera maker"
+    assert exif[0x010E] == METADATA["description"]
+
+
+def test_modification_time_is_preserved(tmp_path):
+    path = make_image(tmp_path / "photo.png")
+    os.utime(path, (1000000000, 1000000000))
+    embed_metadata(path, METADATA)
+    assert os.stat(path).st_mtime == 1000000000
+
+
+def test_copy_leaves_the_original_untouched(tmp_path):
+    path = make_image(tmp_path / "photo.jpg")
+    with open(path, "rb") as file:
+        original = file.read()
+    copy = str(tmp_path / "copy.jpg")
+    embed_metadata(path, METADATA, output_path=copy)
+    with open(path, "rb") as file:
+        assert file.read() == original
+    assert read_xmp(copy)[0] == "Red barn"
+
+
+def test_unsupported_and_broken_files(tmp_path):
+    text = tmp_path / "notes.txt"
+    text.write_text("hello")
+    with pytest.raises(EmbedError):
+        embed_metadata(str(text), METADATA)
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not a png at all")
+    with pytest.raises(EmbedError):
+        embed_metadata(str(broken), METADATA)
+    assert sorted(os.listdir(tmp_path)) == ["broken.png", "notes.txt"]  # No temporary files left behind
+
+
+def make_clip(path, container_options=None, frames=12):
+    av = pytest.importorskip("av")
+    with av.open(str(path), "w", options=container_options or {}) as container:
+        stream = container.add_stream("mpeg4", rate=12)
+        stream.width, stream.height, stream.pix_fmt = 64, 48, "yuv420p"
+        for index in range(frames):
+            frame = av.VideoFrame.from_image(Image.new("RGB", (64, 48), (index * 20, 100, 200 - index * 10)))
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return str(path)
+
+
+def decoded_frames(path):
+    import av
+
+    with av.open(path) as container:
+        return [frame.to_image().tobytes() for frame in container.decode(video=0)]
+
+
+@pytest.mark.parametrize("name, options", [
+    ("clip.mp4", None),
+    ("clip.mov", None),
+    ("faststart.mov", {"movflags": "faststart"}),  # moov in front of the media data: chunk offsets shift
+    ("faststart.mp4", {"movflags": "faststart"}),
+])
+def test_video_round_trip(tmp_path, name, options):
+    path = make_clip(tmp_path / name, options)
+    before = decoded_frames(path)
+    embed_metadata(path, METADATA)
+    assert read_xmp(path) == (METADATA["title"], METADATA["description"], METADATA["keywords"])
+    assert decoded_frames(path) == before
+    embed_metadata(path, {"title": "Second pass"})
+    assert read_xmp(path)[0] == "Second pass"
+    assert decoded_frames(path) == before
+
+
+def test_apply_results_skips_failures(tmp_path):
+    good = make_image(tmp_path / "good.jpg")
+    failed = make_image(tmp_path / "failed.jpg")
+    records = [dict(METADATA, source_file=good), {"source_file": failed, "error": "Network error"},
+               dict(METADATA, source_file=str(tmp_path / "missing.jpg"))]
+    errors = []
+    applied, failed_count, skipped = apply_results(records, workers=2,
+                                                   on_error=lambda path, message: errors.append(path))
+    assert (applied, failed_count, skipped) == (1, 1, 1)
+    assert errors == [str(tmp_path / "missing.jpg")]
+    assert read_xmp(good)[0] == "Red barn"
+
+
+def test_apply_embeds_results(server, photos, tmp_path):
+    output = tmp_path / "results.json"
+    assert run_cli(server, *photos, "-o", output) == 0
+    assert main(["--apply", str(output)]) == 0
+    for path in photos:
+        assert read_xmp(path)[0] == CANNED_METADATA["title"]
+
+
+def test_load_results_formats(tmp_path):
+    (tmp_path / "r.jsonl").write_text('{"source_file": "a.jpg", "keywords": ["x"]}\n\n')
+    (tmp_path / "r.csv").write_text('source_file,title,keywords\na.jpg,T,"x, y"\n')
+    (tmp_path / "r.json").write_text('{"source_file": "a.jpg"}')
+    assert load_results(str(tmp_path / "r.jsonl")) == [{"source_file": "a.jpg", "keywords": ["x"]}]
+    assert load_results(str(tmp_path / "r.csv"))[0]["keywords"] == ["x", "y"]
+    assert load_results(str(tmp_path / "r.json")) == [{"source_file": "a.jpg"}]
@@ -0,0 +1,74 @@
+import csv
+import json
+import os
+
+from benchmarks.mock_gemini import CANNED_METADATA
+from metadata_generator.export import common_root, make_record, open_exporter, sidecar_path
+
+from conftest import make_image, read_xmp, run_cli
+
+METADATA = {"title": "Harbour", "description": "Boats in a harbour.", "keywords": ["boat", "harbour"]}
+
+
+def test_sidecar_names(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    photo = make_image(tmp_path / "a" / "photo.jpg")
+    make_image(tmp_path / "a" / "photo.png")
+    single = make_image(tmp_path / "b" / "single.jpg")
+    # The name does not depend on which other files exist
+    assert sidecar_path(photo) == str(tmp_path / "a" / "photo.jpg.xmp")
+    assert sidecar_path(single) == str(tmp_path / "b" / "single.jpg.xmp")
+    out = str(tmp_path / "out")
+    assert sidecar_path(single, out, root=str(tmp_path)) == os.path.join(out, "b", "single.jpg.xmp")
+    # Outside the root, or without one, sidecars go straight into the directory
+    assert sidecar_path(single, out, root=str(tmp_path / "a")) == os.path.join(out, "single.jpg.xmp")
+    assert sidecar_path(single, out) == os.path.join(out, "single.jpg.xmp")
+
+
+def test_common_root(tmp_path):
+    assert common_root([str(tmp_path / "a" / "x.jpg"), str(tmp_path / "b" / "y.jpg")]) == str(tmp_path)
+    assert common_root([str(tmp_path)]) == str(tmp_path)
+    assert common_root([]) is None
+
+
+def test_sidecar_exporter_merges(tmp_path):
+    photo = make_image(tmp_path / "photo.jpg")
+    with open_exporter("xmp") as exporter:
+        exporter.write(make_record(photo, metadata=METADATA))
+        exporter.write(make_record(photo, error="Network error"))  # Failures leave the sidecar alone
+    assert read_xmp(tmp_path / "photo.jpg.xmp") == ("Harbour", "Boats in a harbour.", ["boat", "harbour"])
+
+
+def test_file_exporters(tmp_path):
+    records = [make_record("a.jpg", metadata=METADATA), make_record("b.jpg", error="Network error")]
+    for output_format, name in (("json", "r.json"), ("jsonl", "r.jsonl"), ("csv", "r.csv"),
+                                ("adobe-stock", "adobe.csv"), ("shutterstock", "shutter.csv")):
+        with open_exporter(output_format, str(tmp_path / name)) as exporter:
+            for record in records:
+                exporter.write(record)
+
+    assert [record["source_file"] for record in json.loads((tmp_path / "r.json").read_text())] == ["a.jpg", "b.jpg"]
+    assert len((tmp_path / "r.jsonl").read_text().splitlines()) == 2
+    with open(tmp_path / "r.csv", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert rows[0]["keywords"] == "boat, harbour"
+    assert rows[1]["error"] == "Network error"
+    # The agency templates only list files that have metadata
+    with open(tmp_path / "adobe.csv", newline="") as file:
+        assert len(list(csv.DictReader(file))) == 1
+
+
+def test_xmp_sidecars_mirror_the_input(server, tmp_path):
+    source = tmp_path / "in"
+    for folder in ("a", "b"):
+        (source / folder).mkdir(parents=True)
+        make_image(source / folder / "img.jpg")
+    make_image(source / "a" / "img.png")
+    sidecars = tmp_path / "sidecars"
+    assert run_cli(server, source, "-f", "xmp", "-o", sidecars) == 0
+    found = sorted(os.path.relpath(os.path.join(root, name), sidecars)
+                   for root, _, names in os.walk(sidecars) for name in names)
+    assert found == [os.path.join("a", "img.jpg.xmp"), os.path.join("a", "img.png.xmp"),
+                     os.path.join("b", "img.jpg.xmp")]
+    assert read_xmp(sidecars / "b" / "img.jpg.xmp")[0] == CANNED_METADATA["title"]
@@ -0,0 +1,61 @@
+import os
+
+from metadata_generator.journal import JobJournal
+
+from conftest import assert_canned, make_image, read_records, run_cli
+
+
+def test_resume_skips_finished_files(tmp_path):
+    paths = [make_image(tmp_path / f"{name}.jpg") for name in "abc"]
+    journal = JobJournal(str(tmp_path / "job.sqlite"))
+    journal.record_result(paths[0], {"title": "A"})
+    journal.record_error(paths[1], "Network error")
+    journal.record_error(paths[1], "Network error again")
+    assert journal.resume(paths) == ({0: {"title": "A"}}, [1, 2])
+    assert journal.failures() == [(paths[1], "Network error again", 2)]
+    assert journal.stats() == {"done": 1, "failed": 1}
+    journal.close()
+
+    # Durable across processes, until cleared
+    reopened = JobJournal(str(tmp_path / "job.sqlite"))
+    assert reopened.resume(paths)[0] == {0: {"title": "A"}}
+    reopened.clear()
+    assert reopened.resume(paths) == ({}, [0, 1, 2])
+
+
+def test_changed_files_count_as_new(tmp_path):
+    path = make_image(tmp_path / "a.jpg")
+    journal = JobJournal(":memory:")
+    journal.record_result(path, {"title": "A"})
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert journal.resume([path]) == ({}, [0])
+    os.remove(path)
+    assert journal.resume([path]) == ({}, [0])
+
+
+def test_journal_resume(server, photos, tmp_path):
+    journal = tmp_path / "job.sqlite"
+    first = tmp_path / "first.jsonl"
+    assert run_cli(server, *photos[:2], "-o", first, "--journal", journal) == 0
+    assert server.requests == 2
+
+    # The finished files are written from the journal; only the new ones are sent
+    second = tmp_path / "second.jsonl"
+    assert run_cli(server, *photos, "-o", second, "--journal", journal) == 0
+    assert_canned(read_records(second), photos)
+    assert server.requests == 4
+
+    third = tmp_path / "third.jsonl"
+    assert run_cli(server, *photos, "-o", third, "--journal", journal, "--restart") == 0
+    assert server.requests == 8
+
+
+def test_journal_retries_failed_files(server, photos, tmp_path):
+    journal = tmp_path / "job.sqlite"
+    server.error_rate = 1.0
+    assert run_cli(server, photos[0], "-o", tmp_path / "failed.jsonl", "--journal", journal) == 1
+    assert "error" in read_records(tmp_path / "failed.jsonl")[0]
+    server.error_rate = 0.0
+    assert run_cli(server, photos[0], "-o", tmp_path / "retried.jsonl", "--journal", journal) == 0
+    assert_canned(read_records(tmp_path / "retried.jsonl"), photos[:1])
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from metadata_generator.cli import main
+from metadata_generator.keywords import KeywordProcessor, Taxonomy, normalize_keyword, singular
+from metadata_generator.parsing import split_keywords
+
+from conftest import read_records
+
+
+@pytest.mark.parametrize("plural, expected", [
+    ("dogs", "dog"), ("beaches", "beach"), ("headaches", "headache"), ("cities", "city"),
+    ("movies", "movie"), ("boxes", "box"), ("glasses", "glasses"), ("buses", "bus"), ("gases", "gas"),
+    ("axes", "axe"), ("houses", "house"), ("tomatoes", "tomato"), ("shoes", "shoe"), ("children", "child"),
+    ("t-shirts", "t-shirt"), ("news", "news"), ("bus", "bus"), ("virus", "virus"), ("tennis", "tennis"),
+])
+def test_singular(plural, expected):
+    assert singular(plural) == expected
+
+
+def test_normalize_keyword():
+    assert normalize_keyword("  The Golden Retrievers! ") == "golden retriever"
+    assert normalize_keyword("ＦＵＬＬ Width") == "full width"
+    assert normalize_keyword("AT&T") == "at&t"
+    assert normalize_keyword("Dogs", lemmatize=False) == "dogs"
+
+
+def test_split_keeps_abbreviations():
+    keywords = split_keywords("U.S., St., golden retriever., Washington D.C., beach at dusk.")
+    assert keywords == ["U.S.", "St.", "golden retriever", "Washington D.C.", "beach at dusk"]
+
+
+def test_taxonomy():
+    taxonomy = Taxonomy([("dog", ["canine", "puppy"]), ("golden retriever", [])])
+    assert taxonomy.lookup(normalize_keyword("Puppies")) == "dog"
+    assert taxonomy.find("golden retrievers playing") == ["golden retriever"]
+    with pytest.raises(ValueError):
+        Taxonomy([("dog", ["hound"]), ("hunting dog", ["hound"])])
+
+
+def test_processor_batch():
+    processor = KeywordProcessor(Taxonomy([("dog", ["canine"])]), max_keywords=3)
+    cleaned = processor.process_many([["Dogs", "canine", "the", "Beach", "sunsets", "sky"], "dog, beach"])
+    assert cleaned == [["dog", "beach", "sunset"], ["dog", "beach"]]
+    assert processor.most_common(2) == [("dog", 2), ("beach", 2)]
+    stats = processor.stats()
+    assert (stats["assets"], stats["stopped"]) == (2, 1)
+
+
+def test_processor_drop_unmapped():
+    processor = KeywordProcessor(Taxonomy([("dog", ["canine"])]), keep_unmapped=False)
+    assert processor.process(["canine", "beach"]) == ["dog"]
+    assert processor.apply({"title": "T", "keywords": "beach, Dogs"}) == {"title": "T", "keywords": ["dog"]}
+
+
+def test_postprocess_keywords(tmp_path):
+    results = tmp_path / "day.jsonl"
+    results.write_text("\n".join(json.dumps(record) for record in [
+        {"source_file": "a.jpg", "title": "T", "keywords": ["Dogs", "the dog", "Golden Retrievers", "photo"]},
+        {"source_file": "b.jpg", "error": "Network error"},
+    ]) + "\n")
+    taxonomy = tmp_path / "vocabulary.txt"
+    taxonomy.write_text("dog | canine | puppy\ngolden retriever\n")
+    output = tmp_path / "clean.jsonl"
+    stats = tmp_path / "stats.csv"
+    assert main(["--postprocess", str(results), "--taxonomy", str(taxonomy), "-o", str(output),
+                 "--keyword-stats", str(stats)]) == 0
+    cleaned, failed = read_records(output)
+    assert cleaned["keywords"] == ["dog", "golden retriever"]
+    assert failed["error"] == "Network error"
+    assert stats.read_text().splitlines()[0] == "keyword,assets,share"
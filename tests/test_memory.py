@@ -0,0 +1,78 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from metadata_generator.core import InlineData, encode_body
+from metadata_generator.memory import MemoryBudget, base64_length
+from metadata_generator.metrics import metrics
+
+from conftest import assert_canned, read_records, run_cli
+
+
+def test_base64_length():
+    assert [base64_length(size) for size in (0, 1, 2, 3, 4)] == [0, 4, 4, 4, 8]
+
+
+def test_budget_blocks_until_released():
+    budget = MemoryBudget(100)
+    budget.acquire(60)
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (budget.acquire(60), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+    budget.release(60)
+    assert acquired.wait(1)
+    waiter.join()
+    stats = budget.stats()
+    assert (stats["in_use"], stats["peak"], stats["waits"]) == (60, 60, 1)
+    with pytest.raises(ValueError):
+        MemoryBudget(0)
+
+
+def test_oversized_reservations_run_alone():
+    budget = MemoryBudget(100)
+    budget.acquire(500)
+    assert budget.stats()["in_use"] == 500
+    budget.release(500)
+
+
+def test_acquire_async_waits_without_blocking_the_loop():
+    budget = MemoryBudget(100)
+    budget.acquire(80)
+
+    async def main():
+        waiting = asyncio.ensure_future(budget.acquire_async(50))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        budget.release(80)
+        await asyncio.wait_for(waiting, 1)
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    stats = budget.stats()
+    assert (stats["in_use"], stats["waits"]) == (50, 1)
+    assert 0 < stats["wait_seconds"] <= time.perf_counter() - started
+
+
+def test_file_reads_are_timed(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"x" * 100000)
+    timings = {}
+    body = encode_body({"contents": [{"parts": [{"inline_data": {"data": InlineData(file_path=str(path))}}]}]},
+                       timings)
+    assert len(body) > 100000
+    assert set(timings) == {"read", "encode"}
+    assert set(metrics.snapshot()["stages"]) == {"read", "encode"}
+
+
+def test_preprocessed_bytes_are_not_a_read():
+    encode_body({"contents": [{"parts": [{"inline_data": {"data": InlineData(b"abc")}}]}]})
+    assert set(metrics.snapshot()["stages"]) == {"encode"}
+
+
+def test_cli_with_a_small_budget(server, photos, tmp_path):
+    output = tmp_path / "results.jsonl"
+    assert run_cli(server, *photos, "-o", output, "-w", 4, "--memory-mb", 0.01) == 0
+    assert_canned(read_records(output), photos)
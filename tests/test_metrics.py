@@ -0,0 +1,59 @@
+import logging
+
+import pytest
+
+from metadata_generator.metrics import Metrics, summary_lines, trace_logger
+
+from conftest import read_records, run_cli
+
+
+def test_summary_counts_failures():
+    registry = Metrics()
+    registry.file_done("a.jpg", error="Network error")
+    line = summary_lines(registry.snapshot())[0]
+    assert line.startswith("1 files (0 succeeded, 0 cached, 0 duplicates, 1 failed)")
+
+
+def test_stage_statistics():
+    registry = Metrics()
+    for milliseconds in range(1, 101):
+        registry.record("request", milliseconds / 1000)
+    timings = {}
+    with registry.time("parse", timings):
+        pass
+    stages = registry.snapshot()["stages"]
+    assert set(stages) == {"request", "parse"}
+    assert stages["request"]["count"] == 100
+    assert stages["request"]["p95"] == pytest.approx(0.095, abs=0.002)
+    assert stages["request"]["max"] == 0.1
+    assert set(timings) == {"parse"}
+
+
+def test_prometheus_histograms():
+    registry = Metrics()
+    registry.record("request", 0.02)
+    registry.record("request", 3.0)
+    registry.add("bytes_sent", 1234)
+    text = registry.render_prometheus()
+    assert "metadata_generator_bytes_sent_total 1234" in text
+    assert 'metadata_generator_stage_seconds_bucket{stage="request",le="0.025"} 1' in text
+    assert 'metadata_generator_stage_seconds_bucket{stage="request",le="+Inf"} 2' in text
+    assert 'metadata_generator_stage_seconds_count{stage="request"} 2' in text
+
+
+def test_trace_and_metrics_files(server, photos, tmp_path):
+    trace = tmp_path / "trace.jsonl"
+    prometheus = tmp_path / "metrics.prom"
+    try:
+        assert run_cli(server, *photos, "-o", tmp_path / "results.jsonl", "--trace", trace,
+                       "--metrics-file", prometheus) == 0
+    finally:
+        for handler in list(trace_logger.handlers):
+            trace_logger.removeHandler(handler)
+            handler.close()
+        trace_logger.setLevel(logging.NOTSET)
+        trace_logger.propagate = True
+    records = read_records(trace)
+    assert sorted(record["file"] for record in records) == sorted(photos)
+    assert all(record["status"] == "ok" and "request" in record["ms"] for record in records)
+    assert f"metadata_generator_files_total {len(photos)}" in prometheus.read_text()
@@ -0,0 +1,66 @@
+import os
+import json
+
+from metadata_generator import batch
+from metadata_generator.batch import BatchRunner
+from metadata_generator.multifile import pack_batches, parse_batch_response
+from metadata_generator.parsing import parse_stats
+
+from conftest import assert_canned, read_records, run_cli
+
+
+def answer(items):
+    return {"candidates": [{"content": {"parts": [{"text": json.dumps(items)}]}}]}
+
+
+def part(size):
+    return {"inline_data": {"mime_type": "image/jpeg", "data": "x" * size}}
+
+
+def test_packed_requests(server, photos, tmp_path):
+    output = tmp_path / "results.jsonl"
+    video = tmp_path / "photos" / "z.mp4"
+    video.write_bytes(b"\x00\x00\x00\x18ftypmp42" + bytes(100))
+    assert run_cli(server, os.path.dirname(photos[0]), "-o", output, "--files-per-request", 5,
+                   "--no-preprocess") == 0
+    records = read_records(output)
+    assert_canned([record for record in records if record["source_file"] != str(video)], photos)
+    # The four images share one request; the video in their group is never packed with them
+    assert server.requests == 2
+
+
+def test_pack_batches_respects_both_limits():
+    items = [(index, part(size)) for index, size in enumerate([10, 10, 10, 50, 10])]
+    groups = [[key for key, _ in group] for group in pack_batches(items, max_items=2, max_bytes=60)]
+    assert groups == [[0, 1], [2, 3], [4]]
+
+
+def test_answers_are_matched_by_index():
+    parsed = parse_batch_response(answer([
+        {"index": 1, "title": "B", "keywords": ["b"]},
+        {"index": 0, "title": "A", "keywords": ["a"]},
+        {"index": 7, "title": "Out of range"},
+    ]), 3)
+    assert [metadata and metadata["title"] for metadata in parsed] == ["A", "B", None]
+    assert "index" not in parsed[0]
+
+
+def test_unkeyed_answers_are_matched_by_position():
+    parsed = parse_batch_response(answer([{"title": "A"}, {"title": "B"}]), 2)
+    assert [metadata["title"] for metadata in parsed] == ["A", "B"]
+
+
+def test_unusable_answers_count_as_failed():
+    assert parse_batch_response({"promptFeedback": {"blockReason": "SAFETY"}}, 2) == [None, None]
+    assert parse_batch_response(answer({"title": "Not a list"}), 2) == [None, None]
+    assert parse_stats.snapshot()["failed"] == 2
+
+
+def test_unexpected_group_errors_reach_every_file(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(batch, "generate_batch", broken)
+    errors = {}
+    BatchRunner(None, ["a.jpg", "b.jpg", "c.jpg"], files_per_request=2, on_error=errors.__setitem__).run()
+    assert errors == {0: "Error: boom", 1: "Error: boom", 2: "Error: boom"}
@@ -0,0 +1,51 @@
+import pytest
+
+from metadata_generator.core import GeminiError, parse_response
+from metadata_generator.parsing import normalize_metadata, parse_metadata_text, parse_stats
+
+
+def answer(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def test_structured_answer():
+    metadata = parse_metadata_text('{"title": " Red barn ", "description": "A barn.", "keywords": ["barn", "farm"]}')
+    assert metadata == {"title": "Red barn", "description": "A barn.", "keywords": ["barn", "farm"]}
+    assert parse_stats.snapshot()["json"] == 1
+
+
+def test_fenced_answer():
+    text = 'Here you go:\n```json\n{"title": "Red barn", "keywords": "barn, farm; dusk"}\n```'
+    assert parse_metadata_text(text)["keywords"] == ["barn", "farm", "dusk"]
+    assert parse_stats.snapshot()["fenced"] == 1
+
+
+def test_free_text_answer():
+    text = "**Title:** Red barn at dusk\n\n**Description:** A red barn.\n\n**Keywords:** barn, farm, dusk"
+    metadata = parse_metadata_text(text)
+    assert metadata == {"title": "Red barn at dusk", "description": "A red barn.",
+                        "keywords": ["barn", "farm", "dusk"]}
+    assert parse_stats.snapshot()["manual"] == 1
+    assert parse_stats.fallbacks() == 1
+
+
+def test_broken_json_keeps_intact_fields():
+    metadata = parse_metadata_text('{"title": "Red barn", "description": "A \\"red\\" barn", "keywords": ["barn", "fa')
+    assert metadata["title"] == "Red barn"
+    assert metadata["description"] == 'A "red" barn'
+
+
+def test_normalize_metadata():
+    metadata = normalize_metadata({"title": 42, "keywords": ["Barn", "barn", " farm ", ""], "extra": 1})
+    assert metadata == {"title": "42", "description": "", "keywords": ["Barn", "farm"], "extra": 1}
+    assert normalize_metadata({"description": "No title or keywords"}) is None
+    assert normalize_metadata(["not", "a", "dict"]) is None
+
+
+def test_unusable_answers():
+    with pytest.raises(GeminiError) as error:
+        parse_response({"promptFeedback": {"blockReason": "SAFETY"}})
+    assert error.value.unparsable
+    with pytest.raises(GeminiError):
+        parse_response(answer("I cannot describe this image."))
+    assert parse_stats.snapshot()["failed"] == 1
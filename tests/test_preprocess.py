@@ -0,0 +1,71 @@
+import io
+import os
+
+import pytest
+
+from metadata_generator.memory import base64_length
+from metadata_generator.preprocess import ImagePreprocessor
+
+from conftest import Image, make_image
+
+
+def decode(prepared):
+    image = Image.open(io.BytesIO(prepared.data))
+    image.load()
+    return image
+
+
+def test_small_supported_images_pass_through(tmp_path):
+    path = make_image(tmp_path / "small.png")
+    prepared = ImagePreprocessor(max_edge=100)(path)
+    with open(path, "rb") as file:
+        assert prepared.data == file.read()
+    assert (prepared.mime_type, prepared.width, prepared.height) == ("image/png", 64, 48)
+
+
+def test_large_images_are_downscaled(tmp_path):
+    path = make_image(tmp_path / "large.png", size=(400, 300))
+    preprocessor = ImagePreprocessor(max_edge=100)
+    prepared = preprocessor(path)
+    assert prepared.mime_type == "image/jpeg"
+    assert decode(prepared).size == (100, 75)
+    stats = preprocessor.stats()
+    assert stats["files"] == 1
+    assert stats["saved_bytes"] == stats["original_bytes"] - len(prepared.data)
+
+
+def test_exif_orientation_is_applied(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees clockwise
+    path = make_image(tmp_path / "rotated.jpg", exif=exif.tobytes())
+    prepared = ImagePreprocessor(max_edge=100)(path)
+    assert decode(prepared).size == (48, 64)
+
+
+def test_transparency_is_flattened_onto_white(tmp_path):
+    path = str(tmp_path / "alpha.png")
+    Image.new("RGBA", (400, 200), (0, 0, 0, 0)).save(path)
+    image = decode(ImagePreprocessor(max_edge=100)(path))
+    assert image.mode == "RGB"
+    assert image.getpixel((50, 25)) == (255, 255, 255)
+
+
+def test_webp_output(tmp_path):
+    path = make_image(tmp_path / "large.png", size=(400, 300))
+    prepared = ImagePreprocessor(max_edge=100, output_format="webp")(path)
+    assert prepared.mime_type == "image/webp"
+    assert decode(prepared).format == "WEBP"
+
+
+def test_memory_estimate_reads_only_the_header(tmp_path):
+    path = make_image(tmp_path / "large.jpg", size=(800, 600))
+    # JPEG draft mode decodes an 800 pixel image at 1/8 scale for a 100 pixel target
+    assert ImagePreprocessor(max_edge=100).memory_estimate(path) == 100 * 75 * 4 + base64_length(os.path.getsize(path))
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    assert ImagePreprocessor().memory_estimate(str(broken)) == 16
+
+
+def test_unknown_output_format():
+    with pytest.raises(ValueError):
+        ImagePreprocessor(output_format="gif")
@@ -0,0 +1,103 @@
+import json
+import time
+import threading
+
+import pytest
+
+from metadata_generator.core import GeminiClient
+from metadata_generator.prompts import (CHARS_PER_TOKEN, DEFAULT_PROMPTS, DEFAULT_TEMPLATE, MIN_CONTEXT_TOKENS,
+                                        ContextCache, PromptTemplate, TemplateError, load_template)
+
+from conftest import assert_canned, read_records, run_cli
+
+RULES = "Follow the agency's rules. " * (MIN_CONTEXT_TOKENS * CHARS_PER_TOKEN // 20)
+
+
+def test_variables_are_filled_once():
+    template = PromptTemplate("acme", 2, variables={"count": 49, "site": "Adobe Stock"},
+                              system="Rules for {site}.",
+                              prompts={"image": "Use {count} keywords, {{literally}}.",
+                                       "batch": "{count} images for {site} {{n}}, last is {last}."})
+    assert template.system == "Rules for Adobe Stock."
+    assert template.prompt("image") == "Use 49 keywords, {literally}."
+    assert template.prompt("video") == DEFAULT_PROMPTS["video"]
+    # The batch prompt keeps its per-request fields
+    assert template.prompt("batch").format(count=3, last=2) == "3 images for Adobe Stock {n}, last is 2."
+    assert template.signature == "acme@2"
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"version": 1}, "'name' is required"),
+    ({"name": "a", "version": 0}, "positive integer"),
+    ({"name": "a", "version": 1, "prompts": {"audio": "x"}}, "unknown prompt kind"),
+    ({"name": "a", "version": 1, "prompts": {"image": "{missing}"}}, "unknown variable"),
+    ({"name": "a", "version": 1, "colour": "red"}, "unknown key"),
+])
+def test_invalid_templates(data, message):
+    with pytest.raises(TemplateError, match=message):
+        PromptTemplate.from_dict(data)
+
+
+def test_cache_material():
+    assert DEFAULT_TEMPLATE.builtin
+    assert DEFAULT_TEMPLATE.cache_material("image") == DEFAULT_PROMPTS["image"]
+    first = PromptTemplate("acme", 1, system="Rules.")
+    second = PromptTemplate("acme", 1, system="Other rules.")
+    assert not first.builtin
+    assert first.cache_material("image") != second.cache_material("image")
+
+
+def test_load_template(tmp_path):
+    path = tmp_path / "template.json"
+    path.write_text(json.dumps({"name": "acme", "version": 1}))
+    assert load_template(str(path)) is load_template(str(path))
+    path.write_text("{not json")
+    with pytest.raises(TemplateError, match="not valid JSON"):
+        load_template(str(path))
+    with pytest.raises(TemplateError):
+        load_template(str(tmp_path / "missing.json"))
+
+
+def test_short_instructions_are_not_cached(server):
+    client = GeminiClient("K", base_url=server.base_url)
+    assert ContextCache().lookup(client, "gemini-1.5-flash", PromptTemplate("a", 1, system="Short.")) is None
+    assert server.requests == 0
+
+
+def test_concurrent_lookups_share_one_context(server, monkeypatch):
+    calls = []
+    create = ContextCache._create
+
+    def slow_create(self, *args):
+        calls.append(args)
+        time.sleep(0.2)
+        return create(self, *args)
+
+    monkeypatch.setattr(ContextCache, "_create", slow_create)
+    client = GeminiClient("K", base_url=server.base_url)
+    contexts = ContextCache()
+    template = PromptTemplate("agency", 1, system=RULES)
+    names = []
+    threads = [threading.Thread(target=lambda: names.append(contexts.lookup(client, "gemini-1.5-flash", template)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(set(names)) == 1 and names[0] in server.contexts
+    assert contexts.stats() == {"created": 1, "failed": 0, "live": 1}
+    contexts.close()
+    assert server.contexts == {}
+
+
+def test_template_context_is_cached(server, photos, tmp_path):
+    template = tmp_path / "template.json"
+    template.write_text(json.dumps({"name": "agency", "version": 1, "system": RULES}))
+    output = tmp_path / "results.jsonl"
+    assert run_cli(server, *photos, "-o", output, "--template", template) == 0
+    assert_canned(read_records(output), photos)
+    # Created once, used by every request, deleted at the end
+    assert server.requests == 1 + len(photos) + 1
+    assert server.contexts == {}
+    assert (server.keys_in_url, server.unauthenticated) == (0, 0)
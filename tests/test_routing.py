@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from metadata_generator.core import GeminiError
+from metadata_generator.routing import ModelRoute, ModelRouter, parse_route, route_summary_lines
+
+from conftest import assert_canned, read_records, run_cli
+
+
+def test_parse_route():
+    route = parse_route("gemini-1.5-flash-8b:max-kb=512,rpm=4000,concurrency=4,input-price=0.5")
+    assert (route.model, route.max_bytes, route.concurrency, route.input_price) == (
+        "gemini-1.5-flash-8b", 512 * 1024, 4, 0.5)
+    assert route.rate_limiter is not None
+    for spec in (":rpm=10", "gemini-1.5-flash:speed=9", "gemini-1.5-flash:rpm=lots"):
+        with pytest.raises(ValueError):
+            parse_route(spec)
+
+
+def test_cheapest_model_that_takes_the_asset():
+    router = ModelRouter([ModelRoute("gemini-1.5-flash"), ModelRoute("gemini-1.5-flash-8b", max_bytes=1000)])
+    assert router.acquire(500).model == "gemini-1.5-flash-8b"
+    assert router.acquire(5000).model == "gemini-1.5-flash"
+
+
+def test_busy_models_are_skipped():
+    router = ModelRouter([ModelRoute("gemini-1.5-flash-8b", concurrency=1), ModelRoute("gemini-1.5-flash")])
+    first = router.acquire(0)
+    assert router.acquire(0).model == "gemini-1.5-flash"
+    router.release(first, 0.1)
+    assert router.acquire(0) is first
+    assert router.acquire(0, tried={"gemini-1.5-flash-8b", "gemini-1.5-flash"}) is None
+
+
+def test_rate_limited_models_cool_down():
+    cheap, standard = ModelRoute("gemini-1.5-flash-8b"), ModelRoute("gemini-1.5-flash")
+    router = ModelRouter([cheap, standard])
+    route = router.acquire(0)
+    error = GeminiError("quota", status=429, retry_after=60)
+    router.release(route, 0.2, error)
+    assert router.fails_over(error)
+    assert not router.fails_over(GeminiError("bad key", status=403))
+    # Skipped until the Retry-After delay has passed
+    assert router.acquire(0) is standard
+    assert cheap.outcomes["rate_limited"] == 1
+
+
+def test_usage_and_cost():
+    route = ModelRoute("gemini-1.5-flash", input_price=1.0, output_price=2.0)
+    router = ModelRouter([route])
+    router.record_usage(route, {"usageMetadata": {"promptTokenCount": 1000000, "candidatesTokenCount": 500000,
+                                                  "cachedContentTokenCount": 400000}})
+    router.release(router.acquire(0), 0.25)
+    stats = router.snapshot()["gemini-1.5-flash"]
+    # 600k uncached plus 400k cached input tokens at a quarter of the price, and 500k output tokens
+    assert stats["cost"] == pytest.approx(0.6 + 0.1 + 1.0)
+    assert (stats["ok"], stats["requests"]) == (1, 1)
+    assert route_summary_lines(router.snapshot())[0].startswith("gemini-1.5-flash: 1/1 ok")
+
+
+def test_acquire_async_waits_for_a_free_slot():
+    router = ModelRouter([ModelRoute("gemini-1.5-flash", concurrency=1)])
+    route = router.acquire(0)
+
+    async def main():
+        waiting = asyncio.ensure_future(router.acquire_async(0))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        router.release(route, 0.1)
+        assert await waiting is route
+
+    asyncio.run(main())
+
+
+def test_cli_routes(server, photos, tmp_path):
+    output = tmp_path / "results.jsonl"
+    assert run_cli(server, *photos, "-o", output, "--route", "gemini-1.5-flash-8b:max-kb=1",
+                   "--route", "gemini-1.5-flash") == 0
+    assert_canned(read_records(output), photos)
+    assert server.requests == len(photos)
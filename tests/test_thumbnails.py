@@ -0,0 +1,67 @@
+import io
+import os
+
+import pytest
+
+from metadata_generator.thumbnails import ThumbnailCache, make_image_thumbnail
+
+from conftest import Image, make_image
+
+
+def size_of(data):
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == "JPEG"
+        return image.size
+
+
+def test_thumbnail_is_bounded_and_upright(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees clockwise
+    path = make_image(tmp_path / "photo.jpg", size=(800, 600), exif=exif.tobytes())
+    assert size_of(make_image_thumbnail(path, edge=100)) == (75, 100)
+
+
+def test_transparent_images(tmp_path):
+    path = str(tmp_path / "alpha.png")
+    Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(path)
+    assert size_of(make_image_thumbnail(path, edge=64)) == (64, 64)
+
+
+def test_memory_and_disk_caching(tmp_path):
+    path = make_image(tmp_path / "photo.jpg", size=(400, 300))
+    directory = str(tmp_path / "thumbnails")
+    thumbnails = ThumbnailCache(directory, edge=100)
+    data = thumbnails.get(path)
+    assert thumbnails.get(path) is data
+    assert (thumbnails.hits, thumbnails.misses) == (1, 1)
+
+    # A new instance finds the thumbnail on disk
+    reopened = ThumbnailCache(directory, edge=100)
+    assert reopened.get(path) == data
+    assert (reopened.hits, reopened.misses) == (1, 0)
+
+    # Editing the file invalidates it
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    reopened.get(path)
+    assert reopened.misses == 1
+
+    reopened.clear()
+    assert not [name for _, _, names in os.walk(directory) for name in names if name.endswith(".jpg")]
+
+
+def test_memory_entries_are_bounded(tmp_path):
+    thumbnails = ThumbnailCache(False, edge=32, max_entries=2)
+    paths = [make_image(tmp_path / f"{index}.png") for index in range(3)]
+    for path in paths:
+        thumbnails.get(path)
+    thumbnails.get(paths[0])
+    assert thumbnails.misses == 4
+
+
+def test_video_poster_frame(tmp_path):
+    pytest.importorskip("av")
+    from test_embed import make_clip
+
+    path = make_clip(tmp_path / "clip.mp4")
+    assert size_of(ThumbnailCache(False, edge=32).get(path, "video")) == (32, 24)
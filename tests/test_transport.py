@@ -0,0 +1,76 @@
+import time
+import threading
+
+from metadata_generator.cli import main
+from metadata_generator.core import GeminiClient
+from metadata_generator.transport import HttpTransport, RateLimiter, redact_text, retry_delay
+
+from conftest import read_records
+
+BODY = {"contents": [{"parts": [{"text": "Describe nothing"}]}]}
+
+
+def generate_url(server):
+    return f"{server.base_url}/models/gemini-1.5-flash:generateContent"
+
+
+def test_rate_limiter_allows_a_burst():
+    limiter = RateLimiter(60, burst=2)
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == 0
+    assert 0 < limiter.try_acquire() <= 1
+    limiter.drain()
+    assert limiter.try_acquire() > 0.9
+
+
+def test_retry_delay_sources():
+    assert retry_delay({"Retry-After": "3"}) == 3.0
+    detail = {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1.5s"}
+    assert retry_delay({}, {"error": {"details": [detail]}}) == 1.5
+    assert retry_delay({}, None) is None
+    assert retry_delay({"Retry-After": "soon"}, "not a dict") is None
+
+
+def test_redact_text():
+    message = "GET https://host/v1beta/models?key=SECRET&alt=json failed"
+    assert redact_text(message) == "GET https://host/v1beta/models?key=REDACTED&alt=json failed"
+
+
+def test_server_errors_are_retried(server):
+    server.error_rate = 1.0
+    transport = HttpTransport(retries=2)
+    response = transport.post(generate_url(server), json=BODY, headers={"x-goog-api-key": "K"})
+    assert response.status_code == 503
+    assert server.requests == 3
+
+
+def test_rate_limit_holds_back_every_request(server):
+    server.rate_limit_rate = 1.0
+    server.retry_after = 0.5
+    transport = HttpTransport(retries=1, rate_limiter=RateLimiter(6000, burst=10))
+    first = threading.Thread(target=transport.post, args=(generate_url(server),), kwargs={"json": BODY})
+    first.start()
+    while not transport._cooldown_until:
+        time.sleep(0.01)
+    # Another worker's request waits until the quota has recovered, though it never saw the 429 itself
+    server.rate_limit_rate = 0.0
+    started = time.monotonic()
+    assert transport.post(generate_url(server), json=BODY).status_code == 200
+    assert time.monotonic() - started >= 0.3
+    first.join()
+
+
+def test_api_key_travels_in_a_header():
+    client = GeminiClient("SECRETKEY", base_url="http://127.0.0.1:1/v1beta")
+    assert client.auth_headers({"Content-Type": "application/json"}) == {
+        "Content-Type": "application/json", "x-goog-api-key": "SECRETKEY"}
+
+
+def test_network_errors_do_not_leak_the_key(photos, tmp_path, capsys):
+    output = tmp_path / "results.jsonl"
+    assert main(["--api-key", "SECRETKEY", "--base-url", "http://127.0.0.1:1/v1beta", "--no-cache",
+                 "--retries", "0", photos[0], "-o", str(output)]) == 1
+    record, = read_records(output)
+    assert record["error"].startswith("Network error")
+    assert "SECRETKEY" not in record["error"]
+    assert "SECRETKEY" not in capsys.readouterr().err
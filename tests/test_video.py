@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from metadata_generator.video import KeyframeSampler, _EvenSample, _read_jpegs
+
+
+@pytest.mark.parametrize("length", [0, 3, 8, 16, 17, 1000, 4099])
+def test_even_sample_is_bounded_and_spread(length):
+    sample = _EvenSample(8)
+    held = 0
+    for item in range(length):
+        if sample.keeps_next():
+            sample.add(item)
+        held = max(held, len(sample.items))
+    result = sample.result()
+    assert held <= 2 * 8 + 1
+    assert len(result) == min(length, 8)
+    assert result == sorted(result)
+    if length > 8:
+        # No gap between picks is more than twice the even spacing
+        assert max(b - a for a, b in zip([0] + result, result + [length])) <= 2 * length / 8 + 2
+
+
+def test_read_jpegs_splits_across_reads():
+    frames = [b"\xff\xd8" + bytes([index]) * (index * 70000 + 5) + b"\xff\xd9" for index in range(1, 5)]
+    found = []
+    _read_jpegs(io.BytesIO(b"".join(frames)), found.append)
+    assert found == frames
+
+
+def test_memory_estimate_covers_the_scene_reservoir():
+    scene = KeyframeSampler(count=8, mode="scene").memory_estimate("clip.mp4")
+    uniform = KeyframeSampler(count=8, mode="uniform").memory_estimate("clip.mp4")
+    assert scene - uniform == (8 + 1) * 768 * 768 * 3
+
+
+def test_scene_frames_are_sampled(tmp_path):
+    pytest.importorskip("av")
+    from test_embed import make_clip
+
+    path = make_clip(tmp_path / "clip.mp4", frames=60)
+    info, frames = KeyframeSampler(count=4, mode="scene").sample(path)
+    assert info.width == 64
+    assert 1 <= len(frames) <= 4
+    assert all(frame.startswith(b"\xff\xd8") for frame in frames)
@@ -0,0 +1,61 @@
+import os
+import time
+import threading
+
+import pytest
+
+from metadata_generator import watch
+from metadata_generator.watch import InotifyWatcher, WatchService
+
+from conftest import make_image
+
+
+class RecordingClient:
+    def __init__(self):
+        self.paths = []
+
+    def generate(self, path):
+        self.paths.append(path)
+        return {"title": "T"}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watch_processes_and_forgets(tmp_path, polling):
+    if not polling and not InotifyWatcher.available():
+        pytest.skip("inotify is not available")
+    client = RecordingClient()
+    service = WatchService(client, [str(tmp_path)], settle=0.2, poll_interval=0.2, polling=polling)
+    thread = threading.Thread(target=service.run)
+    thread.start()
+    try:
+        first = make_image(tmp_path / "first.jpg")
+        second = make_image(tmp_path / "second.png")
+        (tmp_path / ".hidden.jpg").write_bytes(b"partial copy")
+        wait_for(lambda: service.processed == 2)
+        assert sorted(client.paths) == [first, second]
+
+        os.remove(first)
+        wait_for(lambda: first not in service._queued)
+        assert list(service._queued) == [second]
+    finally:
+        service.stop()
+        thread.join()
+
+
+def test_queued_map_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch, "QUEUED_MEMORY", 2)
+    service = WatchService(RecordingClient(), [str(tmp_path)], settle=0)
+    service.skip = lambda path: True  # Only the bookkeeping is under test
+    paths = [make_image(tmp_path / f"{index}.jpg") for index in range(4)]
+    for path in paths:
+        service._note(path)
+    service._promote()
+    assert list(service._queued) == paths[2:]